@@ -14,8 +14,21 @@
    syntax
 """
 
-from .syntax.translator import scenarioFromFile, scenarioFromString
-
 import scenic.core.errors as _errors
 _errors.showInternalBacktrace = False
 del _errors
+
+# Hook the import system so Scenic modules can be imported; the translator itself
+# (and the heavy libraries it depends on) are only loaded when first needed.
+import scenic.syntax.importer as _importer
+_importer.install()
+del _importer
+
+def __getattr__(name):
+    if name in ('scenarioFromFile', 'scenarioFromString'):
+        import scenic.syntax.translator as translator
+        return getattr(translator, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(list(globals()) + ['scenarioFromFile', 'scenarioFromString'])
@@ -6,11 +6,9 @@ import sys
 import time
 import argparse
 import random
-import importlib.metadata
+import json
 
-import scenic.syntax.translator as translator
 import scenic.core.errors as errors
-from scenic.core.simulators import SimulationCreationError
 
 parser = argparse.ArgumentParser(prog='scenic', add_help=False,
                                  usage='scenic [-h | --help] [options] FILE [options]',
@@ -55,8 +53,18 @@ debugOpts.add_argument('-b', '--full-backtrace', help='show full internal backtr
                        action='store_true')
 debugOpts.add_argument('--pdb', action='store_true',
                        help='enter interactive debugger on errors (implies "-b")')
-ver = importlib.metadata.version('scenic')
-debugOpts.add_argument('--version', action='version', version=f'Scenic {ver}',
+class VersionAction(argparse.Action):
+    """Like the built-in 'version' action, but only looks up the version if needed."""
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS,
+                 help=None):
+        super().__init__(option_strings=option_strings, dest=dest, default=default,
+                         nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        import importlib.metadata   # slow import not often needed
+        ver = importlib.metadata.version('scenic')
+        parser.exit(message=f'Scenic {ver}\n')
+debugOpts.add_argument('--version', action=VersionAction,
                        help='print Scenic version information and exit')
 debugOpts.add_argument('--dump-initial-python', help='dump initial translated Python',
                        action='store_true')
@@ -64,8 +72,15 @@ debugOpts.add_argument('--dump-ast', help='dump final AST', action='store_true')
 debugOpts.add_argument('--dump-python', help='dump Python equivalent of final AST',
                        action='store_true')
 debugOpts.add_argument('--no-pruning', help='disable pruning', action='store_true')
+debugOpts.add_argument('--early-rejection', action='store_true',
+                       help='check requirements as soon as possible while sampling')
+debugOpts.add_argument('--adaptive-ordering', action='store_true',
+                       help='reorder requirement checks based on their rejection rates')
 debugOpts.add_argument('--gather-stats', type=int, metavar='N',
                        help='collect timing statistics over this many scenes')
+debugOpts.add_argument('--stats-json', metavar='FILE',
+                       help='with --gather-stats, write detailed sampling statistics '
+                            'to this file in JSON ("-" for standard output)')
 
 parser.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS,
                     help=argparse.SUPPRESS)
@@ -75,6 +90,12 @@ parser.add_argument('scenicFile', help='a Scenic file to run', metavar='FILE')
 
 # Parse arguments and set up configuration
 args = parser.parse_args()
+
+# Import the rest of Scenic only now, so that e.g. '--help' is fast
+import scenic.syntax.translator as translator
+from scenic.core.simulators import SimulationCreationError
+from scenic.core.scenarios import SamplingStatistics
+
 delay = args.delay
 errors.showInternalBacktrace = args.full_backtrace
 if args.pdb:
@@ -117,10 +138,13 @@ if args.verbosity >= 1:
 if args.simulate:
     simulator = errors.callBeginningScenicTrace(scenario.getSimulator)
 
-def generateScene():
+def generateScene(stats=None):
     startTime = time.time()
     scene, iterations = errors.callBeginningScenicTrace(
-        lambda: scenario.generate(verbosity=args.verbosity)
+        lambda: scenario.generate(verbosity=args.verbosity,
+                                  earlyRejection=args.early_rejection,
+                                  adaptiveOrdering=args.adaptive_ordering,
+                                  stats=stats)
     )
     if args.verbosity >= 1:
         totalTime = time.time() - startTime
@@ -169,15 +193,29 @@ try:
                     plt.clf()
     else:   # Gather statistics over the specified number of scenes
         its = []
+        stats = SamplingStatistics()
         startTime = time.time()
         while len(its) < args.gather_stats:
-            scene, iterations = generateScene()
+            scene, iterations = generateScene(stats)
             its.append(iterations)
         totalTime = time.time() - startTime
         count = len(its)
         print(f'Sampled {len(its)} scenes in {totalTime:.2f} seconds.')
         print(f'Average iterations/scene: {sum(its)/count}')
         print(f'Average time/scene: {totalTime/count:.2f} seconds.')
+        print(f'Time sampling: {stats.samplingTime:.2f} seconds; '
+              f'checking requirements: {stats.checkingTime:.2f} seconds.')
+        if stats.rejections:
+            print('Rejections by cause:')
+            for cause, rejections in stats.rejections.most_common():
+                print(f'  {rejections} {cause}')
+        if args.stats_json is not None:
+            report = json.dumps(stats.toDict(), indent=2)
+            if args.stats_json == '-':
+                print(report)
+            else:
+                with open(args.stats_json, 'w') as outFile:
+                    outFile.write(report + '\n')
 
 except KeyboardInterrupt:
     pass
@@ -4,6 +4,7 @@ import collections
 import itertools
 import random
 import math
+import operator
 import typing
 import warnings
 
@@ -52,6 +53,24 @@ class RejectionException(Exception):
 	"""Exception used to signal that the sample currently being generated must be rejected."""
 	pass
 
+def _batchArray(value, thing, n):
+	"""Get an array of n numeric values of the given quantity during batch sampling.
+
+	Quantities which have been batch-sampled are looked up in **value**; numeric
+	constants are repeated. Anything else cannot be batch-sampled.
+	"""
+	if thing in value:
+		return value[thing]
+	if isinstance(thing, (int, float)):
+		return numpy.full(n, thing)
+	raise NotImplementedError(f'cannot batch-sample {type(thing).__name__}')
+
+def _batchColumn(value, thing, n):
+	"""Get a list of n values of the given quantity during batch sampling."""
+	if thing in value:
+		return value[thing].tolist()
+	return [thing] * n
+
 ## Abstract distributions
 
 class DefaultIdentityDict:
@@ -72,6 +91,101 @@ class DefaultIdentityDict:
 	def __contains__(self, key):
 		return id(key) in self.storage
 
+class SamplingPlan:
+	"""A precompiled procedure for sampling a fixed collection of Samplables.
+
+	Sampling the plan is equivalent to calling `Samplable.sampleAll` on the
+	quantities, making the same calls to the random number generator in the same
+	order. However, the dependency graph is topologically sorted once in advance,
+	so that each sample is produced by replaying a flat sequence of steps, instead
+	of recursively walking the graph and checking at every node whether it has
+	already been sampled.
+
+	Since the plan captures the current `Samplable._conditioned` version of each
+	quantity, it must be recompiled if any quantity is conditioned afterward.
+	"""
+	def __init__(self, quantities):
+		self.quantities = tuple(q for q in quantities if isinstance(q, Samplable))
+		steps = []
+		added = set()
+		def add(quantity):
+			conditioned = quantity._conditioned
+			for child in conditioned._dependencies:
+				if id(child) not in added:
+					add(child)
+			added.add(id(quantity))
+			steps.append((quantity, conditioned))
+		for q in self.quantities:
+			if id(q) not in added:
+				add(q)
+		self.steps = tuple(steps)
+		self._makeSlots()
+
+	def _makeSlots(self):
+		# sampled values are stored under the identity of the original quantity
+		self.slots = tuple((id(quantity), conditioned) for quantity, conditioned in self.steps)
+		self._stepIndices = { slot: index for index, (slot, _) in enumerate(self.slots) }
+
+	def stepOf(self, quantity):
+		"""Index of the step sampling the given quantity, or -1 if it is not in the plan."""
+		return self._stepIndices.get(id(quantity), -1)
+
+	def sample(self, subsamples=None, checkpoints=None):
+		"""Sample all the quantities in the plan.
+
+		As for `Samplable.sampleAll`, values already sampled for some quantities can be
+		provided in **subsamples**; every dependency of such quantities must also be
+		provided.
+
+		If **checkpoints** is given, it should be a dict mapping step indices to
+		sequences of functions, which are called with the partial sample right after
+		the corresponding step (before any steps if the index is -1). A function may
+		raise `RejectionException` to abandon the sample without doing the remaining
+		steps.
+
+		Returns:
+			A `DefaultIdentityDict` mapping each quantity to its sampled value.
+		"""
+		if checkpoints:
+			return self._sampleWithCheckpoints(subsamples, checkpoints)
+		if subsamples is None:
+			subsamples = DefaultIdentityDict()
+			storage = subsamples.storage
+			for slot, conditioned in self.slots:
+				storage[slot] = conditioned.sampleGiven(subsamples)
+		else:
+			storage = subsamples.storage
+			for slot, conditioned in self.slots:
+				if slot not in storage:
+					storage[slot] = conditioned.sampleGiven(subsamples)
+		return subsamples
+
+	def _sampleWithCheckpoints(self, subsamples, checkpoints):
+		if subsamples is None:
+			subsamples = DefaultIdentityDict()
+		storage = subsamples.storage
+		for checkpoint in checkpoints.get(-1, ()):
+			checkpoint(subsamples)
+		for index, (slot, conditioned) in enumerate(self.slots):
+			if slot not in storage:
+				storage[slot] = conditioned.sampleGiven(subsamples)
+			for checkpoint in checkpoints.get(index, ()):
+				checkpoint(subsamples)
+		return subsamples
+
+	def __len__(self):
+		return len(self.steps)
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['slots']		# object identities are not preserved by pickling
+		del state['_stepIndices']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._makeSlots()
+
 class Samplable(LazilyEvaluable):
 	"""Abstract class for values which can be sampled, possibly depending on other values.
 
@@ -91,13 +205,17 @@ class Samplable(LazilyEvaluable):
 		self._conditioned = self	# version (partially) conditioned on requirements
 
 	@staticmethod
-	def sampleAll(quantities):
+	def sampleAll(quantities, subsamples=None):
 		"""Sample all the given Samplables, which may have dependencies in common.
 
+		Values already sampled for some of the quantities (or their dependencies) can be
+		provided in **subsamples**, which is updated in place.
+
 		Reproducibility note: the order in which the quantities are given can affect the
 		order in which calls to random are made, affecting the final result.
 		"""
-		subsamples = DefaultIdentityDict()
+		if subsamples is None:
+			subsamples = DefaultIdentityDict()
 		for q in quantities:
 			if q not in subsamples:
 				subsamples[q] = q.sample(subsamples) if isinstance(q, Samplable) else q
@@ -112,6 +230,50 @@ class Samplable(LazilyEvaluable):
 				subsamples[child] = child.sample(subsamples)
 		return self._conditioned.sampleGiven(subsamples)
 
+	@staticmethod
+	def batchSampleAll(quantities, n, rng):
+		"""Draw n independent samples at once of the numeric parts of the given Samplables.
+
+		Every quantity among the given Samplables and their (transitive) dependencies
+		which supports batch sampling (see `sampleBatchGiven`), and all of whose
+		dependencies do too, is sampled n times using NumPy. Other quantities, e.g.
+		Objects, are left alone, but the numeric distributions they depend on are still
+		sampled. The *i*-th elements of the resulting arrays can be passed to `sampleAll`
+		to complete the *i*-th sample.
+
+		Args:
+			quantities: Samplables to sample.
+			n (int): number of samples to draw.
+			rng (:obj:`numpy.random.Generator`): source of randomness.
+
+		Returns:
+			A `DefaultIdentityDict` mapping each batch-sampled quantity to a NumPy array of
+			n values.
+		"""
+		batch = DefaultIdentityDict()
+		visited = set()
+		def visit(quantity):
+			if id(quantity) in visited:
+				return
+			visited.add(id(quantity))
+			conditioned = quantity._conditioned
+			for child in conditioned._dependencies:
+				visit(child)
+			if not all(child in batch for child in conditioned._dependencies):
+				return
+			try:
+				with numpy.errstate(all='raise'):
+					values = conditioned.sampleBatchGiven(batch, n, rng)
+			except (NotImplementedError, ArithmeticError, TypeError, ValueError,
+			        RejectionException):
+				return		# fall back to sampling this quantity individually
+			assert values.shape == (n,), (quantity, values.shape)
+			batch[quantity] = values
+		for q in quantities:
+			if isinstance(q, Samplable):
+				visit(q)
+		return batch
+
 	def sampleGiven(self, value):
 		"""Sample this value, given values for all its dependencies.
 
@@ -120,6 +282,14 @@ class Samplable(LazilyEvaluable):
 		"""
 		return DefaultIdentityDict({ dep: value[dep] for dep in self._dependencies })
 
+	def sampleBatchGiven(self, value, n, rng):
+		"""Sample n values at once, given arrays of n values for all dependencies.
+
+		Used by `batchSampleAll`. Only supported by numeric distributions, so the default
+		implementation raises NotImplementedError.
+		"""
+		raise NotImplementedError('batch sampling not supported')
+
 	def conditionTo(self, value):
 		"""Condition this value to another value with the same conditional distribution."""
 		assert isinstance(value, Samplable)
@@ -327,6 +497,20 @@ class FunctionDistribution(Distribution):
 		kwargs = { name: value[arg] for name, arg in self.kwargs.items() }
 		return self.function(*args, **kwargs)
 
+	def sampleBatchGiven(self, value, n, rng):
+		if any(isinstance(arg, StarredDistribution) for arg in self.arguments):
+			raise NotImplementedError('cannot batch-sample function with unpacked arguments')
+		args = [_batchColumn(value, arg, n) for arg in self.arguments]
+		kwargs = { name: _batchColumn(value, arg, n) for name, arg in self.kwargs.items() }
+		results = []
+		for i in range(n):
+			kwvals = { name: column[i] for name, column in kwargs.items() }
+			results.append(self.function(*(column[i] for column in args), **kwvals))
+		types = set(type(result) for result in results)
+		if len(types) != 1 or not types.pop() in (bool, int, float):
+			raise NotImplementedError('cannot batch-sample function with non-numeric values')
+		return numpy.array(results)
+
 	def evaluateInner(self, context):
 		function = valueInContext(self.function, context)
 		arguments = tuple(valueInContext(arg, context) for arg in self.arguments)
@@ -539,6 +723,14 @@ class OperatorDistribution(Distribution):
 			result = op(*rest)
 		return result
 
+	def sampleBatchGiven(self, value, n, rng):
+		op = batchOperators.get(self.operator)
+		if op is None:
+			raise NotImplementedError(f'cannot batch-sample operator {self.operator}')
+		first = _batchArray(value, self.object, n)
+		rest = (_batchArray(value, child, n) for child in self.operands)
+		return op(first, *rest)
+
 	def evaluateInner(self, context):
 		obj = valueInContext(self.object, context)
 		operands = tuple(valueInContext(arg, context) for arg in self.operands)
@@ -604,7 +796,19 @@ def makeOperatorHandler(op):
 for op in allowedOperators:
 	setattr(Distribution, op, makeOperatorHandler(op))
 
-import scenic.core.type_support as type_support
+# Implementations of operators over NumPy arrays, for batch sampling
+batchOperators = {
+	'__neg__': operator.neg,
+	'__pos__': operator.pos,
+	'__abs__': operator.abs,
+	'__add__': operator.add, '__radd__': lambda a, b: b + a,
+	'__sub__': operator.sub, '__rsub__': lambda a, b: b - a,
+	'__mul__': operator.mul, '__rmul__': lambda a, b: b * a,
+	'__truediv__': operator.truediv, '__rtruediv__': lambda a, b: b / a,
+	'__floordiv__': operator.floordiv, '__rfloordiv__': lambda a, b: b // a,
+	'__mod__': operator.mod, '__rmod__': lambda a, b: b % a,
+	'__pow__': operator.pow, '__rpow__': lambda a, b: b ** a,
+}
 
 class MultiplexerDistribution(Distribution):
 	"""Distribution selecting among values based on another distribution."""
@@ -613,6 +817,8 @@ class MultiplexerDistribution(Distribution):
 		self.index = index
 		self.options = tuple(toDistribution(opt) for opt in options)
 		assert len(self.options) > 0
+		# imported here since type_support depends on vectors, which depends on us
+		import scenic.core.type_support as type_support
 		valueType = type_support.unifyingType(self.options)
 		super().__init__(index, *self.options, valueType=valueType)
 
@@ -621,6 +827,14 @@ class MultiplexerDistribution(Distribution):
 		assert 0 <= idx < len(self.options), (idx, len(self.options))
 		return value[self.options[idx]]
 
+	def sampleBatchGiven(self, value, n, rng):
+		indices = _batchArray(value, self.index, n)
+		options = [_batchArray(value, opt, n) for opt in self.options]
+		if len(set(option.dtype.kind for option in options)) != 1:
+			# avoid silently converting some options to a different type
+			raise NotImplementedError('cannot batch-sample options of different types')
+		return numpy.stack(options)[indices, numpy.arange(n)]
+
 	def evaluateInner(self, context):
 		return type(self)(valueInContext(self.index, context),
 		                  (valueInContext(opt, context) for opt in self.options))
@@ -636,6 +850,7 @@ class MultiplexerDistribution(Distribution):
 class Range(Distribution):
 	"""Uniform distribution over a range"""
 	def __init__(self, low, high):
+		import scenic.core.type_support as type_support
 		low = type_support.toScalar(low, f'Range endpoint {low} is not a scalar')
 		high = type_support.toScalar(high, f'Range endpoint {high} is not a scalar')
 		super().__init__(low, high, valueType=float)
@@ -665,6 +880,9 @@ class Range(Distribution):
 	def sampleGiven(self, value):
 		return random.uniform(value[self.low], value[self.high])
 
+	def sampleBatchGiven(self, value, n, rng):
+		return rng.uniform(value[self.low], value[self.high], n)
+
 	def evaluateInner(self, context):
 		low = valueInContext(self.low, context)
 		high = valueInContext(self.high, context)
@@ -682,6 +900,7 @@ class Range(Distribution):
 class Normal(Distribution):
 	"""Normal distribution"""
 	def __init__(self, mean, stddev):
+		import scenic.core.type_support as type_support
 		mean = type_support.toScalar(mean, f'Normal mean {mean} is not a scalar')
 		stddev = type_support.toScalar(stddev, f'Normal stddev {stddev} is not a scalar')
 		super().__init__(mean, stddev, valueType=float)
@@ -740,6 +959,9 @@ class Normal(Distribution):
 	def sampleGiven(self, value):
 		return random.gauss(value[self.mean], value[self.stddev])
 
+	def sampleBatchGiven(self, value, n, rng):
+		return rng.normal(value[self.mean], value[self.stddev], n)
+
 	def evaluateInner(self, context):
 		mean = valueInContext(self.mean, context)
 		stddev = valueInContext(self.stddev, context)
@@ -811,6 +1033,16 @@ class TruncatedNormal(Normal):
 		p = alpha_cdf + unif * (beta_cdf - alpha_cdf)
 		return mean + (stddev * Normal.cdfinv(0, 1, p))
 
+	def sampleBatchGiven(self, value, n, rng):
+		import scipy.special	# slow import not often needed
+		mean, stddev = value[self.mean], value[self.stddev]
+		alpha_cdf = (1 + scipy.special.erf((self.low - mean) / (sqrt2 * stddev))) / 2
+		beta_cdf = (1 + scipy.special.erf((self.high - mean) / (sqrt2 * stddev))) / 2
+		if numpy.any(beta_cdf - alpha_cdf < 1e-15):
+			warnings.warn('low precision when sampling TruncatedNormal')
+		p = alpha_cdf + rng.random(n) * (beta_cdf - alpha_cdf)
+		return mean + (sqrt2 * stddev * scipy.special.erfinv(2*p - 1))
+
 	def evaluateInner(self, context):
 		mean = valueInContext(self.mean, context)
 		stddev = valueInContext(self.stddev, context)
@@ -859,6 +1091,12 @@ class DiscreteRange(Distribution):
 	def sampleGiven(self, value):
 		return random.choices(self.options, cum_weights=self.cumulativeWeights)[0]
 
+	def sampleBatchGiven(self, value, n, rng):
+		# same procedure as random.choices, but vectorized
+		cumWeights = numpy.array(self.cumulativeWeights)
+		indices = numpy.searchsorted(cumWeights, rng.random(n) * cumWeights[-1], side='right')
+		return self.low + numpy.minimum(indices, len(cumWeights) - 1)
+
 	def isEquivalentTo(self, other):
 		if not type(other) is DiscreteRange:
 			return False
@@ -948,6 +1186,7 @@ class UniformDistribution(Distribution):
 	"""
 	def __init__(self, opts):
 		self.options = opts
+		import scenic.core.type_support as type_support
 		valueType = type_support.unifyingType(self.options)
 		super().__init__(*self.options, valueType=valueType)
 
@@ -2,11 +2,13 @@
 
 import math
 import itertools
+import collections
 import warnings
 
 import numpy as np
 import shapely.geometry
 import shapely.ops
+import shapely.vectorized
 
 from scenic.core.distributions import (needsSampling, distributionFunction,
                                        monotonicDistributionFunction)
@@ -112,6 +114,15 @@ def pointIsInCone(point, base, heading, angle):
 	va = viewAngleToPoint(point, base, heading)
 	return (abs(va) <= angle / 2.0)
 
+def toPointArray(points):
+	"""Convert a sequence of points to a NumPy array of shape (n, 2)."""
+	points = np.asarray(points, dtype=float)
+	if points.size == 0:
+		return points.reshape((0, 2))
+	if points.ndim != 2 or points.shape[1] != 2:
+		raise ValueError(f'expected an array of 2D points, got shape {points.shape}')
+	return points
+
 def distanceToLine(point, a, b):
 	lx, ly = b[0] - a[0], b[1] - a[1]
 	norm = math.hypot(lx, ly)
@@ -131,6 +142,27 @@ def distanceToSegment(point, a, b):
 	else:
 		return abs((py * lx) - (px * ly)) / lnorm
 
+def projectOntoSegments(points, segments):
+	"""Vectorized projection of points onto line segments.
+
+	Args:
+		points: array of shape (n, 2).
+		segments: array of shape (n, 4) whose rows give the endpoints of the segments
+		  to project the corresponding points onto.
+
+	Returns:
+		A pair of arrays of shape (n,) giving the positions of the closest points along
+		the segments (as fractions of their lengths) and the distances to them.
+	"""
+	ax, ay, bx, by = segments.T
+	lx, ly = bx - ax, by - ay
+	px, py = points[:, 0] - ax, points[:, 1] - ay
+	lengthSquared = (lx * lx) + (ly * ly)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		t = np.where(lengthSquared > 0, ((px * lx) + (py * ly)) / lengthSquared, 0)
+	t = np.clip(t, 0, 1)
+	return t, np.hypot(px - (t * lx), py - (t * ly))
+
 def polygonUnion(polys, buf=0, tolerance=0, holeTolerance=0.002):
 	if not polys:
 		return shapely.geometry.Polygon()
@@ -387,15 +419,314 @@ def plotPolygon(polygon, plt, style='r-', **kwargs):
 		else:
 			raise RuntimeError(f'unknown kind of shapely geometry {polygon}')
 
+def rectangleCorners(x, y, heading, hw, hl):
+	"""Vectorized version of `_RotatedRectangle.makeCorners`.
+
+	Takes arrays of n positions, headings, half-widths and half-lengths, and returns
+	an array of shape (n, 4, 2) giving the corners of each rectangle.
+	"""
+	s, c = np.sin(heading), np.cos(heading)
+	s_hw, c_hw = s*hw, c*hw
+	s_hl, c_hl = s*hl, c*hl
+	xs = np.stack((x + c_hw - s_hl, x - c_hw - s_hl, x - c_hw + s_hl, x + c_hw + s_hl),
+	              axis=-1)
+	ys = np.stack((y + s_hw + c_hl, y - s_hw + c_hl, y - s_hw - c_hl, y + s_hw - c_hl),
+	              axis=-1)
+	return np.stack((xs, ys), axis=-1)
+
+def rectanglesSeparated(first, second):
+	"""Vectorized version of `_RotatedRectangle.hasSeparatingAxisWith`.
+
+	Each argument is an array of shape (n, 5) whose rows give the x and y coordinates,
+	heading, half-width, and half-length of a rectangle. Returns an array of n booleans
+	saying whether the corresponding rectangles are separated.
+	"""
+	x1, y1, h1, hw1, hl1 = first.T
+	x2, y2, h2, hw2, hl2 = second.T
+	dx, dy = x2 - x1, y2 - y1
+	s1, c1 = np.sin(h1), np.cos(h1)
+	s2, c2 = np.sin(h2), np.cos(h2)
+	cr, sr = np.abs((c1 * c2) + (s1 * s2)), np.abs((s1 * c2) - (c1 * s2))
+	return ((np.abs((c1 * dx) + (s1 * dy)) > hw1 + (hw2 * cr) + (hl2 * sr))
+	        | (np.abs((c1 * dy) - (s1 * dx)) > hl1 + (hw2 * sr) + (hl2 * cr))
+	        | (np.abs((c2 * dx) + (s2 * dy)) > hw2 + (hw1 * cr) + (hl1 * sr))
+	        | (np.abs((c2 * dy) - (s2 * dx)) > hl2 + (hw1 * sr) + (hl1 * cr)))
+
+class BoundingBoxGrid:
+	"""Uniform grid index over a sequence of axis-aligned bounding boxes.
+
+	Used to quickly find which of many shapes (e.g. the cells of a vector field) might
+	contain a point, preserving the order in which the shapes were given.
+
+	Arguments:
+		boxes: sequence of bounding boxes ``(minx, miny, maxx, maxy)``. A box may also be
+			:obj:`None`, meaning it is unbounded and so a candidate for every point, or
+			an empty tuple, meaning it contains no points (as for empty Shapely geometry).
+		maxBucketsPerBox (int): boxes covering more grid buckets than this are treated
+			as unbounded, to keep the index small.
+	"""
+	def __init__(self, boxes, maxBucketsPerBox=64):
+		boxes = list(boxes)
+		self.size = len(boxes)
+		bounded = [(index, box) for index, box in enumerate(boxes) if box]
+		extents = [box[2] - box[0] for index, box in bounded]
+		extents.extend(box[3] - box[1] for index, box in bounded)
+		cellSize = float(np.median(extents)) if extents else 0
+		self.cellSize = cellSize if cellSize > 0 else 1
+
+		everywhere = [index for index, box in enumerate(boxes) if box is None]
+		buckets = collections.defaultdict(list)
+		for index, (minx, miny, maxx, maxy) in bounded:
+			i0, j0 = self._bucket(minx, miny)
+			i1, j1 = self._bucket(maxx, maxy)
+			if (i1 - i0 + 1) * (j1 - j0 + 1) > maxBucketsPerBox:
+				everywhere.append(index)
+				continue
+			for i in range(i0, i1+1):
+				for j in range(j0, j1+1):
+					buckets[i, j].append(index)
+		everywhere.sort()
+		self.everywhere = tuple(everywhere)
+		if everywhere:
+			self.buckets = {key: tuple(sorted(bucket + everywhere))
+			                for key, bucket in buckets.items()}
+		else:
+			self.buckets = {key: tuple(bucket) for key, bucket in buckets.items()}
+
+	def _bucket(self, x, y):
+		return (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+
+	def candidatesFor(self, point):
+		"""Indices of the boxes which may contain the given point, in increasing order."""
+		return self.buckets.get(self._bucket(point[0], point[1]), self.everywhere)
+
+	def firstContaining(self, points, contains):
+		"""Find, for each of a batch of points, the first shape containing it.
+
+		Arguments:
+			points: array of shape (n, 2).
+			contains: function taking the index of a shape and an array of points, and
+				returning an array of booleans saying which points the shape contains.
+
+		Returns:
+			An array of n indices, with -1 for points not contained in any shape.
+		"""
+		points = toPointArray(points)
+		owners = np.full(len(points), -1, dtype=int)
+		if len(points) == 0:
+			return owners
+		keys = np.floor(points / self.cellSize)
+		candidates = [self.buckets.get((int(i), int(j)), self.everywhere) for i, j in keys]
+		# Test the first candidate of every point, then the second candidate of every
+		# point not yet matched, etc., grouping the tests by shape
+		pending = range(len(points))
+		rank = 0
+		while pending:
+			groups = collections.defaultdict(list)
+			for p in pending:
+				shapes = candidates[p]
+				if rank < len(shapes):
+					groups[shapes[rank]].append(p)
+			pending = []
+			for index, group in groups.items():
+				hits = contains(index, points[group])
+				for p, hit in zip(group, hits):
+					if hit:
+						owners[p] = index
+					else:
+						pending.append(p)
+			rank += 1
+		return owners
+
+class RasterIndex:
+	"""Raster over a sequence of polygons, supporting constant-time point location.
+
+	The plane is divided into square cells of side **resolution** (aligned with the
+	origin). Each cell stores the index of the first polygon containing the whole cell,
+	`EMPTY` if no polygon comes within **margin** of the cell, or `UNKNOWN` otherwise
+	(e.g. if the cell straddles the boundary of a polygon). So for a point in a cell
+	which is not `UNKNOWN`, the stored value is the index of the first polygon
+	containing the point, or `EMPTY` if there is no polygon within **margin** of it;
+	for points in `UNKNOWN` cells the caller must fall back on an exact test.
+
+	Arguments:
+		polygons: sequence of Shapely polygons or multipolygons.
+		resolution (float): side length of the cells.
+		margin (float): distance within which points count as close to a polygon
+			(default 0).
+	"""
+	EMPTY = -1
+	UNKNOWN = -2
+
+	def __init__(self, polygons, resolution, margin=0):
+		if not resolution > 0:
+			raise ValueError(f'raster resolution must be positive, not {resolution}')
+		self.resolution = float(resolution)
+		polygons = list(polygons)
+		bounds = np.array([polygon.bounds for polygon in polygons if not polygon.is_empty])
+		if len(bounds) == 0:
+			self.row0 = self.col0 = 0
+			self.cells = np.zeros((0, 0), dtype=np.int32)
+			return
+		# pad cells slightly so that rounding cannot put points in the wrong cell
+		self.pad = margin + (1e-9 * (1 + np.abs(bounds).max()))
+		(self.col0, self.row0), (col1, row1) = self._cellRange(bounds[:, 0].min(),
+		    bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+		shape = (row1 - self.row0 + 1, col1 - self.col0 + 1)
+		self.cells = np.full(shape, self.EMPTY, dtype=np.int32)
+		for index, polygon in enumerate(polygons):
+			if not polygon.is_empty:
+				self._addPolygon(index, polygon)
+
+	def _cellRange(self, minx, miny, maxx, maxy):
+		res, pad = self.resolution, self.pad
+		return ((math.floor((minx - pad) / res), math.floor((miny - pad) / res)),
+		        (math.floor((maxx + pad) / res), math.floor((maxy + pad) / res)))
+
+	def _addPolygon(self, index, polygon):
+		res = self.resolution
+		(c0, r0), (c1, r1) = self._cellRange(*polygon.bounds)
+		height, width = r1 - r0 + 1, c1 - c0 + 1
+		# find cells whose (padded) boxes meet the boundary of the polygon
+		boundary = np.zeros((height, width), dtype=bool)
+		parts = polygon.geoms if hasattr(polygon, 'geoms') else (polygon,)
+		rings = [ring for part in parts for ring in (part.exterior, *part.interiors)]
+		rows, cols = self._cellsMeetingRings(rings)
+		boundary[rows - r0, cols - c0] = True
+		# the remaining cells are entirely inside or outside the polygon, and this is
+		# constant along horizontal runs of cells, so test one cell center per run
+		free = ~boundary
+		starts = free.copy()
+		starts[:, 1:] &= boundary[:, :-1]
+		startRows, startCols = np.nonzero(starts)
+		if len(startRows) == 0:
+			inside = np.zeros((height, width), dtype=bool)
+		else:
+			x, y = (c0 + startCols + 0.5) * res, (r0 + startRows + 0.5) * res
+			runInside = shapely.vectorized.contains(polygon, x, y)
+			runs = np.cumsum(starts.ravel()).reshape((height, width)) - 1
+			inside = free & runInside[runs]
+		window = self.cells[r0 - self.row0:r1 - self.row0 + 1,
+		                    c0 - self.col0:c1 - self.col0 + 1]
+		untouched = (window == self.EMPTY)
+		window[untouched & inside] = index
+		window[untouched & boundary] = self.UNKNOWN
+
+	def _cellsMeetingRings(self, rings):
+		res, pad = self.resolution, self.pad
+		segments = []
+		for ring in rings:
+			coords = np.asarray(ring.coords)
+			segments.append(np.hstack((coords[:-1], coords[1:])))
+		x0, y0, x1, y1 = np.concatenate(segments).T
+		# enumerate the cells meeting the bounding box of each segment...
+		c0 = np.floor((np.minimum(x0, x1) - pad) / res).astype(int)
+		c1 = np.floor((np.maximum(x0, x1) + pad) / res).astype(int)
+		r0 = np.floor((np.minimum(y0, y1) - pad) / res).astype(int)
+		r1 = np.floor((np.maximum(y0, y1) + pad) / res).astype(int)
+		ncols = c1 - c0 + 1
+		counts = ncols * (r1 - r0 + 1)
+		seg = np.repeat(np.arange(len(counts)), counts)
+		offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+		cols = c0[seg] + (offsets % ncols[seg])
+		rows = r0[seg] + (offsets // ncols[seg])
+		# ...and keep those whose padded boxes have corners on both sides of its line
+		dx, dy = x1[seg] - x0[seg], y1[seg] - y0[seg]
+		bx0, bx1 = (cols * res) - pad - x0[seg], ((cols + 1) * res) + pad - x0[seg]
+		by0, by1 = (rows * res) - pad - y0[seg], ((rows + 1) * res) + pad - y0[seg]
+		ya, yb = dx * by0, dx * by1
+		xa, xb = dy * bx0, dy * bx1
+		high = np.maximum(ya, yb) - np.minimum(xa, xb)
+		low = np.minimum(ya, yb) - np.maximum(xa, xb)
+		meets = (low <= 0) & (high >= 0)
+		return rows[meets], cols[meets]
+
+	def cellOf(self, point):
+		"""Get the row and column of the stored cell containing a point, if any."""
+		row = math.floor(point[1] / self.resolution) - self.row0
+		col = math.floor(point[0] / self.resolution) - self.col0
+		height, width = self.cells.shape
+		if 0 <= row < height and 0 <= col < width:
+			return row, col
+		return None
+
+	def indexAt(self, point):
+		"""Look up the cell containing a point (see above for the meaning of the result)."""
+		cell = self.cellOf(point)
+		return self.EMPTY if cell is None else int(self.cells[cell])
+
+	def indicesAt(self, points):
+		"""Vectorized version of `indexAt`, taking an array of shape (n, 2)."""
+		points = toPointArray(points)
+		rows = np.floor(points[:, 1] / self.resolution).astype(int)
+		cols = np.floor(points[:, 0] / self.resolution).astype(int)
+		return self.indicesOfCells(rows, cols)
+
+	def indicesOfCells(self, rows, cols):
+		"""Look up cells given by arrays of (absolute) row and column numbers."""
+		rows, cols = rows - self.row0, cols - self.col0
+		height, width = self.cells.shape
+		valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+		indices = np.full(len(rows), self.EMPTY, dtype=np.int32)
+		indices[valid] = self.cells[rows[valid], cols[valid]]
+		return indices
+
 class _RotatedRectangle:
 	"""mixin providing collision detection for rectangular objects and regions"""
 	def containsPoint(self, point):
-		pt = shapely.geometry.Point(point)
-		return self.polygon.intersects(pt)
+		lx, ly = self.toLocalFrame(point)
+		return abs(lx) <= self.hw and abs(ly) <= self.hl
+
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		# transform points into the local frame of the rectangle
+		dx, dy = points[:, 0] - self.position.x, points[:, 1] - self.position.y
+		s, c = math.sin(self.heading), math.cos(self.heading)
+		lx = (c * dx) + (s * dy)
+		ly = (c * dy) - (s * dx)
+		return (np.abs(lx) <= self.hw) & (np.abs(ly) <= self.hl)
+
+	def toLocalFrame(self, point):
+		"""Coordinates of a point along the width and length axes of the rectangle."""
+		x, y = point
+		dx, dy = x - self.position.x, y - self.position.y
+		s, c = math.sin(self.heading), math.cos(self.heading)
+		return ((c * dx) + (s * dy), (c * dy) - (s * dx))
+
+	def rectDistanceTo(self, point):
+		"""Distance from a point to the rectangle (zero if the point is inside)."""
+		lx, ly = self.toLocalFrame(point)
+		ox, oy = abs(lx) - self.hw, abs(ly) - self.hl
+		if ox <= 0:
+			return oy if oy > 0 else 0
+		elif oy <= 0:
+			return ox
+		return math.hypot(ox, oy)
 
 	def intersects(self, rect):
+		if isinstance(rect, _RotatedRectangle):
+			return not self.hasSeparatingAxisWith(rect)
 		return self.polygon.intersects(rect.polygon)
 
+	def hasSeparatingAxisWith(self, rect):
+		"""Whether the rectangle is separated from another, by the separating axis theorem.
+
+		For two rectangles the only candidate axes are the directions of their sides.
+		Rectangles which merely touch are not considered separated, consistently with
+		Shapely's ``intersects``.
+		"""
+		dx = rect.position.x - self.position.x
+		dy = rect.position.y - self.position.y
+		s1, c1 = math.sin(self.heading), math.cos(self.heading)
+		s2, c2 = math.sin(rect.heading), math.cos(rect.heading)
+		# absolute cosine and sine of the angle between the rectangles
+		cr, sr = abs((c1 * c2) + (s1 * s2)), abs((s1 * c2) - (c1 * s2))
+		hw1, hl1, hw2, hl2 = self.hw, self.hl, rect.hw, rect.hl
+		return (abs((c1 * dx) + (s1 * dy)) > hw1 + (hw2 * cr) + (hl2 * sr)
+		        or abs((c1 * dy) - (s1 * dx)) > hl1 + (hw2 * sr) + (hl2 * cr)
+		        or abs((c2 * dx) + (s2 * dy)) > hw2 + (hw1 * cr) + (hl1 * sr)
+		        or abs((c2 * dy) - (s2 * dx)) > hl2 + (hw1 * sr) + (hl1 * cr))
+
 	@cached_property
 	def polygon(self):
 		position, heading, hw, hl = self.position, self.heading, self.hw, self.hl
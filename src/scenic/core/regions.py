@@ -8,6 +8,7 @@ import numpy
 import shapely.geometry
 import shapely.ops
 import shapely.prepared
+import shapely.vectorized
 
 from scenic.core.distributions import (Samplable, RejectionException, needsSampling,
                                        distributionMethod)
@@ -16,6 +17,8 @@ from scenic.core.vectors import Vector, OrientedVector, VectorDistribution, Vect
 from scenic.core.geometry import _RotatedRectangle
 from scenic.core.geometry import sin, cos, hypot, findMinMax, pointIsInCone, averageVectors
 from scenic.core.geometry import headingOfSegment, triangulatePolygon, plotPolygon, polygonUnion
+from scenic.core.geometry import toPointArray, distanceToSegment, projectOntoSegments
+from scenic.core.geometry import RasterIndex
 from scenic.core.type_support import toVector
 from scenic.core.utils import cached, cached_property, areEquivalent
 
@@ -42,6 +45,117 @@ def regionFromShapelyObject(obj, orientation=None):
 	else:
 		raise RuntimeError(f'unhandled type of Shapely geometry: {obj}')
 
+def _polygonalBounds(region):
+	"""Get polygons approximating a `Region` from outside and inside, if possible.
+
+	Returns a pair of Shapely geometries, the first containing the region and the second
+	contained in it, or :obj:`None` if the region cannot be converted to polygons.
+	"""
+	poly = toPolygon(region)
+	if not isinstance(poly, (shapely.geometry.Polygon, shapely.geometry.MultiPolygon)):
+		return None
+	if isinstance(region, (CircularRegion, SectorRegion)):
+		# the polygon is inscribed in the region, with its arcs replaced by chords
+		# subtending angles of at most pi/(2*resolution)
+		sagitta = region.radius * (1 - cos(math.pi / (4 * region.resolution)))
+		mitre = shapely.geometry.JOIN_STYLE.mitre
+		return poly.buffer(1.01 * sagitta, join_style=mitre), poly
+	return poly, poly
+
+def _polygonalRegionFrom(geometry):
+	"""Get a `PolygonalRegion` for the polygonal parts of a Shapely geometry.
+
+	Returns `nowhere` if the geometry has no polygonal parts.
+	"""
+	if isinstance(geometry, shapely.geometry.Polygon):
+		polygons = [geometry]
+	elif isinstance(geometry, (shapely.geometry.MultiPolygon,
+	                           shapely.geometry.GeometryCollection)):
+		polygons = [geom for geom in geometry.geoms
+		            if isinstance(geom, shapely.geometry.Polygon)]
+	else:
+		polygons = []
+	polygons = [poly for poly in polygons if not poly.is_empty]
+	if not polygons:
+		return nowhere
+	return PolygonalRegion(polygon=shapely.geometry.MultiPolygon(polygons))
+
+def _boundingBoxOf(regions):
+	"""Intersect the bounding boxes of some regions, skipping those which have none.
+
+	Returns a tuple (minx, miny, maxx, maxy), which is empty if the boxes are disjoint,
+	or :obj:`None` if none of the regions have bounding boxes.
+	"""
+	box = None
+	for region in regions:
+		if needsSampling(region):
+			continue
+		try:
+			(minx, miny), (maxx, maxy) = region.getAABB()
+		except NotImplementedError:
+			continue
+		if box is not None:
+			minx, miny = max(minx, box[0]), max(miny, box[1])
+			maxx, maxy = min(maxx, box[2]), min(maxy, box[3])
+		if minx > maxx or miny > maxy:
+			return ()
+		box = (minx, miny, maxx, maxy)
+	return box
+
+def _lazyAttribute(region, name):
+	"""Implementation of ``__getattr__`` for regions whose geometry is loaded lazily.
+
+	Regions can be unpickled without some of their geometry (see for example
+	`Network.fromPickle`), storing instead in their ``_lazyGeometry`` attribute an
+	object whose ``load`` method fills in the missing attributes when first needed.
+	"""
+	loader = region.__dict__.get('_lazyGeometry')
+	if loader is not None and loader.load(region, name):
+		if name in region.__dict__:
+			return region.__dict__[name]
+	raise AttributeError(f"'{type(region).__name__}' object has no attribute '{name}'")
+
+def _loadLazyGeometry(region):
+	"""Load all of the geometry of a region, if it was being loaded lazily."""
+	loader = region.__dict__.get('_lazyGeometry')
+	if loader is not None:
+		loader.loadAll(region)
+
+class SamplerStatistics:
+	"""Acceptance statistics for the rejection sampler of a derived `Region`.
+
+	Regions like `IntersectionRegion` sample points by proposing them from a simpler
+	region and rejecting those which fall outside the derived region. A low acceptance
+	rate means many scenes are being rejected because of the region, and suggests
+	constructing it differently. The statistics are shared by all samples of a random
+	region.
+
+	Attributes:
+		proposals (int): Number of points proposed.
+		acceptances (int): Number of points accepted.
+	"""
+	def __init__(self):
+		self.proposals = 0
+		self.acceptances = 0
+
+	def record(self, accepted):
+		self.proposals += 1
+		if accepted:
+			self.acceptances += 1
+
+	@property
+	def acceptanceRate(self):
+		"""Fraction of proposed points which were accepted (:obj:`None` if no proposals)."""
+		if self.proposals == 0:
+			return None
+		return self.acceptances / self.proposals
+
+	def __str__(self):
+		if self.proposals == 0:
+			return 'no proposals'
+		return (f'accepted {self.acceptances} of {self.proposals} proposals '
+		        f'({self.acceptanceRate:.1%})')
+
 class PointInRegionDistribution(VectorDistribution):
 	"""Uniform distribution over points in a Region"""
 	def __init__(self, region):
@@ -124,6 +238,22 @@ class Region(Samplable):
 		"""Check if the `Region` contains a point. Implemented by subclasses."""
 		raise NotImplementedError
 
+	def containsPoints(self, points):
+		"""Check which of an array of points lie in the `Region`.
+
+		The default implementation calls `containsPoint` on each point; subclasses
+		override it with vectorized versions where possible.
+
+		Args:
+			points: array-like of shape (n, 2) giving the coordinates of the points.
+
+		Returns:
+			A boolean NumPy array of length n.
+		"""
+		points = toPointArray(points)
+		return numpy.fromiter((self.containsPoint(Vector(x, y)) for x, y in points.tolist()),
+		                      dtype=bool, count=len(points))
+
 	def containsObject(self, obj):
 		"""Check if the `Region` contains an :obj:`~scenic.core.object_types.Object`.
 
@@ -177,6 +307,9 @@ class AllRegion(Region):
 	def containsPoint(self, point):
 		return True
 
+	def containsPoints(self, points):
+		return numpy.ones(len(toPointArray(points)), dtype=bool)
+
 	def containsObject(self, obj):
 		return True
 
@@ -203,6 +336,9 @@ class EmptyRegion(Region):
 	def containsPoint(self, point):
 		return False
 
+	def containsPoints(self, points):
+		return numpy.zeros(len(toPointArray(points)), dtype=bool)
+
 	def containsObject(self, obj):
 		return False
 
@@ -249,9 +385,26 @@ class CircularRegion(Region):
 		point = point.toVector()
 		return point.distanceTo(self.center) <= self.radius
 
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		x, y = self.center
+		return numpy.hypot(points[:, 0] - x, points[:, 1] - y) <= self.radius
+
 	def distanceTo(self, point):
 		return max(0, point.distanceTo(self.center) - self.radius)
 
+	def intersects(self, other):
+		if isinstance(other, CircularRegion):
+			return self.center.distanceTo(other.center) <= self.radius + other.radius
+		elif isinstance(other, (SectorRegion, PolygonalRegion)):
+			return other.distanceTo(self.center) <= self.radius
+		elif isinstance(other, _RotatedRectangle):
+			return other.rectDistanceTo(self.center) <= self.radius
+		poly = toPolygon(other)
+		if poly is not None:
+			return self.polygon.intersects(poly)
+		return super().intersects(other)
+
 	def uniformPointInner(self):
 		x, y = self.center
 		r = random.triangular(0, self.radius, self.radius)
@@ -287,20 +440,17 @@ class SectorRegion(Region):
 	@cached_property
 	def polygon(self):
 		center, radius = self.center, self.radius
-		ctr = shapely.geometry.Point(center)
-		circle = ctr.buffer(radius, resolution=self.resolution)
 		if self.angle >= math.tau - 0.001:
-			return circle
+			ctr = shapely.geometry.Point(center)
+			return ctr.buffer(radius, resolution=self.resolution)
 		else:
-			heading = self.heading
-			half_angle = self.angle / 2
-			mask = shapely.geometry.Polygon([
-			    center,
-			    center.offsetRadially(radius, heading + half_angle),
-			    center.offsetRadially(2*radius, heading),
-			    center.offsetRadially(radius, heading - half_angle)
-			])
-			return circle & mask
+			# use as many segments for the arc as buffer would for a full circle
+			segments = max(1, math.ceil(4 * self.resolution * self.angle / math.tau))
+			start = self.heading - (self.angle / 2)
+			step = self.angle / segments
+			arc = (center.offsetRadially(radius, start + (i * step))
+			       for i in range(segments + 1))
+			return shapely.geometry.Polygon([center, *arc])
 
 	def sampleGiven(self, value):
 		return SectorRegion(value[self.center], value[self.radius],
@@ -321,6 +471,39 @@ class SectorRegion(Region):
 			return False
 		return point.distanceTo(self.center) <= self.radius
 
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		x, y = self.center
+		dx, dy = points[:, 0] - x, points[:, 1] - y
+		viewAngles = numpy.arctan2(dy, dx) - (self.heading + (math.pi / 2))
+		viewAngles = numpy.remainder(viewAngles + math.pi, math.tau) - math.pi
+		inCone = numpy.abs(viewAngles) <= self.angle / 2
+		return inCone & (numpy.hypot(dx, dy) <= self.radius)
+
+	def containsObject(self, obj):
+		if math.pi < self.angle < math.tau:	# not convex, so checking corners isn't enough
+			return self.polygon.contains(obj.polygon)
+		return super().containsObject(obj)
+
+	def distanceTo(self, point):
+		point = tuple(point)
+		center = tuple(self.center)
+		if pointIsInCone(point, center, self.heading, self.angle):
+			return max(0, math.hypot(point[0] - center[0], point[1] - center[1]) - self.radius)
+		# otherwise the closest point lies on one of the straight edges
+		halfAngle = self.angle / 2
+		edges = (self.center.offsetRadially(self.radius, self.heading + halfAngle),
+		         self.center.offsetRadially(self.radius, self.heading - halfAngle))
+		return min(distanceToSegment(point, center, tuple(edge)) for edge in edges)
+
+	def intersects(self, other):
+		if isinstance(other, CircularRegion):
+			return self.distanceTo(other.center) <= other.radius
+		poly = toPolygon(other)
+		if poly is not None:
+			return self.polygon.intersects(poly)
+		return super().intersects(other)
+
 	def uniformPointInner(self):
 		x, y = self.center
 		heading, angle, maxDist = self.heading, self.angle, self.radius
@@ -368,6 +551,14 @@ class RectangularRegion(_RotatedRectangle, Region):
 		return RectangularRegion(position, heading, width, length,
 		                         name=self.name)
 
+	def distanceTo(self, point):
+		return self.rectDistanceTo(point)
+
+	def intersects(self, other):
+		if isinstance(other, (CircularRegion, SectorRegion)):
+			return other.intersects(self)
+		return super().intersects(other)
+
 	def uniformPointInner(self):
 		hw, hl = self.hw, self.hl
 		rx = random.uniform(-hw, hw)
@@ -532,7 +723,11 @@ class PolylineRegion(Region):
 
 	@distributionMethod
 	def distanceTo(self, point):
-		return self.lineString.distance(shapely.geometry.Point(point))
+		return self._nearestSegment(point)[2]
+
+	def distancesTo(self, points):
+		"""Vectorized version of `distanceTo`, taking an array of shape (n, 2)."""
+		return self._nearestSegments(points)[2]
 
 	@distributionMethod
 	def signedDistanceTo(self, point):
@@ -541,34 +736,171 @@ class PolylineRegion(Region):
 		The distance is positive if the point is left of the nearest segment,
 		and negative otherwise.
 		"""
-		dist = self.distanceTo(point)
-		start, end = self.nearestSegmentTo(point)
-		rp = point - start
-		tangent = end - start
-		return dist if tangent.angleWith(rp) >= 0 else -dist
+		index, fraction, distance = self._nearestSegment(point)
+		(ax, ay), (bx, by) = self.segments[index]
+		x, y = point
+		cross = ((bx - ax) * (y - ay)) - ((by - ay) * (x - ax))
+		return distance if cross >= 0 else -distance
+
+	def signedDistancesTo(self, points):
+		"""Vectorized version of `signedDistanceTo`, taking an array of shape (n, 2)."""
+		points = toPointArray(points)
+		indices, fractions, distances = self._nearestSegments(points)
+		ax, ay, bx, by = self._segmentArray[indices].T
+		cross = ((bx - ax) * (points[:, 1] - ay)) - ((by - ay) * (points[:, 0] - ax))
+		return numpy.where(cross >= 0, distances, -distances)
 
 	@distributionMethod
 	def project(self, point):
-		return shapely.ops.nearest_points(self.lineString, shapely.geometry.Point(point))[0]
+		index, fraction, distance = self._nearestSegment(point)
+		(ax, ay), (bx, by) = self.segments[index]
+		return shapely.geometry.Point(ax + (fraction * (bx - ax)), ay + (fraction * (by - ay)))
+
+	def projectPoints(self, points):
+		"""Find the closest points on the polyline to an array of shape (n, 2).
+
+		Returns:
+			An array of shape (n, 2).
+		"""
+		indices, fractions, distances = self._nearestSegments(points)
+		segments = self._segmentArray[indices]
+		return segments[:, :2] + (fractions[:, numpy.newaxis] * (segments[:, 2:] - segments[:, :2]))
 
 	@distributionMethod
 	def nearestSegmentTo(self, point):
-		dist = self.lineString.project(shapely.geometry.Point(point))
-		# TODO optimize?
-		for segment, cumLen in zip(self.segments, self.cumulativeLengths):
-			if dist <= cumLen:
-				break
-		# FYI, could also get here if loop runs to completion due to rounding error
-		return (Vector(*segment[0]), Vector(*segment[1]))
+		index = self._nearestSegment(point)[0]
+		start, end = self.segments[index]
+		return (Vector(*start), Vector(*end))
+
+	def nearestSegmentIndices(self, points):
+		"""Find the nearest segments to an array of points of shape (n, 2).
+
+		Returns:
+			An array of n indices into `segments`.
+		"""
+		return self._nearestSegments(points)[0]
+
+	def _nearestSegment(self, point):
+		"""Scalar version of `_nearestSegments`, avoiding NumPy overhead."""
+		x, y = point
+		segments = self.segments
+		tree, owners, slack = self._segmentIndex
+		_, nearest = tree.query((x, y))
+		bound = distanceToSegment((x, y), *segments[owners[nearest]])
+		bound += slack + (1e-9 * (1 + bound))
+		best = None
+		for index in sorted(set(owners[tree.query_ball_point((x, y), bound)].tolist())):
+			(ax, ay), (bx, by) = segments[index]
+			lx, ly = bx - ax, by - ay
+			px, py = x - ax, y - ay
+			lengthSquared = (lx * lx) + (ly * ly)
+			if lengthSquared > 0:
+				fraction = min(1, max(0, ((px * lx) + (py * ly)) / lengthSquared))
+			else:
+				fraction = 0
+			distance = math.hypot(px - (fraction * lx), py - (fraction * ly))
+			if best is None or distance < best[2]:
+				best = (index, fraction, distance)
+		return best
+
+	def _nearestSegments(self, points):
+		"""Find the nearest segment to each of an array of points.
+
+		Ties are broken in favor of the segment which comes first along the polyline.
+
+		Returns:
+			A triple of arrays giving, for each point, the index of the nearest segment,
+			the position of the closest point along it (as a fraction of its length),
+			and the distance to that point.
+		"""
+		points = toPointArray(points)
+		if len(points) == 0:
+			return numpy.empty(0, dtype=int), numpy.empty(0), numpy.empty(0)
+		segments = self._segmentArray
+		tree, owners, slack = self._segmentIndex
+		# find an upper bound on the distance to the nearest segment...
+		_, nearest = tree.query(points)
+		_, bounds = projectOntoSegments(points, segments[owners[nearest]])
+		# ...then check all segments which could possibly be closer
+		bounds = bounds + slack + (1e-9 * (1 + bounds))
+		candidates = tree.query_ball_point(points, bounds)
+		counts = numpy.fromiter((len(c) for c in candidates), dtype=int, count=len(points))
+		pointIndices = numpy.repeat(numpy.arange(len(points)), counts)
+		segmentIndices = owners[numpy.concatenate(candidates).astype(int)]
+		fractions, distances = projectOntoSegments(points[pointIndices],
+		                                           segments[segmentIndices])
+		order = numpy.lexsort((segmentIndices, distances, pointIndices))
+		best = order[numpy.cumsum(counts) - counts]
+		return segmentIndices[best], fractions[best], distances[best]
+
+	@cached_property
+	def _segmentArray(self):
+		"""Array of shape (m, 4) giving the endpoints of the segments."""
+		return numpy.array([(*start[:2], *end[:2]) for start, end in self.segments],
+		                   dtype=float)
+
+	@cached_property
+	def _segmentIndex(self):
+		"""Spatial index for finding the segments nearest to a point.
+
+		Each segment is covered by pieces of length at most ``2*slack`` (about the
+		median segment length), and the midpoints of the pieces are put in a k-D tree
+		along with the indices of the segments they belong to. The distance from any
+		point to a segment is then at most ``slack`` less than its distance to the
+		midpoint of the segment's nearest piece.
+		"""
+		import scipy.spatial	# slow import not often needed
+		segments = self._segmentArray
+		starts, ends = segments[:, :2], segments[:, 2:]
+		lengths = numpy.hypot(*(ends - starts).T)
+		positive = lengths[lengths > 0]
+		slack = numpy.median(positive) / 2 if len(positive) > 0 else 1
+		pieces = numpy.maximum(numpy.ceil(lengths / (2 * slack)), 1).astype(int)
+		owners = numpy.repeat(numpy.arange(len(segments)), pieces)
+		firstPieces = numpy.cumsum(pieces) - pieces
+		fractions = (numpy.arange(len(owners)) - firstPieces[owners] + 0.5) / pieces[owners]
+		midpoints = (starts[owners]
+		             + (fractions[:, numpy.newaxis] * (ends[owners] - starts[owners])))
+		return scipy.spatial.cKDTree(midpoints), owners, slack
 
 	def pointAlongBy(self, distance, normalized=False):
-		pt = self.lineString.interpolate(distance, normalized=normalized)
-		return Vector(pt.x, pt.y)
+		return Vector(*self.pointsAlongBy((distance,), normalized=normalized)[0])
+
+	def pointsAlongBy(self, distances, normalized=False):
+		"""Vectorized version of `pointAlongBy`.
+
+		Takes an array of n distances along the polyline (which as for `pointAlongBy`
+		are clamped to the length of the polyline, and count back from its end if
+		negative), and returns an array of shape (n, 2).
+		"""
+		distances = numpy.asarray(distances, dtype=float)
+		cumulativeLengths = self._cumulativeLengthArray
+		length = cumulativeLengths[-1]
+		if normalized:
+			distances = distances * length
+		distances = numpy.where(distances < 0, distances + length, distances)
+		distances = numpy.clip(distances, 0, length)
+		# find the segment containing each distance by bisection
+		indices = numpy.searchsorted(cumulativeLengths, distances, side='left')
+		numpy.minimum(indices, len(cumulativeLengths) - 1, out=indices)
+		segments = self._segmentArray[indices]
+		ends = cumulativeLengths[indices]
+		segmentLengths = ends - numpy.concatenate(((0,), cumulativeLengths))[indices]
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			fractions = numpy.where(segmentLengths > 0,
+			                        1 - ((ends - distances) / segmentLengths), 0)
+		fractions = numpy.clip(fractions, 0, 1)
+		return segments[:, :2] + (fractions[:, numpy.newaxis] * (segments[:, 2:] - segments[:, :2]))
+
+	@cached_property
+	def _cumulativeLengthArray(self):
+		return numpy.array(self.cumulativeLengths)
 
 	def equallySpacedPoints(self, spacing, normalized=False):
 		if normalized:
 			spacing *= self.length
-		return [self.pointAlongBy(d) for d in numpy.arange(0, self.length, spacing)]
+		distances = numpy.arange(0, self.length, spacing)
+		return [Vector(x, y) for x, y in self.pointsAlongBy(distances).tolist()]
 
 	@property
 	def length(self):
@@ -618,8 +950,22 @@ class PolylineRegion(Region):
 	def __hash__(self):
 		return hash(str(self.lineString))
 
+	def __getattr__(self, name):
+		return _lazyAttribute(self, name)
+
+	def __getstate__(self):
+		_loadLazyGeometry(self)
+		state = self.__dict__.copy()
+		state.pop('_cached__segmentIndex', None)	# rebuilt quickly when needed
+		return state
+
 class PolygonalRegion(Region):
 	"""Region given by one or more polygons (possibly with holes)"""
+
+	#: Optional `RasterIndex` over the polygons, used to speed up containment tests;
+	#: see `rasterize`.
+	raster = None
+
 	def __init__(self, points=None, polygon=None, orientation=None, name=None):
 		super().__init__(name, orientation=orientation)
 		if polygon is None and points is None:
@@ -654,20 +1000,57 @@ class PolygonalRegion(Region):
 		for polygon in self.polygons:
 			triangles.extend(triangulatePolygon(polygon))
 		assert len(triangles) > 0, self.polygons
-		self.trianglesAndBounds = tuple((tri, tri.bounds) for tri in triangles)
+		self.triangles = tuple(tuple(tri.exterior.coords[:3]) for tri in triangles)
 		areas = (triangle.area for triangle in triangles)
 		self.cumulativeTriangleAreas = tuple(itertools.accumulate(areas))
 
 	def uniformPointInner(self):
-		triangle, bounds = random.choices(
-			self.trianglesAndBounds,
+		(ax, ay), (bx, by), (cx, cy) = random.choices(
+			self.triangles,
 			cum_weights=self.cumulativeTriangleAreas)[0]
-		minx, miny, maxx, maxy = bounds
-		# TODO improve?
-		while True:
-			x, y = random.uniform(minx, maxx), random.uniform(miny, maxy)
-			if triangle.intersects(shapely.geometry.Point(x, y)):
-				return self.orient(Vector(x, y))
+		# pick a uniform point in the parallelogram spanned by the triangle,
+		# reflecting it back into the triangle if necessary
+		u, v = random.random(), random.random()
+		if u + v > 1:
+			u, v = 1 - u, 1 - v
+		x = ax + u*(bx - ax) + v*(cx - ax)
+		y = ay + u*(by - ay) + v*(cy - ay)
+		return self.orient(Vector(x, y))
+
+	def uniformPoints(self, n, rng=None):
+		"""Sample n points uniformly at random from this region at once.
+
+		The points are not oriented; this is intended for code which needs many
+		positions, e.g. for estimating the area of a derived region.
+
+		Args:
+			n (int): number of points to sample.
+			rng (:obj:`numpy.random.Generator`, optional): source of randomness; if
+			  not given, one is seeded from Python's `random` module.
+
+		Returns:
+			A NumPy array of shape (n, 2) giving the coordinates of the points.
+		"""
+		if rng is None:
+			rng = numpy.random.default_rng(random.getrandbits(64))
+		vertices = self._triangleArray
+		cumulativeAreas = self._cumulativeAreaArray
+		targets = rng.uniform(0, cumulativeAreas[-1], size=n)
+		indices = numpy.searchsorted(cumulativeAreas, targets, side='right')
+		numpy.minimum(indices, len(cumulativeAreas) - 1, out=indices)  # guard rounding
+		a, b, c = vertices[indices, 0], vertices[indices, 1], vertices[indices, 2]
+		u, v = rng.random((2, n, 1))
+		flip = (u + v > 1)
+		u, v = numpy.where(flip, 1 - u, u), numpy.where(flip, 1 - v, v)
+		return a + u*(b - a) + v*(c - a)
+
+	@cached_property
+	def _triangleArray(self):
+		return numpy.array(self.triangles, dtype=float)
+
+	@cached_property
+	def _cumulativeAreaArray(self):
+		return numpy.array(self.cumulativeTriangleAreas)
 
 	def difference(self, other):
 		poly = toPolygon(other)
@@ -719,6 +1102,8 @@ class PolygonalRegion(Region):
 		return super().intersect(other, triedReversed)
 
 	def intersects(self, other):
+		if isinstance(other, CircularRegion):
+			return self.distanceTo(other.center) <= other.radius
 		poly = toPolygon(other)
 		if poly is not None:
 			intersection = self.polygons & poly
@@ -756,9 +1141,40 @@ class PolygonalRegion(Region):
 	def prepared(self):
 		return shapely.prepared.prep(self.polygons)
 
+	def rasterize(self, resolution):
+		"""Precompute a raster of this region to speed up containment tests.
+
+		Points far from the boundary of the region can then be tested in constant
+		time; the raster takes memory proportional to the area of the bounding box of
+		the region divided by the square of the **resolution**.
+		"""
+		self.raster = RasterIndex((self.polygons,), resolution)
+		return self.raster
+
 	def containsPoint(self, point):
+		if self.raster is not None:
+			index = self.raster.indexAt(point)
+			if index != RasterIndex.UNKNOWN:
+				return index >= 0
 		return self.prepared.intersects(shapely.geometry.Point(point))
 
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		if self.raster is not None:
+			indices = self.raster.indicesAt(points)
+			unknown = (indices == RasterIndex.UNKNOWN)
+			result = (indices >= 0)
+			if unknown.any():
+				result[unknown] = self._containsPointsExactly(points[unknown])
+			return result
+		return self._containsPointsExactly(points)
+
+	def _containsPointsExactly(self, points):
+		x, y = points[:, 0], points[:, 1]
+		# points on the boundary count as contained, as in containsPoint
+		inside = shapely.vectorized.contains(self.prepared, x, y)
+		return inside | shapely.vectorized.touches(self.prepared, x, y)
+
 	def containsObject(self, obj):
 		objPoly = obj.polygon
 		if objPoly is None:
@@ -777,7 +1193,7 @@ class PolygonalRegion(Region):
 		return self.polygons.distance(shapely.geometry.Point(point))
 
 	def getAABB(self):
-		xmin, xmax, ymin, ymax = self.polygons.bounds
+		xmin, ymin, xmax, ymax = self.polygons.bounds
 		return ((xmin, ymin), (xmax, ymax))
 
 	def show(self, plt, style='r-', **kwargs):
@@ -797,9 +1213,14 @@ class PolygonalRegion(Region):
 		# TODO better way to hash mutable Shapely geometries? (also for PolylineRegion)
 		return hash((str(self.polygons), self.orientation))
 
+	def __getattr__(self, name):
+		return _lazyAttribute(self, name)
+
 	def __getstate__(self):
+		_loadLazyGeometry(self)
 		state = self.__dict__.copy()
 		state.pop('_cached_prepared', None)		# prepared geometries are not picklable
+		state.pop('raster', None)		# potentially large; can be recomputed if needed
 		return state
 
 class PointSetRegion(Region):
@@ -850,6 +1271,10 @@ class PointSetRegion(Region):
 		distance, location = self.kdTree.query(point)
 		return (distance <= self.tolerance)
 
+	def containsPoints(self, points):
+		distances, locations = self.kdTree.query(toPointArray(points))
+		return (distances <= self.tolerance)
+
 	def containsObject(self, obj):
 		raise NotImplementedError()
 
@@ -884,15 +1309,40 @@ class GridRegion(PointSetRegion):
 		Bx (float): X coordinate of leftmost grid column
 		By (float): Y coordinate of lowest grid row
 		orientation (:obj:`~scenic.core.vectors.VectorField`, optional): orientation of region
+		tolerance (float; optional): distance tolerance for checking whether a point lies
+		  in the region, as for `PointSetRegion`
+
+	The free grid points and their k-D tree are only computed when needed, so creating a
+	`GridRegion` from a large grid is cheap.
 	"""
-	def __init__(self, name, grid, Ax, Ay, Bx, By, orientation=None):
+	def __init__(self, name, grid, Ax, Ay, Bx, By, orientation=None, tolerance=1e-6):
+		# the points and k-D tree of PointSetRegion are computed lazily from the grid
+		Region.__init__(self, name, orientation=orientation)
 		self.grid = numpy.array(grid)
 		self.sizeY, self.sizeX = self.grid.shape
 		self.Ax, self.Ay = Ax, Ay
 		self.Bx, self.By = Bx, By
-		y, x = numpy.where(self.grid == 0)
-		points = [self.gridToPoint(point) for point in zip(x, y)]
-		super().__init__(name, points, orientation=orientation)
+		self.tolerance = tolerance
+
+	@cached_property
+	def pointArray(self):
+		"""NumPy array of shape (n, 2) giving the coordinates of the free grid points."""
+		y, x = numpy.nonzero(self.grid == 0)
+		return numpy.column_stack(((self.Ax * x) + self.Bx, (self.Ay * y) + self.By))
+
+	@cached_property
+	def points(self):
+		return tuple(map(tuple, self.pointArray.tolist()))
+
+	@cached_property
+	def kdTree(self):
+		import scipy.spatial	# slow import not often needed
+		return scipy.spatial.cKDTree(self.pointArray)
+
+	def uniformPointInner(self):
+		# equivalent to random.choice(self.points), without building the tuple
+		x, y = self.pointArray[random.randrange(len(self.pointArray))].tolist()
+		return self.orient(Vector(x, y))
 
 	def gridToPoint(self, gp):
 		x, y = gp
@@ -917,25 +1367,46 @@ class GridRegion(PointSetRegion):
 		x, y = gp
 		return (self.grid[y, x] == 0)
 
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		# numpy.rint rounds halves to even, like round in pointToGrid
+		x = numpy.rint((points[:, 0] - self.Bx) / self.Ax)
+		y = numpy.rint((points[:, 1] - self.By) / self.Ay)
+		inGrid = (0 <= x) & (x < self.sizeX) & (0 <= y) & (y < self.sizeY)
+		result = numpy.zeros(len(points), dtype=bool)
+		result[inGrid] = (self.grid[y[inGrid].astype(int), x[inGrid].astype(int)] == 0)
+		return result
+
 	def containsObject(self, obj):
-		# TODO improve this procedure!
-		# Fast check
-		for c in obj.corners:
-			if not self.containsPoint(c):
+		# Fast check: all corners must be at free grid points
+		cells = []
+		for corner in obj.corners:
+			cell = self.pointToGrid(corner)
+			if cell is None or self.grid[cell[1], cell[0]] != 0:
 				return False
-		# Slow check
-		gps = [self.pointToGrid(corner) for corner in obj.corners]
-		x, y = zip(*gps)
+			cells.append(cell)
+		# Slow check: no obstacle within the bounding box of the corners can lie in the
+		# object (testing all such grid points at once)
+		x, y = zip(*cells)
 		minx, maxx = findMinMax(x)
 		miny, maxy = findMinMax(y)
-		for x in range(minx, maxx+1):
-			for y in range(miny, maxy+1):
-				p = self.gridToPoint((x, y))
-				if self.grid[y, x] == 1 and obj.containsPoint(p):
-					return False
-		return True
+		y, x = numpy.nonzero(self.grid[miny:maxy+1, minx:maxx+1] == 1)
+		if len(x) == 0:
+			return True
+		x, y = x + minx, y + miny
+		obstacles = numpy.column_stack(((self.Ax * x) + self.Bx, (self.Ay * y) + self.By))
+		return not obj.containsPoints(obstacles).any()
 
 class IntersectionRegion(Region):
+	"""The intersection of several regions.
+
+	By default, points are sampled by proposing them from the first region and rejecting
+	those which lie outside the others. If the first region and some of the others can
+	be converted to polygons, the proposals are restricted to the intersection of
+	their polygons (and the bounding boxes of the remaining regions), which is computed
+	on first use and shared by samples of the region which leave the operands
+	unchanged. The acceptance rate of the sampler is recorded in `samplerStatistics`.
+	"""
 	def __init__(self, *regions, orientation=None, sampler=None, name=None):
 		self.regions = tuple(regions)
 		if len(self.regions) < 2:
@@ -944,6 +1415,7 @@ class IntersectionRegion(Region):
 		if sampler is None:
 			sampler = self.genericSampler
 		self.sampler = sampler
+		self.samplerStatistics = SamplerStatistics()
 
 	def sampleGiven(self, value):
 		regs = [value[reg] for reg in self.regions]
@@ -960,29 +1432,104 @@ class IntersectionRegion(Region):
 			if not failed:
 				intersection.orientation = value[self.orientation]
 				return intersection
-		return IntersectionRegion(*regs, orientation=value[self.orientation],
-		                          sampler=self.sampler, name=self.name)
+		return self._copyWith(regs, value[self.orientation])
 
 	def evaluateInner(self, context):
-		regs = (valueInContext(reg, context) for reg in self.regions)
+		regs = [valueInContext(reg, context) for reg in self.regions]
 		orientation = valueInContext(self.orientation, context)
-		return IntersectionRegion(*regs, orientation=orientation, sampler=self.sampler,
-		                          name=self.name)
+		return self._copyWith(regs, orientation)
+
+	def _copyWith(self, regs, orientation):
+		region = IntersectionRegion(*regs, orientation=orientation, sampler=self.sampler,
+		                            name=self.name)
+		region.samplerStatistics = self.samplerStatistics
+		proposal = getattr(self, '_cached__proposal', None)
+		if proposal is not None and all(new is old for new, old in zip(regs, self.regions)):
+			region._cached__proposal = proposal
+		return region
 
 	def containsPoint(self, point):
 		return all(region.containsPoint(point) for region in self.regions)
 
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		result = numpy.ones(len(points), dtype=bool)
+		for region in self.regions:
+			remaining = numpy.flatnonzero(result)
+			if len(remaining) == 0:
+				break
+			result[remaining] = region.containsPoints(points[remaining])
+		return result
+
 	def uniformPointInner(self):
 		return self.orient(self.sampler(self))
 
+	def getAABB(self):
+		box = _boundingBoxOf(self.regions)
+		if box is None:
+			raise NotImplementedError
+		if not box:
+			raise RuntimeError('tried to get bounding box of empty IntersectionRegion')
+		minx, miny, maxx, maxy = box
+		return ((minx, miny), (maxx, maxy))
+
+	@cached_property
+	def _proposal(self):
+		"""Region to propose points from in `genericSampler`, if better than the first.
+
+		Returns a pair consisting of a `PolygonalRegion` (or `nowhere`, if the
+		intersection is empty) and a bounding box of the intersection; the region is
+		:obj:`None` if we must propose points from the first region directly.
+		"""
+		first, others = self.regions[0], self.regions[1:]
+		polygons, unconverted = [], []
+		for region in others:
+			bounds = _polygonalBounds(region)
+			if bounds is None:
+				unconverted.append(region)
+			else:
+				polygons.append(bounds[0])
+		box = _boundingBoxOf(unconverted)
+		if box == ():
+			return nowhere, box
+		bounds = _polygonalBounds(first)
+		if bounds is None or (not polygons and box is None):
+			return None, box
+		proposal = bounds[0]
+		for polygon in polygons:
+			proposal = proposal & polygon
+		if box is not None:
+			proposal = proposal & shapely.geometry.box(*box)
+		return _polygonalRegionFrom(proposal), box
+
 	@staticmethod
 	def genericSampler(intersection):
 		regs = intersection.regions
-		point = regs[0].uniformPointInner()
-		for region in regs[1:]:
+		proposal, box = intersection._proposal
+		statistics = intersection.samplerStatistics
+		if proposal is nowhere:
+			statistics.record(False)
+			raise RejectionException(f'sampling empty intersection of Regions {regs}')
+		if proposal is None:
+			point = regs[0].uniformPointInner()
+			checks = regs[1:]
+			if box is not None:
+				minx, miny, maxx, maxy = box
+				if not (minx <= point.x <= maxx and miny <= point.y <= maxy):
+					statistics.record(False)
+					raise RejectionException(
+					    f'sampling intersection of Regions {regs} ({statistics})')
+		else:
+			# orient the point as if it had been sampled from the first region
+			point = regs[0].orient(proposal.uniformPointInner())
+			checks = regs
+		for region in checks:
 			if not region.containsPoint(point):
+				statistics.record(False)
 				raise RejectionException(
-				    f'sampling intersection of Regions {regs[0]} and {region}')
+				    f'sampling intersection of Regions {regs[0]} and {region} '
+				    f'({statistics})')
+		statistics.record(True)
 		return point
 
 	def isEquivalentTo(self, other):
@@ -995,12 +1542,23 @@ class IntersectionRegion(Region):
 		return f'IntersectionRegion({self.regions})'
 
 class DifferenceRegion(Region):
-	def __init__(self, regionA, regionB, sampler=None, name=None):
+	"""The difference of two regions.
+
+	By default, points are sampled by proposing them from **regionA** and rejecting those
+	which lie in **regionB**. If both regions can be converted to polygons, the
+	proposals are restricted to the difference of their polygons, which is computed on
+	first use and shared by samples of the region which leave the operands unchanged.
+	The acceptance rate of the sampler is recorded in `samplerStatistics`.
+	"""
+	def __init__(self, regionA, regionB, orientation=None, sampler=None, name=None):
 		self.regionA, self.regionB = regionA, regionB
-		super().__init__(name, regionA, regionB, orientation=regionA.orientation)
+		if orientation is None:
+			orientation = regionA.orientation
+		super().__init__(name, regionA, regionB, orientation=orientation)
 		if sampler is None:
 			sampler = self.genericSampler
 		self.sampler = sampler
+		self.samplerStatistics = SamplerStatistics()
 
 	def sampleGiven(self, value):
 		regionA, regionB = value[self.regionA], value[self.regionB]
@@ -1011,29 +1569,72 @@ class DifferenceRegion(Region):
 			if not isinstance(diff, DifferenceRegion):
 				diff.orientation = value[self.orientation]
 				return diff
-		return DifferenceRegion(regionA, regionB, orientation=value[self.orientation],
-		                        sampler=self.sampler, name=self.name)
+		return self._copyWith(regionA, regionB, value[self.orientation])
 
 	def evaluateInner(self, context):
 		regionA = valueInContext(self.regionA, context)
 		regionB = valueInContext(self.regionB, context)
 		orientation = valueInContext(self.orientation, context)
-		return DifferenceRegion(regionA, regionB, orientation=orientation,
-		                        sampler=self.sampler, name=self.name)
+		return self._copyWith(regionA, regionB, orientation)
+
+	def _copyWith(self, regionA, regionB, orientation):
+		region = DifferenceRegion(regionA, regionB, orientation=orientation,
+		                          sampler=self.sampler, name=self.name)
+		region.samplerStatistics = self.samplerStatistics
+		proposal = getattr(self, '_cached__proposal', None)
+		if proposal is not None and regionA is self.regionA and regionB is self.regionB:
+			region._cached__proposal = proposal
+		return region
 
 	def containsPoint(self, point):
-		return regionA.containsPoint(point) and not regionB.containsPoint(point)
+		return (self.regionA.containsPoint(point)
+		        and not self.regionB.containsPoint(point))
+
+	def containsPoints(self, points):
+		points = toPointArray(points)
+		result = self.regionA.containsPoints(points)
+		inA = numpy.flatnonzero(result)
+		if len(inA) > 0:
+			result[inA] = ~self.regionB.containsPoints(points[inA])
+		return result
 
 	def uniformPointInner(self):
 		return self.orient(self.sampler(self))
 
+	def getAABB(self):
+		return self.regionA.getAABB()
+
+	@cached_property
+	def _proposal(self):
+		"""Region to propose points from in `genericSampler`, if better than regionA.
+
+		Returns a `PolygonalRegion` (or `nowhere`, if the difference is empty), or
+		:obj:`None` if we must propose points from regionA directly.
+		"""
+		boundsA, boundsB = _polygonalBounds(self.regionA), _polygonalBounds(self.regionB)
+		if boundsA is None or boundsB is None:
+			return None
+		return _polygonalRegionFrom(boundsA[0] - boundsB[1])
+
 	@staticmethod
 	def genericSampler(difference):
 		regionA, regionB = difference.regionA, difference.regionB
-		point = regionA.uniformPointInner()
-		if regionB.containsPoint(point):
+		proposal = difference._proposal
+		statistics = difference.samplerStatistics
+		if proposal is nowhere:
+			statistics.record(False)
+			raise RejectionException(
+			    f'sampling empty difference of Regions {regionA} and {regionB}')
+		if proposal is None:
+			point = regionA.uniformPointInner()
+			accepted = not regionB.containsPoint(point)
+		else:
+			point = regionA.orient(proposal.uniformPointInner())
+			accepted = regionA.containsPoint(point) and not regionB.containsPoint(point)
+		statistics.record(accepted)
+		if not accepted:
 			raise RejectionException(
-			    f'sampling difference of Regions {regionA} and {regionB}')
+			    f'sampling difference of Regions {regionA} and {regionB} ({statistics})')
 		return point
 
 	def isEquivalentTo(self, other):
@@ -107,6 +107,9 @@ class CompiledRequirement:
         self.line = pendingReq.line
         self.prob = pendingReq.prob
         self.dependencies = dependencies
+        # whether the requirement refers to the ego object by name (it can also use it
+        # implicitly, e.g. in a visibility check)
+        self.mentionsEgo = 'ego' in pendingReq.bindings
 
     @property
     def constrainsSampling(self):
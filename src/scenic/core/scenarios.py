@@ -1,15 +1,26 @@
 """Scenario and scene objects."""
 
+import collections
+import functools
+import math
+import multiprocessing
+import os
+import pickle
+import queue
 import random
 import time
 
-from scenic.core.distributions import Samplable, RejectionException, needsSampling
+import numpy
+
+from scenic.core.distributions import (Samplable, RejectionException, needsSampling,
+                                       DefaultIdentityDict, SamplingPlan)
 from scenic.core.lazy_eval import needsLazyEvaluation
 from scenic.core.external_params import ExternalSampler
 from scenic.core.regions import EmptyRegion
+from scenic.core.geometry import rectangleCorners, rectanglesSeparated
 from scenic.core.workspaces import Workspace
 from scenic.core.vectors import Vector
-from scenic.core.utils import areEquivalent
+from scenic.core.utils import areEquivalent, cached_property
 from scenic.core.errors import InvalidScenarioError
 from scenic.core.dynamics import Behavior
 from scenic.core.requirements import BoundRequirement
@@ -54,6 +65,73 @@ class Scene:
 			self.workspace.zoomAround(plt, self.objects, expansion=zoom)
 		plt.show(block=block)
 
+	@cached_property
+	def geometry(self):
+		"""`SceneGeometry` of the objects in the scene, built when first used."""
+		return SceneGeometry(self.objects)
+
+class SceneGeometry:
+	"""Helper for vectorized geometric queries about a set of objects.
+
+	The positions, headings, dimensions, and corners of the objects are copied into
+	read-only NumPy arrays, so that queries about a whole scene need not loop over the
+	objects. The *i*-th row of each array corresponds to the *i*-th object. The objects
+	themselves are unchanged: they do not share these arrays, and later changes to
+	them are not reflected here. `Scenario.validate` uses this class to check the
+	objects whose bounding boxes are known before sampling.
+
+	Attributes:
+		positions: array of shape (n, 2).
+		headings: array of shape (n,).
+		widths: array of shape (n,).
+		lengths: array of shape (n,).
+		corners: array of shape (n, 4, 2), in the same order as ``Object.corners``.
+	"""
+	def __init__(self, objects):
+		n = len(objects)
+		self.positions = numpy.array([tuple(obj.position) for obj in objects],
+		                             dtype=float).reshape((n, 2))
+		self.headings = numpy.array([obj.heading for obj in objects], dtype=float)
+		self.widths = numpy.array([obj.width for obj in objects], dtype=float)
+		self.lengths = numpy.array([obj.length for obj in objects], dtype=float)
+		x, y = self.positions[:, 0], self.positions[:, 1]
+		hw, hl = self.widths / 2, self.lengths / 2
+		self.corners = rectangleCorners(x, y, self.headings, hw, hl)
+		self._rectangles = numpy.column_stack((self.positions, self.headings, hw, hl))
+		self._radii = numpy.hypot(hw, hl)
+		for array in (self.positions, self.headings, self.widths, self.lengths, self.corners):
+			array.flags.writeable = False
+
+	def __len__(self):
+		return len(self.headings)
+
+	def intersectingPairs(self):
+		"""Find all pairs of intersecting objects.
+
+		This uses the same test as the check that objects in a sampled scene do not
+		intersect.
+
+		Returns:
+			An array of shape (m, 2) whose rows are the indices (i, j), with i < j, of
+			the intersecting pairs.
+		"""
+		pairs = [(j, i) for i in range(1, len(self))
+		         for j in _intersectingBefore(self._rectangles, self._radii, i)]
+		pairs = numpy.array(pairs, dtype=int).reshape((-1, 2))
+		return pairs[numpy.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+	def visibleIn(self, region):
+		"""Which objects have a corner in the given region.
+
+		This is the test used by ``canSee`` with the region being the viewer's
+		``visibleRegion``.
+
+		Returns:
+			A boolean array of shape (n,).
+		"""
+		inside = region.containsPoints(self.corners.reshape((-1, 2)))
+		return inside.reshape((len(self), 4)).any(axis=1)
+
 class Scenario:
 	"""Scenario()
 
@@ -98,6 +176,8 @@ class Scenario:
 				if isinstance(value, Samplable):
 					behaviorDeps.append(value)
 		self.dependencies = self.objects + paramDeps + tuple(requirementDeps) + tuple(behaviorDeps)
+		# statistics about the checks made while sampling, for adaptive ordering
+		self._checkStatistics = {}
 
 		self.validate()
 
@@ -124,31 +204,40 @@ class Scenario:
 		"""
 		objects = self.objects
 		staticVisibility = self.egoObject and not needsSampling(self.egoObject.visibleRegion)
-		staticBounds = [self.hasStaticBounds(obj) for obj in objects]
-		for i in range(len(objects)):
-			oi = objects[i]
-			container = self.containerOfObject(oi)
+		staticObjects = [obj for obj in objects if self.hasStaticBounds(obj)]
+		geometry = SceneGeometry(staticObjects)
+		if staticVisibility:
+			visible = geometry.visibleIn(self.egoObject.visibleRegion)
+		for obj in objects:
+			container = self.containerOfObject(obj)
 			# Trivial case where container is empty
 			if isinstance(container, EmptyRegion):
-				raise InvalidScenarioError(f'Container region of {oi} is empty')
-			# skip objects with unknown positions or bounding boxes
-			if not staticBounds[i]:
-				continue
+				raise InvalidScenarioError(f'Container region of {obj} is empty')
+		for i, oi in enumerate(staticObjects):
+			container = self.containerOfObject(oi)
 			# Require object to be contained in the workspace/valid region
 			if not needsSampling(container) and not container.containsObject(oi):
 				raise InvalidScenarioError(f'Object at {oi.position} does not fit in container')
 			# Require object to be visible from the ego object
 			if staticVisibility and oi.requireVisible is True and oi is not self.egoObject:
-				if not self.egoObject.canSee(oi):
+				if not visible[i]:
 					raise InvalidScenarioError(f'Object at {oi.position} is not visible from ego')
-			# Require object to not intersect another object
-			for j in range(i):
-				oj = objects[j]
-				if not staticBounds[j]:
-					continue
-				if oi.intersects(oj):
-					raise InvalidScenarioError(f'Object at {oi.position} intersects'
-											   f' object at {oj.position}')
+		# Require objects to not intersect each other
+		pairs = geometry.intersectingPairs()
+		if len(pairs) > 0:
+			j, i = pairs[numpy.lexsort((pairs[:, 0], pairs[:, 1]))[0]]
+			oi, oj = staticObjects[i], staticObjects[j]
+			raise InvalidScenarioError(f'Object at {oi.position} intersects'
+			                           f' object at {oj.position}')
+
+	@cached_property
+	def samplingPlan(self):
+		"""Precompiled `SamplingPlan` for the dependencies of this scenario.
+
+		The plan is compiled when first needed rather than when the scenario is
+		constructed, since pruning conditions some of the dependencies afterward.
+		"""
+		return SamplingPlan(self.dependencies)
 
 	def hasStaticBounds(self, obj):
 		if needsSampling(obj.position):
@@ -157,14 +246,43 @@ class Scenario:
 			return False
 		return True
 
-	def generate(self, maxIterations=2000, verbosity=0, feedback=None):
+	def generate(self, maxIterations=2000, verbosity=0, feedback=None, batchSize=None,
+	             earlyRejection=False, adaptiveOrdering=False, stats=None):
 		"""Sample a `Scene` from this scenario.
 
+		If **batchSize** is given, the numeric distributions in the scenario (e.g.
+		``Range`` and arithmetic on it) are sampled that many times at once using NumPy
+		(see `Samplable.batchSampleAll`), and user-specified requirements which depend
+		only on such values are checked before any objects are constructed. This can
+		greatly speed up scenarios where many samples are rejected by such requirements.
+		Batch sampling is not used for scenarios with external parameters.
+
+		If **earlyRejection** is true, each requirement (including the built-in ones
+		that objects be contained in their regions, visible, and non-intersecting) is
+		checked as soon as all the values it depends on have been sampled, rather than
+		after the whole scene has been sampled. Then a sample violating a requirement is
+		abandoned without sampling the rest of the scene. The distribution of scenes is
+		the same either way. With verbosity at least 1, the fraction of sampling work
+		skipped thanks to early rejection is printed.
+
+		If **adaptiveOrdering** is true, the pass rate and running time of every check
+		are recorded (the statistics are kept across calls to `generate`), and the
+		checks are periodically reordered so that those which are cheap and reject
+		often are made first. This does not change the distribution of scenes, since
+		every check must still pass, but can reduce the cost of rejected samples.
+
 		Args:
 			maxIterations (int): Maximum number of rejection sampling iterations.
 			verbosity (int): Verbosity level.
 			feedback (float): Feedback to pass to external samplers doing active sampling.
 				See :mod:`scenic.core.external_params`.
+			batchSize (int): Number of candidate samples to draw at once, or
+				:obj:`None` (the default) to draw one candidate at a time.
+			earlyRejection (bool): Whether to check requirements as early as possible.
+			adaptiveOrdering (bool): Whether to reorder checks based on their observed
+				pass rates and costs.
+			stats (`SamplingStatistics`): If not :obj:`None`, an object in which to
+				record statistics about the rejections and time spent.
 
 		Returns:
 			A pair with the sampled `Scene` and the number of iterations used.
@@ -172,75 +290,232 @@ class Scenario:
 		Raises:
 			`RejectionException`: if no valid sample is found in **maxIterations** iterations.
 		"""
-		objects = self.objects
+		sample, iterations = self._sampleValid(maxIterations, verbosity, feedback, batchSize,
+		                                       earlyRejection, adaptiveOrdering, stats)
+		return self._sceneFromSample(sample), iterations
+
+	def _sampleValid(self, maxIterations, verbosity, feedback=None, batchSize=None,
+	                 earlyRejection=False, adaptiveOrdering=False, stats=None):
+		"""Sample the scenario's dependencies until all requirements are satisfied."""
+		startTime = time.perf_counter()
+		samplingPlan = self.samplingPlan
 
 		# choose which custom requirements will be enforced for this sample
 		activeReqs = [req for req in self.initialRequirements if random.random() <= req.prob]
+		recordChecks = adaptiveOrdering or stats is not None
+		checkpoints = self._scheduleChecks(activeReqs, earlyRejection, recordChecks)
+		if stats is not None:
+			checkStatistics = [function.statistics for functions in checkpoints.values()
+			                   for function in functions if isinstance(function, _Check)]
+			def checkingTime():
+				return sum(statistics.time for statistics in checkStatistics)
+			initialCheckingTime = checkingTime()
+		if batchSize is not None and self.externalSampler is None:
+			candidates = self._batchCandidates(batchSize, activeReqs)
+		else:
+			candidates = None
 
 		# do rejection sampling until requirements are satisfied
 		rejection = True
 		iterations = 0
+		stepsSkipped = 0
 		while rejection is not None:
 			if iterations > 0:	# rejected the last sample
 				if verbosity >= 2:
 					print(f'  Rejected sample {iterations} because of: {rejection}')
 				if self.externalSampler is not None:
 					feedback = self.externalSampler.rejectionFeedback
+				if stats is not None:
+					stats.rejections[str(rejection)] += 1
 			if iterations >= maxIterations:
+				if stats is not None:
+					stats._record(iterations, time.perf_counter() - startTime,
+					              checkingTime() - initialCheckingTime, succeeded=False)
 				raise RejectionException(f'failed to generate scenario in {iterations} iterations')
+			if adaptiveOrdering and iterations % self._reorderingInterval == 0:
+				self._reorderChecks(checkpoints)
 			iterations += 1
 			try:
 				if self.externalSampler is not None:
 					self.externalSampler.sample(feedback)
-				sample = Samplable.sampleAll(self.dependencies)
+				if candidates is None:
+					sample = samplingPlan.sample(checkpoints=checkpoints)
+				else:
+					partialSample, rejection = next(candidates)
+					if rejection is not None:
+						continue
+					sample = samplingPlan.sample(partialSample, checkpoints)
+			except _CheckFailure as e:
+				rejection = e
+				stepsSkipped += len(samplingPlan) - e.check.step - 1
+				continue
 			except RejectionException as e:
 				rejection = e
 				continue
 			rejection = None
-			ego = sample[self.egoObject]
-			# Normalize types of some built-in properties
-			for obj in objects:
-				sampledObj = sample[obj]
-				assert not needsSampling(sampledObj)
-				# position, heading
-				assert isinstance(sampledObj.position, Vector)
-				sampledObj.heading = float(sampledObj.heading)
-				# behavior
-				behavior = sampledObj.behavior
-				if behavior is not None and not isinstance(behavior, Behavior):
-					raise InvalidScenarioError(
-						f'behavior {behavior} of Object {obj} is not a behavior')
-
-			# Check built-in requirements
-			for i in range(len(objects)):
-				vi = sample[objects[i]]
-				# Require object to be contained in the workspace/valid region
-				container = self.containerOfObject(vi)
-				if not container.containsObject(vi):
-					rejection = 'object containment'
-					break
-				# Require object to be visible from the ego object
-				if vi.requireVisible and vi is not ego and not ego.canSee(vi):
-					rejection = 'object visibility'
-					break
-				# Require object to not intersect another object
-				for j in range(i):
-					vj = sample[objects[j]]
-					if vi.intersects(vj):
-						rejection = 'object intersection'
-						break
-				if rejection is not None:
-					break
-			if rejection is not None:
-				continue
-			# Check user-specified requirements
-			for req in activeReqs:
-				if not req.satisfiedBy(sample):
-					rejection = f'user-specified requirement (line {req.line})'
-					break
-
-		# obtained a valid sample; assemble a scene from it
-		sampledObjects = tuple(sample[obj] for obj in objects)
+
+		if earlyRejection and verbosity >= 1:
+			totalSteps = iterations * len(samplingPlan)
+			percent = 100 * stepsSkipped / totalSteps if totalSteps > 0 else 0
+			print(f'  Early rejection skipped {stepsSkipped} of {totalSteps} '
+			      f'sampling steps ({percent:.1f}%).')
+		if stats is not None:
+			stats._record(iterations, time.perf_counter() - startTime,
+			              checkingTime() - initialCheckingTime)
+		return sample, iterations
+
+	def _makeChecks(self, activeReqs):
+		"""Make the checks applied to every sample, in the order they are normally made.
+
+		These are the built-in requirements (containment, visibility, and
+		non-intersection of each object) followed by the active user-specified
+		requirements.
+		"""
+		checks = []
+		objects = self.objects
+		intersectionIndex = _IntersectionIndex(objects)
+		for i, obj in enumerate(objects):
+			checks.append(_Check('object containment', obj, (obj,),
+			                     functools.partial(self._isContained, obj)))
+			if obj is not self.egoObject:
+				checks.append(_Check('object visibility', obj, (obj, self.egoObject),
+				                     functools.partial(self._isVisible, obj)))
+			if i > 0:
+				checks.append(_Check('object intersection', obj, objects[:i+1],
+				                     functools.partial(intersectionIndex.isSeparated, i)))
+		for req in activeReqs:
+			checks.append(_Check(f'user-specified requirement (line {req.line})', req,
+			                     req.dependencies, req.satisfiedBy))
+		return checks
+
+	def _scheduleChecks(self, activeReqs, earlyRejection, recordStatistics=False):
+		"""Decide when to make each check while sampling.
+
+		Returns:
+			A dict of checkpoints suitable for `SamplingPlan.sample`. Types of built-in
+			properties are normalized right after each object is sampled. If
+			**earlyRejection** is true, every other check is made as soon as all the
+			values it depends on have been sampled; otherwise, all of them are made at
+			the end of sampling. If **recordStatistics** is true, the checks record
+			statistics (kept across calls) for use by `_reorderChecks`.
+		"""
+		samplingPlan = self.samplingPlan
+		lastStep = len(samplingPlan) - 1
+		checkpoints = {}
+		def schedule(step, function):
+			checkpoints.setdefault(step, []).append(function)
+		for obj in self.objects:
+			schedule(samplingPlan.stepOf(obj), functools.partial(self._normalizeObject, obj))
+		for check in self._makeChecks(activeReqs):
+			if earlyRejection:
+				check.step = max((samplingPlan.stepOf(dep) for dep in check.dependencies),
+				                 default=-1)
+			else:
+				check.step = lastStep
+			if recordStatistics:
+				check.statistics = self._checkStatistics.setdefault(check.key,
+				                                                    _CheckStatistics())
+			schedule(check.step, check)
+		return checkpoints
+
+	#: Number of iterations between reorderings of checks in adaptive mode.
+	_reorderingInterval = 32
+
+	@staticmethod
+	def _reorderChecks(checkpoints):
+		"""Reorder the checks made at each checkpoint by their observed efficiency.
+
+		Checks with the lowest expected cost per rejection go first; normalization of
+		objects is always done before any checks at the same checkpoint.
+		"""
+		def rank(function):
+			if isinstance(function, _Check):
+				return function.statistics.costPerRejection
+			return -math.inf
+		for functions in checkpoints.values():
+			functions.sort(key=rank)
+
+	@staticmethod
+	def _normalizeObject(obj, sample):
+		sampledObj = sample[obj]
+		assert not needsSampling(sampledObj)
+		# position, heading
+		assert isinstance(sampledObj.position, Vector)
+		sampledObj.heading = float(sampledObj.heading)
+		# behavior
+		behavior = sampledObj.behavior
+		if behavior is not None and not isinstance(behavior, Behavior):
+			raise InvalidScenarioError(
+				f'behavior {behavior} of Object {obj} is not a behavior')
+
+	def _isContained(self, obj, sample):
+		# Require object to be contained in the workspace/valid region
+		vi = sample[obj]
+		return self.containerOfObject(vi).containsObject(vi)
+
+	def _isVisible(self, obj, sample):
+		# Require object to be visible from the ego object
+		vi = sample[obj]
+		return not vi.requireVisible or sample[self.egoObject].canSee(vi)
+
+	def _batchCandidates(self, batchSize, activeReqs):
+		"""Generate partial samples for batch rejection sampling.
+
+		Yields pairs consisting of a partial sample, giving values for all numeric
+		distributions in the scenario, and the reason why that sample was rejected
+		early, if it was. User-specified requirements depending only on numeric
+		distributions are checked on the whole batch at once if possible, and otherwise
+		on each partial sample. Since every requirement depends on the ego object, in
+		case it uses the ego implicitly, requirements not mentioning the ego are
+		evaluated with a placeholder for it which makes any such use fail.
+		"""
+		ego = self.egoObject
+		while True:
+			rng = numpy.random.default_rng(random.getrandbits(64))
+			batch = Samplable.batchSampleAll(self.dependencies, batchSize, rng)
+			reqs = [req for req in activeReqs if not req.mentionsEgo
+			        and all(dep is ego or dep in batch for dep in req.dependencies)]
+
+			# check requirements on the whole batch, where possible
+			passed = numpy.ones(batchSize, dtype=bool)
+			failedReq = numpy.full(batchSize, -1)
+			undecided = []
+			values = DefaultIdentityDict()
+			values.storage.update(batch.storage)
+			values[ego] = _unsampledObject
+			for index, req in enumerate(reqs):
+				result = _tryRequirement(req, values)
+				if (isinstance(result, numpy.ndarray) and result.dtype == bool
+				    and result.shape == (batchSize,)):
+					failedReq[passed & ~result] = index
+					passed &= result
+				else:
+					undecided.append(req)
+
+			# check remaining requirements on each partial sample
+			columns = [(key, array.tolist()) for key, array in batch.storage.items()]
+			for i in range(batchSize):
+				if not passed[i]:
+					req = reqs[failedReq[i]]
+					yield None, f'user-specified requirement (line {req.line})'
+					continue
+				partialSample = DefaultIdentityDict()
+				partialSample.storage.update((key, column[i]) for key, column in columns)
+				rejection = None
+				if undecided:
+					values = DefaultIdentityDict()
+					values.storage.update(partialSample.storage)
+					values[ego] = _unsampledObject
+					for req in undecided:
+						if _tryRequirement(req, values) is False:
+							rejection = f'user-specified requirement (line {req.line})'
+							break
+				yield partialSample, rejection
+
+	def _sceneFromSample(self, sample):
+		"""Assemble a `Scene` from a valid sample of this scenario's dependencies."""
+		ego = sample[self.egoObject]
+		sampledObjects = tuple(sample[obj] for obj in self.objects)
 		sampledParams = {}
 		for param, value in self.params.items():
 			sampledValue = sample[value]
@@ -258,7 +533,112 @@ class Scenario:
 		scene = Scene(self.workspace, sampledObjects, ego, sampledParams,
 					  alwaysReqs, terminationConds, termSimulationConds, self.monitors,
 					  sampledNamespaces, self.dynamicScenario)
-		return scene, iterations
+		return scene
+
+	def generateBatch(self, n, workers=None, seed=None, maxIterations=2000, verbosity=0,
+	                  batchSize=None, earlyRejection=False, adaptiveOrdering=False,
+	                  stats=None):
+		"""Sample many `Scene` objects from this scenario in parallel.
+
+		The scenario is shipped once to a pool of worker processes, each of which does
+		rejection sampling independently; worker *i* generates scenes *i*, *i* +
+		**workers**, *i* + 2 * **workers**, and so on. Scenes are yielded in order as
+		soon as they are available.
+
+		Each worker's random seed is derived from **seed** and the worker's index, so
+		the sequence of generated scenes is reproducible for a given seed and number of
+		workers (but it will differ from the sequence produced by calling `generate`
+		repeatedly). External samplers are reset in each worker, so active samplers do
+		not receive feedback from scenes generated by other workers.
+
+		The workers are forked from the current process, since compiled scenarios
+		cannot in general be pickled; so this method is not available on platforms
+		which do not support the ``fork`` start method (e.g. Windows).
+
+		Args:
+			n (int): Number of scenes to generate.
+			workers (int): Number of worker processes; if :obj:`None`, use the number
+				of CPUs.
+			seed (int): Random seed from which to derive the seeds of the workers; if
+				:obj:`None`, use fresh entropy from the operating system.
+			maxIterations (int): Maximum number of rejection sampling iterations for
+				each scene.
+			verbosity (int): Verbosity level.
+			batchSize (int): Number of candidate samples to draw at once in each
+				worker; see `generate`.
+			earlyRejection (bool): Whether to check requirements as early as possible;
+				see `generate`.
+			adaptiveOrdering (bool): Whether to reorder checks based on their observed
+				pass rates and costs; see `generate`. Each worker keeps its own
+				statistics.
+			stats (`SamplingStatistics`): If not :obj:`None`, an object in which to
+				record statistics about the generation of each scene; these are
+				gathered by the workers and merged as the scenes are yielded.
+
+		Returns:
+			An iterator over pairs of the sampled `Scene` and the number of iterations
+			used to generate it.
+
+		Raises:
+			`RejectionException`: if no valid sample is found in **maxIterations**
+			iterations for some scene.
+		"""
+		if n <= 0:
+			return
+		if workers is None:
+			workers = os.cpu_count() or 1
+		workers = min(workers, n)
+		if workers < 1:
+			raise RuntimeError(f'invalid number of workers {workers} for generateBatch')
+		try:
+			context = multiprocessing.get_context('fork')
+		except ValueError:
+			raise RuntimeError('generateBatch requires the "fork" start method, '
+			                   'which is not available on this platform') from None
+		seeds = numpy.random.SeedSequence(seed).generate_state(workers)
+		self.samplingPlan		# compile plan now so the workers can share it
+
+		results = context.Queue()
+		processes = []
+		for index, workerSeed in enumerate(seeds):
+			args = (self, index, int(workerSeed), n, workers, maxIterations, verbosity,
+			        batchSize, earlyRejection, adaptiveOrdering, stats is not None, results)
+			process = context.Process(target=_generateInWorker, args=args, daemon=True)
+			processes.append(process)
+		try:
+			for process in processes:
+				process.start()
+			pending = {}
+			nextScene = 0
+			while nextScene < n:
+				try:
+					index, kind, payload = results.get(timeout=1)
+				except queue.Empty:
+					for process in processes:
+						if process.exitcode not in (None, 0):
+							raise RuntimeError(f'scene generation worker {process.name}'
+							                   f' died with exit code {process.exitcode}')
+					continue
+				if kind == 'error':
+					raise pickle.loads(payload)
+				pending[index] = payload
+				while nextScene in pending:
+					payload = pending.pop(nextScene)
+					values, iterations, sceneStats = pickle.loads(payload)
+					if stats is not None:
+						stats.merge(sceneStats)
+					sample = DefaultIdentityDict()
+					for dep, value in zip(self.dependencies, values):
+						sample[dep] = value
+					yield self._sceneFromSample(sample), iterations
+					nextScene += 1
+		finally:
+			for process in processes:
+				if process.is_alive():
+					process.terminate()
+				if process.pid is not None:
+					process.join()
+			results.close()
 
 	def resetExternalSampler(self):
 		"""Reset the scenario's external sampler, if any.
@@ -272,3 +652,249 @@ class Scenario:
 			raise RuntimeError('scenario does not specify a simulator')
 		import scenic.syntax.veneer as veneer
 		return veneer.instantiateSimulator(self.simulator, self.params)
+
+class SamplingStatistics:
+	"""Statistics about rejection sampling, gathered over calls to `Scenario.generate`.
+
+	To use, create an instance and pass it as the **stats** argument of
+	`Scenario.generate` or `Scenario.generateBatch` as many times as desired.
+
+	Attributes:
+		iterations (list of int): Number of iterations used to generate each scene.
+		failures (int): Number of calls which failed to generate a scene.
+		rejections (`collections.Counter`): Number of rejected samples for each cause
+		  of rejection, e.g. ``'object containment'`` or ``'user-specified requirement
+		  (line 5)'``.
+		samplingTime (float): Total time spent sampling values, in seconds.
+		checkingTime (float): Total time spent checking requirements (built-in and
+		  user-specified) on the sampled values, in seconds.
+	"""
+	def __init__(self):
+		self.iterations = []
+		self.failures = 0
+		self.rejections = collections.Counter()
+		self.samplingTime = 0
+		self.checkingTime = 0
+
+	def _record(self, iterations, totalTime, checkingTime, succeeded=True):
+		if succeeded:
+			self.iterations.append(iterations)
+		else:
+			self.failures += 1
+		self.samplingTime += totalTime - checkingTime
+		self.checkingTime += checkingTime
+
+	def merge(self, other):
+		"""Add the statistics gathered in another `SamplingStatistics` to these ones."""
+		self.iterations.extend(other.iterations)
+		self.failures += other.failures
+		self.rejections.update(other.rejections)
+		self.samplingTime += other.samplingTime
+		self.checkingTime += other.checkingTime
+
+	@property
+	def scenes(self):
+		"""Number of scenes generated."""
+		return len(self.iterations)
+
+	def iterationHistogram(self):
+		"""Histogram of the number of iterations used to generate each scene.
+
+		Returns:
+			A list of triples (*low*, *high*, *count*) giving the number of scenes which
+			took between *low* and *high* iterations inclusive. The bins are the
+			intervals between consecutive powers of 2.
+		"""
+		histogram = []
+		if not self.iterations:
+			return histogram
+		bins = collections.Counter(iterations.bit_length() for iterations in self.iterations)
+		for size in range(1, max(bins) + 1):
+			histogram.append((1 << (size - 1), (1 << size) - 1, bins[size]))
+		return histogram
+
+	def toDict(self):
+		"""Summarize the statistics as a `dict` suitable for conversion to JSON."""
+		scenes = self.scenes
+		return {
+			'scenes': scenes,
+			'failures': self.failures,
+			'totalIterations': sum(self.iterations),
+			'averageIterations': sum(self.iterations) / scenes if scenes else None,
+			'rejections': dict(self.rejections.most_common()),
+			'samplingTime': self.samplingTime,
+			'checkingTime': self.checkingTime,
+			'iterationHistogram': [
+				{ 'low': low, 'high': high, 'count': count }
+				for low, high, count in self.iterationHistogram()
+			],
+		}
+
+class _Check:
+	"""A check made on every sample of a scenario, e.g. a requirement.
+
+	Attributes:
+		cause (str): Description of the check, used as the reason for rejections.
+		subject: The object or requirement being checked.
+		dependencies: Values which must be sampled before the check can be made.
+		step (int): Index of the `SamplingPlan` step after which the check is made.
+		statistics (`_CheckStatistics`): Statistics to update when the check is
+		  made, or :obj:`None` to skip recording them.
+	"""
+	def __init__(self, cause, subject, dependencies, test):
+		self.cause = cause
+		self.subject = subject
+		self.dependencies = tuple(dependencies)
+		self.test = test
+		self.step = None
+		self.statistics = None
+
+	@property
+	def key(self):
+		"""Key identifying this check across calls to `Scenario.generate`."""
+		return (self.cause, id(self.subject))
+
+	def __call__(self, sample):
+		statistics = self.statistics
+		if statistics is None:
+			passed = self.test(sample)
+		else:
+			startTime = time.perf_counter()
+			passed = self.test(sample)
+			statistics.record(passed, time.perf_counter() - startTime)
+		if not passed:
+			raise _CheckFailure(self)
+
+class _CheckStatistics:
+	"""Running statistics about a `_Check`: how often it passes and how long it takes."""
+	def __init__(self):
+		self.calls = 0
+		self.failures = 0
+		self.time = 0
+
+	def record(self, passed, elapsed):
+		self.calls += 1
+		if not passed:
+			self.failures += 1
+		self.time += elapsed
+
+	@property
+	def costPerRejection(self):
+		"""Estimated time spent on the check per sample it rejects.
+
+		Making checks in increasing order of this quantity minimizes the expected
+		time to reject a sample, assuming the checks are independent. Checks which
+		have not been made yet have cost 0, so that they are tried first.
+		"""
+		if self.calls == 0:
+			return 0
+		rejectionRate = (self.failures + 1) / (self.calls + 2)		# Laplace smoothing
+		return (self.time / self.calls) / rejectionRate
+
+class _CheckFailure(RejectionException):
+	"""Rejection of a sample due to a failed `_Check`."""
+	def __init__(self, check):
+		super().__init__(check.cause)
+		self.check = check
+
+def _intersectingBefore(rectangles, radii, i):
+	"""Indices of the rectangles before the *i*-th one which intersect it.
+
+	The rectangles are given by an array in the format used by `rectanglesSeparated`,
+	and **radii** are their circumradii. Only rectangles whose circumcircles overlap
+	that of the *i*-th one are tested exactly, with the separating axis theorem.
+	"""
+	dx = rectangles[:i, 0] - rectangles[i, 0]
+	dy = rectangles[:i, 1] - rectangles[i, 1]
+	reach = radii[:i] + radii[i]
+	nearby = numpy.flatnonzero(dx*dx + dy*dy <= reach*reach)
+	if len(nearby) == 0:
+		return nearby
+	separated = rectanglesSeparated(rectangles[i:i+1], rectangles[nearby])
+	return nearby[~separated]
+
+class _IntersectionIndex:
+	"""Index for checking that the objects in a sample do not intersect.
+
+	The rectangle of each object is recorded (in the same format as in `SceneGeometry`)
+	the first time the object is needed for a given sample, and then the objects are
+	tested against each other by `_intersectingBefore`.
+	"""
+	def __init__(self, objects):
+		self.objects = objects
+		self.rectangles = numpy.empty((len(objects), 5))	# x, y, heading, hw, hl
+		self.radii = numpy.empty(len(objects))
+		self.recorded = numpy.zeros(len(objects), dtype=bool)
+		self.sample = None
+
+	def isSeparated(self, i, sample):
+		"""Whether object **i** does not intersect any object before it."""
+		# Require object to not intersect another object
+		if sample is not self.sample:
+			self.sample = sample
+			self.recorded[:] = False
+		objects, rectangles, recorded = self.objects, self.rectangles, self.recorded
+		for j in numpy.flatnonzero(~recorded[:i+1]):
+			vj = sample[objects[j]]
+			rectangles[j] = (vj.position.x, vj.position.y, vj.heading, vj.hw, vj.hl)
+			self.radii[j] = vj.radius
+			recorded[j] = True
+		return len(_intersectingBefore(rectangles, self.radii, i)) == 0
+
+class _UnsampledObject:
+	"""Placeholder for the ego object when checking requirements on partial samples."""
+	def __getattribute__(self, name):
+		# also catches isinstance checks, which look up __class__
+		raise RuntimeError('tried to use ego object before it was sampled')
+
+	def __bool__(self):
+		return True
+
+_unsampledObject = _UnsampledObject()
+
+def _tryRequirement(req, values):
+	"""Try evaluating a requirement on a partial or batched sample.
+
+	Returns :obj:`None` if the requirement could not be evaluated, e.g. because it
+	depends on a value which has not been sampled yet or is not vectorizable.
+	"""
+	try:
+		with numpy.errstate(all='raise'):
+			result = req.satisfiedBy(values)
+	except Exception:
+		return None
+	if isinstance(result, (bool, numpy.bool_)):
+		return bool(result)
+	if isinstance(result, numpy.ndarray):
+		return result
+	return None
+
+def _generateInWorker(scenario, index, seed, n, workers, maxIterations, verbosity,
+                      batchSize, earlyRejection, adaptiveOrdering, gatherStats, results):
+	"""Generate every **workers**-th scene of a batch; used by `Scenario.generateBatch`.
+
+	Since the scene objects refer back to the scenario (which cannot be pickled), we
+	only send back the sampled values of the scenario's dependencies, from which the
+	parent process assembles the scenes.
+	"""
+	random.seed(seed)
+	numpy.random.seed(seed)
+	scenario.resetExternalSampler()
+	for sceneIndex in range(index, n, workers):
+		try:
+			stats = SamplingStatistics() if gatherStats else None
+			sample, iterations = scenario._sampleValid(maxIterations, verbosity,
+			                                           batchSize=batchSize,
+			                                           earlyRejection=earlyRejection,
+			                                           adaptiveOrdering=adaptiveOrdering,
+			                                           stats=stats)
+			values = tuple(sample[dep] for dep in scenario.dependencies)
+			payload = pickle.dumps((values, iterations, stats))
+			results.put((sceneIndex, 'scene', payload))
+		except Exception as e:
+			try:
+				payload = pickle.dumps(e)
+			except Exception:
+				payload = pickle.dumps(RuntimeError(f'scene generation failed: {e}'))
+			results.put((sceneIndex, 'error', payload))
+			return
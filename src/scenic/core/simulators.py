@@ -7,7 +7,6 @@ from collections import OrderedDict
 from scenic.core.object_types import (enableDynamicProxyFor, setDynamicProxyFor,
                                       disableDynamicProxyFor)
 from scenic.core.distributions import RejectionException
-import scenic.core.dynamics as dynamics
 from scenic.core.errors import RuntimeParseError, InvalidScenarioError
 from scenic.core.vectors import Vector
 
@@ -321,3 +320,6 @@ class SimulationResult:
         self.finalState = self.trajectory[-1]
         self.actions = tuple(actions)
         self.terminationReason = str(terminationReason)
+
+# imported last, since dynamics imports some of the classes above
+import scenic.core.dynamics as dynamics
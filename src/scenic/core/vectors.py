@@ -5,10 +5,13 @@ from __future__ import annotations
 import math
 from math import sin, cos
 import random
+import bisect
 import collections
 import itertools
 
+import numpy
 import shapely.geometry
+import shapely.vectorized
 import wrapt
 
 from scenic.core.distributions import (Samplable, Distribution, MethodDistribution,
@@ -16,7 +19,8 @@ from scenic.core.distributions import (Samplable, Distribution, MethodDistributi
 	RejectionException)
 from scenic.core.lazy_eval import valueInContext, needsLazyEvaluation, makeDelayedFunctionCall
 import scenic.core.utils as utils
-from scenic.core.geometry import normalizeAngle
+from scenic.core.utils import cached_property
+from scenic.core.geometry import normalizeAngle, toPointArray, BoundingBoxGrid
 
 class VectorDistribution(Distribution):
 	"""A distribution over Vectors."""
@@ -295,26 +299,60 @@ class VectorField:
 		value: function computing the heading at the given `Vector`.
 		minSteps (int): Minimum number of steps for `followFrom`; default 4.
 		defaultStepSize (float): Default step size for `followFrom`; default 5.
+		tolerance (float): If not :obj:`None`, `followFrom` uses adaptive integration
+			with this error tolerance by default, instead of fixed steps; default
+			:obj:`None`.
 	"""
-	def __init__(self, name, value, minSteps=4, defaultStepSize=5):
+
+	#: Whether the field is known to be piecewise constant (and never changes), so
+	#: that trajectories computed by `followFrom` can be memoized.
+	piecewiseConstant = False
+	tolerance = None
+
+	#: Maximum number of trajectories memoized by `followFrom`.
+	maxMemoizedTrajectories = 256
+
+	def __init__(self, name, value, minSteps=4, defaultStepSize=5, tolerance=None):
 		self.name = name
 		self.value = value
 		self.valueType = float
 		self.minSteps = minSteps
 		self.defaultStepSize = defaultStepSize
+		self.tolerance = tolerance
 
 	@distributionMethod
 	def __getitem__(self, pos) -> float:
 		return self.value(pos)
 
+	def valuesAt(self, points):
+		"""Compute the headings at a batch of points.
+
+		Subclasses may override this with a more efficient implementation.
+
+		Arguments:
+			points: sequence of points, or NumPy array of shape (n, 2).
+
+		Returns:
+			A NumPy array of n headings.
+		"""
+		points = toPointArray(points)
+		return numpy.array([self.value(Vector(x, y)) for x, y in points], dtype=float)
+
 	@vectorDistributionMethod
-	def followFrom(self, pos, dist, steps=None, stepSize=None):
+	def followFrom(self, pos, dist, steps=None, stepSize=None, tolerance=None):
 		"""Follow the field from a point for a given distance.
 
-		Uses the forward Euler approximation, covering the given distance with
-		equal-size steps. The number of steps can be given manually, or computed
+		By default, uses the forward Euler approximation, covering the given distance
+		with equal-size steps. The number of steps can be given manually, or computed
 		automatically from a desired step size.
 
+		If an error **tolerance** is given, or the field has a default tolerance and
+		neither **steps** nor **stepSize** are given, we instead use the adaptive
+		Bogacki-Shampine method (a 3rd-order Runge-Kutta method), choosing step sizes so
+		that the estimated error of each step is at most the tolerance. For fields which
+		are `piecewiseConstant`, the resulting trajectories are memoized, so that
+		following the field again from the same point (for any distance) is cheap.
+
 		Arguments:
 			pos (`Vector`): point to start from.
 			dist (float): distance to travel.
@@ -322,7 +360,14 @@ class VectorField:
 				steps based on the distance (default :obj:`None`).
 			stepSize (float): length used to compute how many steps to take, or
 				:obj:`None` to use the field's default step size.
+			tolerance (float): error tolerance for adaptive integration, or :obj:`None`
+				to use the field's default (see above).
 		"""
+		if tolerance is None and steps is None and stepSize is None:
+			tolerance = self.tolerance
+		if tolerance is not None:
+			return self._followAdaptively(pos, dist, tolerance)
+
 		if steps is None:
 			steps = self.minSteps
 			stepSize = self.defaultStepSize if stepSize is None else stepSize
@@ -330,9 +375,171 @@ class VectorField:
 				steps = max(steps, math.ceil(dist / stepSize))
 
 		step = dist / steps
+		x, y = pos
 		for i in range(steps):
-			pos = pos.offsetRadially(step, self[pos])
-		return pos
+			# equivalent to pos.offsetRadially(step, self[pos]), but without the overhead
+			# of checking for random values
+			heading = self.value(Vector(x, y))
+			x, y = x - (step * math.sin(heading)), y + (step * math.cos(heading))
+		return Vector(x, y)
+
+	def _initialStepSize(self, dist):
+		if self.defaultStepSize is not None:
+			return self.defaultStepSize
+		return dist / self.minSteps
+
+	@staticmethod
+	def _stepSizeFactor(error, tolerance):
+		if error == 0:
+			return 5
+		return min(5, max(0.2, 0.9 * (tolerance / error) ** (1/3)))
+
+	def _followAdaptively(self, pos, dist, tolerance):
+		"""Scalar adaptive integration for `followFrom`."""
+		direction = 1 if dist >= 0 else -1
+		target = abs(dist)
+		if target == 0:
+			return Vector(*pos)
+		def velocity(x, y):
+			heading = self.value(Vector(x, y))
+			return -direction * math.sin(heading), direction * math.cos(heading)
+
+		# Find the latest memoized point of the trajectory we can start from; each node
+		# stores the distance travelled, position, next step size, and velocity
+		x, y = pos
+		if self.piecewiseConstant:
+			trajectories = self._trajectories
+			initialStep = self._initialStepSize(target)
+			key = (x, y, direction, tolerance, initialStep)
+			nodes = trajectories.get(key)
+			if nodes is None:
+				if len(trajectories) >= self.maxMemoizedTrajectories:
+					del trajectories[next(iter(trajectories))]
+				nodes = trajectories[key] = ([0], [(x, y, initialStep, velocity(x, y))])
+			distances, states = nodes
+			index = bisect.bisect_right(distances, target) - 1
+			s = distances[index]
+			x, y, h, (kx, ky) = states[index]
+			# new nodes can only be memoized if we are extending the trajectory
+			memoizing = (index == len(distances) - 1)
+		else:
+			s, h = 0, self._initialStepSize(target)
+			kx, ky = velocity(x, y)
+			memoizing = False
+
+		while s < target:
+			remaining = target - s
+			if h > remaining:
+				# shortened steps are specific to this distance; stop memoizing
+				h = remaining
+				memoizing = False
+			k2x, k2y = velocity(x + 0.5*h*kx, y + 0.5*h*ky)
+			k3x, k3y = velocity(x + 0.75*h*k2x, y + 0.75*h*k2y)
+			nx = x + h*((2/9)*kx + (1/3)*k2x + (4/9)*k3x)
+			ny = y + h*((2/9)*ky + (1/3)*k2y + (4/9)*k3y)
+			k4x, k4y = velocity(nx, ny)
+			# difference from the embedded 2nd-order method estimates the error
+			ex = h*((-5/72)*kx + (1/12)*k2x + (1/9)*k3x - (1/8)*k4x)
+			ey = h*((-5/72)*ky + (1/12)*k2y + (1/9)*k3y - (1/8)*k4y)
+			error = math.hypot(ex, ey)
+			if error <= tolerance:
+				s = target if h == remaining else s + h
+				x, y, kx, ky = nx, ny, k4x, k4y
+				h *= self._stepSizeFactor(error, tolerance)
+				if memoizing:
+					distances.append(s)
+					states.append((x, y, h, (kx, ky)))
+			else:
+				h *= self._stepSizeFactor(error, tolerance)
+		return Vector(x, y)
+
+	@cached_property
+	def _trajectories(self):
+		return {}
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state.pop('_cached__trajectories', None)	# memoized trajectories can be large
+		return state
+
+	def followFromPoints(self, points, distances, steps=None, stepSize=None,
+	                     tolerance=None):
+		"""Batched version of `followFrom`, following the field from many points at once.
+
+		The field is evaluated at all the current positions at once using `valuesAt`.
+		Trajectories are not memoized.
+
+		Arguments:
+			points: sequence of points to start from, or NumPy array of shape (n, 2).
+			distances: the distance to travel, either a single number or an array giving
+				the distance for each point.
+			steps, stepSize, tolerance: as for `followFrom`.
+
+		Returns:
+			A NumPy array of shape (n, 2) giving the final positions.
+		"""
+		points = toPointArray(points).copy()
+		distances = numpy.broadcast_to(numpy.asarray(distances, dtype=float),
+		                               (len(points),))
+		if tolerance is None and steps is None and stepSize is None:
+			tolerance = self.tolerance
+		if tolerance is not None:
+			return self._followPointsAdaptively(points, distances, tolerance)
+
+		if steps is None:
+			stepSize = self.defaultStepSize if stepSize is None else stepSize
+			if stepSize is None:
+				numSteps = numpy.full(len(points), self.minSteps)
+			else:
+				numSteps = numpy.maximum(self.minSteps, numpy.ceil(distances / stepSize))
+				numSteps = numSteps.astype(int)
+		else:
+			numSteps = numpy.full(len(points), steps)
+		stepLengths = distances / numSteps
+		for i in range(numSteps.max(initial=0)):
+			active = numpy.flatnonzero(numSteps > i)
+			headings = self.valuesAt(points[active])
+			points[active, 0] -= stepLengths[active] * numpy.sin(headings)
+			points[active, 1] += stepLengths[active] * numpy.cos(headings)
+		return points
+
+	def _followPointsAdaptively(self, points, distances, tolerance):
+		"""Batched adaptive integration for `followFromPoints`."""
+		directions = numpy.where(distances >= 0, 1.0, -1.0)
+		targets = numpy.abs(distances)
+		def velocities(indices, positions):
+			headings = self.valuesAt(positions)
+			sign = directions[indices, numpy.newaxis]
+			return sign * numpy.column_stack((-numpy.sin(headings), numpy.cos(headings)))
+
+		travelled = numpy.zeros(len(points))
+		stepSizes = numpy.array([self._initialStepSize(target) for target in targets],
+		                        dtype=float)
+		active = numpy.flatnonzero(targets > 0)
+		k1 = numpy.zeros_like(points)
+		k1[active] = velocities(active, points[active])
+		while len(active) > 0:
+			p, k = points[active], k1[active]
+			remaining = targets[active] - travelled[active]
+			final = (stepSizes[active] >= remaining)
+			h = numpy.where(final, remaining, stepSizes[active])[:, numpy.newaxis]
+			k2 = velocities(active, p + 0.5*h*k)
+			k3 = velocities(active, p + 0.75*h*k2)
+			new = p + h*((2/9)*k + (1/3)*k2 + (4/9)*k3)
+			k4 = velocities(active, new)
+			errors = numpy.hypot(*(h*((-5/72)*k + (1/12)*k2 + (1/9)*k3 - (1/8)*k4)).T)
+			h = h[:, 0]
+			accepted = (errors <= tolerance)
+			with numpy.errstate(divide='ignore'):
+				factors = numpy.clip(0.9 * (tolerance / errors) ** (1/3), 0.2, 5)
+			stepSizes[active] = h * factors
+			done = active[accepted & final]
+			moved = active[accepted]
+			points[moved], k1[moved] = new[accepted], k4[accepted]
+			travelled[moved] += h[accepted]
+			travelled[done] = targets[done]
+			active = active[~(accepted & final)]
+		return points
 
 	@staticmethod
 	def forUnionOf(regions):
@@ -360,9 +567,18 @@ class PolygonalVectorField(VectorField):
 			specified headings, if any (default :obj:`None`).
 		defaultHeading: heading for points not contained in any cell (default
 			:obj:`None`, meaning reject such points).
+		tolerance (float): default error tolerance for `followFrom` (default
+			:obj:`None`, meaning use fixed steps).
+
+	Lookups use a grid index over the bounding boxes of the cells (built on first use),
+	so they take roughly constant time regardless of the number of cells.
 	"""
-	def __init__(self, name, cells, headingFunction=None, defaultHeading=None):
+	def __init__(self, name, cells, headingFunction=None, defaultHeading=None,
+	             tolerance=None):
 		self.cells = tuple(cells)
+		# unless an arbitrary heading function is used, the field is piecewise constant
+		self.piecewiseConstant = (headingFunction is None
+		                          or all(heading is not None for cell, heading in self.cells))
 		if headingFunction is None and defaultHeading is not None:
 			headingFunction = lambda pos: defaultHeading
 		self.headingFunction = headingFunction
@@ -370,24 +586,56 @@ class PolygonalVectorField(VectorField):
 			if heading is None and headingFunction is None and defaultHeading is None:
 				raise RuntimeError(f'missing heading for cell of PolygonalVectorField')
 		self.defaultHeading = defaultHeading
-		super().__init__(name, self.valueAt)
+		super().__init__(name, self.valueAt, tolerance=tolerance)
+
+	@cached_property
+	def cellIndex(self):
+		return BoundingBoxGrid(cell.bounds for cell, heading in self.cells)
 
 	def valueAt(self, pos):
 		point = shapely.geometry.Point(pos)
-		for cell, heading in self.cells:
+		for index in self.cellIndex.candidatesFor(pos):
+			cell, heading = self.cells[index]
 			if cell.intersects(point):
 				return self.headingFunction(pos) if heading is None else heading
 		if self.defaultHeading is not None:
 			return self.defaultHeading
 		raise RejectionException(f'evaluated PolygonalVectorField at undefined point')
 
+	def valuesAt(self, points):
+		points = toPointArray(points)
+		def contains(index, pts):
+			cell = self.cells[index][0]
+			if len(pts) < 4:	# not worth the overhead of a vectorized test
+				return [cell.intersects(shapely.geometry.Point(pt)) for pt in pts]
+			x, y = pts[:, 0], pts[:, 1]
+			inside = shapely.vectorized.contains(cell, x, y)
+			return inside | shapely.vectorized.touches(cell, x, y)
+		owners = self.cellIndex.firstContaining(points, contains)
+		values = numpy.empty(len(points))
+		for index in numpy.unique(owners):
+			mask = (owners == index)
+			if index < 0:
+				if self.defaultHeading is None:
+					raise RejectionException(
+					    f'evaluated PolygonalVectorField at undefined point')
+				values[mask] = self.defaultHeading
+				continue
+			heading = self.cells[index][1]
+			if heading is None:
+				values[mask] = [self.headingFunction(Vector(x, y)) for x, y in points[mask]]
+			else:
+				values[mask] = heading
+		return values
+
 class PiecewiseVectorField(VectorField):
 	"""A vector field defined by patching together several regions.
 
 	The heading at a point is determined by checking each region in turn to see if it has
 	an orientation and contains the point, returning the corresponding heading if so. If
 	we get through all the regions, then we return the **defaultHeading**, if any, and
-	otherwise reject the scene.
+	otherwise reject the scene. Regions whose bounding boxes do not contain the point
+	are skipped using a grid index.
 
 	Arguments:
 		name (str): name for debugging.
@@ -400,10 +648,47 @@ class PiecewiseVectorField(VectorField):
 		self.defaultHeading = defaultHeading
 		super().__init__(name, self.valueAt)
 
+	@cached_property
+	def regionIndex(self):
+		return BoundingBoxGrid(self._boundsOf(region) for region in self.regions)
+
+	@staticmethod
+	def _boundsOf(region):
+		try:
+			(minx, miny), (maxx, maxy) = region.getAABB()
+		except (NotImplementedError, RuntimeError):
+			# region is unbounded, or has no bounding box (e.g. an empty
+			# IntersectionRegion); always check it
+			return None
+		if needsSampling((minx, miny, maxx, maxy)):
+			return None
+		return (minx, miny, maxx, maxy)
+
 	def valueAt(self, point):
-		for region in self.regions:
+		for index in self.regionIndex.candidatesFor(point):
+			region = self.regions[index]
 			if region.containsPoint(point) and region.orientation:
 				return region.orientation[point]
 		if self.defaultHeading is not None:
 			return self.defaultHeading
 		raise RejectionException(f'evaluated PiecewiseVectorField at undefined point')
+
+	def valuesAt(self, points):
+		points = toPointArray(points)
+		def contains(index, pts):
+			region = self.regions[index]
+			if not region.orientation:
+				return numpy.zeros(len(pts), dtype=bool)
+			return region.containsPoints(pts)
+		owners = self.regionIndex.firstContaining(points, contains)
+		values = numpy.empty(len(points))
+		for index in numpy.unique(owners):
+			mask = (owners == index)
+			if index < 0:
+				if self.defaultHeading is None:
+					raise RejectionException(
+					    f'evaluated PiecewiseVectorField at undefined point')
+				values[mask] = self.defaultHeading
+			else:
+				values[mask] = self.regions[index].orientation.valuesAt(points[mask])
+		return values
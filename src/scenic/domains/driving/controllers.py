@@ -15,7 +15,6 @@ which are licensed under the following terms:
 from collections import deque
 
 import numpy as np
-import scipy.linalg as linalg
 
 class PIDLongitudinalController:
 	"""Longitudinal control using a PID to reach a target speed.
@@ -112,6 +111,7 @@ class LQR:
 		self.R = R
 
 	def run_step(self):
+		import scipy.linalg as linalg	# slow import not often needed
 		A = np.matrix([[0, self.v_target*(5./18.)], [0, 0]])
 		B = np.matrix([[0], [(self.v_target/self.wheelbase)*(5./18.)]])
 		V = np.matrix(linalg.solve_continuous_are(A, B, self.Q, self.R))
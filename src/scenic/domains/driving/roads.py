@@ -16,7 +16,9 @@ import io
 import enum
 import hashlib
 import math
+import mmap
 import numbers
+import os
 from typing import FrozenSet, Union, Tuple, Optional, Sequence, List
 import itertools
 import pathlib
@@ -27,7 +29,8 @@ import struct
 import weakref
 
 import attr
-from shapely.geometry import Polygon, MultiPolygon
+import numpy
+from shapely.geometry import Polygon, MultiPolygon, LineString, MultiLineString
 
 from scenic.core.distributions import distributionFunction, distributionMethod
 from scenic.core.vectors import Vector, VectorField
@@ -69,7 +72,8 @@ class _ElementReferencer:
     """
     def __getstate__(self):
         if hasattr(super(), '__getstate__'):
-            state = super().__getstate__()
+            # copy, since object.__getstate__ returns the __dict__ itself in Python 3.11+
+            state = super().__getstate__().copy()
         else:
             state = self.__dict__.copy()
         # replace links to network elements by placeholders to prevent deep
@@ -701,6 +705,436 @@ class Signal:
         """bool: Whether or not this signal is a traffic light."""
         return self.type == "1000001"
 
+class NetworkRaster:
+    """NetworkRaster(network, resolution=1)
+
+    Precomputed raster over a `Network`, accelerating common point queries.
+
+    For each cell of a regular grid (see `RasterIndex`), this stores the road, lane and
+    intersection containing the cell, whether the cell lies in the drivable region, and
+    the value of `Network.roadDirection` if it is constant over the cell. Queries
+    falling in cells which touch element boundaries fall back on the exact geometric
+    tests, so attaching a raster to a network (with `Network.rasterize`) makes no
+    difference to the results of any queries, only their speed.
+
+    Args:
+        network: the `Network` to rasterize.
+        resolution: side length of the raster cells, in meters.
+    """
+
+    #: File extension for cached rasters.
+    cacheExt = '.snetr'
+
+    def __init__(self, network: Network, resolution: float = 1):
+        self.resolution = resolution
+        tolerance = network.tolerance
+        def rasterize(elements, margin=tolerance):
+            return geometry.RasterIndex((elem.polygons for elem in elements),
+                                        resolution, margin)
+        self.roads = rasterize(network.allRoads)
+        self.lanes = rasterize(network.lanes)
+        self.intersections = rasterize(network.intersections)
+        self.drivable = rasterize((network.drivableRegion,), margin=0)
+
+        # Precompute headings of cells lying in a single road
+        roads = self.roads
+        self.headings = numpy.full(roads.cells.shape, numpy.nan)
+        self.headings[roads.cells == geometry.RasterIndex.EMPTY] = 0   # see roadDirection
+        rows, cols = numpy.nonzero(roads.cells >= 0)
+        owners = roads.cells[rows, cols]
+        for index in numpy.unique(owners):
+            inRoad = (owners == index)
+            road = network.allRoads[index]
+            headings = self._headingsIn(road, rows[inRoad] + roads.row0,
+                                        cols[inRoad] + roads.col0, tolerance)
+            self.headings[rows[inRoad], cols[inRoad]] = headings
+
+    def _headingsIn(self, element, rows, cols, tolerance):
+        """Find cells in an element over which its orientation is constant.
+
+        This follows the default orientations of roads, lane groups, and lanes (see
+        `LinearElement._defaultHeadingAt`); elements with custom orientations are left
+        for the exact computation.
+
+        Returns:
+            An array of headings for the given cells, with NaN for any cell where the
+            orientation might not be constant.
+        """
+        value = element.orientation.value
+        method = getattr(value, '__func__', None)
+        if getattr(value, '__self__', None) is not element:
+            method = None
+        if method is LinearElement._defaultHeadingAt:
+            return self._centerlineHeadings(element.centerline, rows, cols)
+        elif method is Road._defaultHeadingAt:
+            children = element.laneGroups
+        elif method is LaneGroup._defaultHeadingAt:
+            children = element.lanes
+        else:
+            return numpy.full(len(rows), numpy.nan)
+
+        # Find which child element (if any) each cell lies in, as findPointIn would
+        childRaster = geometry.RasterIndex((child.polygons for child in children),
+                                           self.resolution, tolerance)
+        owners = childRaster.indicesOfCells(rows, cols)
+        headings = numpy.full(len(rows), numpy.nan)
+        for index in numpy.unique(owners):
+            inChild = (owners == index)
+            if index >= 0:
+                headings[inChild] = self._headingsIn(children[index], rows[inChild],
+                                                     cols[inChild], tolerance)
+            elif index == geometry.RasterIndex.EMPTY:   # no child; use own centerline
+                headings[inChild] = self._centerlineHeadings(element.centerline,
+                                                             rows[inChild], cols[inChild])
+        return headings
+
+    def _centerlineHeadings(self, centerline, rows, cols):
+        """Find cells where the nearest segment of a centerline has a constant heading."""
+        segments = centerline._segmentArray
+        segmentHeadings = numpy.array([Vector(*start).angleTo(Vector(*end))
+                                       for start, end in centerline.segments])
+        # a point in a cell is at most this far from the cell's center
+        radius = self.resolution * math.sqrt(0.5)
+        slack = 1e-9 * (1 + numpy.abs(segments).max())
+        headings = numpy.full(len(rows), numpy.nan)
+        chunkSize = max(1, 1000000 // len(segments))
+        for start in range(0, len(rows), chunkSize):
+            chunk = slice(start, start + chunkSize)
+            centers = numpy.column_stack(((cols[chunk] + 0.5) * self.resolution,
+                                          (rows[chunk] + 0.5) * self.resolution))
+            count = len(centers)
+            _, distances = geometry.projectOntoSegments(
+                numpy.repeat(centers, len(segments), axis=0),
+                numpy.tile(segments, (count, 1)))
+            distances = distances.reshape((count, len(segments)))
+            nearest = numpy.argmin(distances, axis=1)
+            best = distances[numpy.arange(count), nearest]
+            heading = segmentHeadings[nearest]
+            # the nearest segment is the same for all points in the cell unless some
+            # segment with a different heading is nearly as close to the center
+            different = (segmentHeadings[numpy.newaxis, :] != heading[:, numpy.newaxis])
+            rival = numpy.where(different, distances, numpy.inf).min(axis=1)
+            constant = (rival - best > (2 * radius) + slack)
+            headings[chunk] = numpy.where(constant, heading, numpy.nan)
+        return headings
+
+    def headingAt(self, point: Vectorlike) -> Union[float, None]:
+        """Get the value of `Network.roadDirection` at a point, if it is precomputed."""
+        cell = self.roads.cellOf(point)
+        if cell is None:
+            return 0       # no road near the point
+        heading = self.headings[cell]
+        return None if math.isnan(heading) else float(heading)
+
+    @classmethod
+    def fromFile(cls, path, digest, resolution):
+        """Load a cached raster, checking that it matches the given map and resolution.
+
+        Raises:
+            pickle.UnpicklingError: the file is corrupted or out of date.
+            Network.DigestMismatchError: the file does not match the given map.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(76)
+            if len(header) != 76:
+                raise pickle.UnpicklingError(f'{cls.cacheExt} file is corrupted')
+            version, cachedResolution = struct.unpack('<Id', header[:12])
+            if version != Network._currentFormatVersion():
+                raise pickle.UnpicklingError(f'{cls.cacheExt} file is too old')
+            if header[12:] != digest or cachedResolution != resolution:
+                raise Network.DigestMismatchError(
+                    f'{cls.cacheExt} file does not correspond to the given map')
+            with gzip.open(f) as gf:
+                raster = pickle.load(gf)
+        if not isinstance(raster, cls):
+            raise pickle.UnpicklingError(f'{cls.cacheExt} file is corrupted')
+        return raster
+
+    def dumpFile(self, path, digest):
+        header = struct.pack('<Id', Network._currentFormatVersion(), self.resolution)
+        data = pickle.dumps(self)
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.write(digest)
+            with gzip.open(f, 'wb') as gf:
+                gf.write(data)
+
+class _GeometryStore:
+    """Flat array holding the geometry of the regions of a cached `Network`.
+
+    When a network is saved (see `Network.dumpPickle`), the geometry of its regions,
+    i.e. their Shapely polygons and polylines, triangulations, etc., is moved out of
+    the pickle into a single array of coordinates. Each region retains only a
+    `_LazyGeometry` recording which parts of the array it uses. When the network is
+    loaded the array is memory-mapped, so that processes loading the same map share
+    it, and the geometry of each region is only rebuilt when it is first used.
+
+    :meta private:
+    """
+
+    def __init__(self, values=None):
+        self.values = values
+        self._chunks = []
+        self._size = 0
+
+    def _add(self, array):
+        """Append an array of floats to the store, returning its span."""
+        array = numpy.asarray(array, dtype=float)
+        start = self._size
+        self._size += array.size
+        self._chunks.append(array.reshape(-1))
+        return (start, self._size)
+
+    def _get(self, span, dimension=None):
+        start, stop = span
+        values = self.values[start:stop]
+        return values if dimension is None else values.reshape((-1, dimension))
+
+    def finish(self):
+        """Concatenate the geometry added so far into the array of the store."""
+        self.values = numpy.concatenate(self._chunks + [numpy.empty(0)])
+        self._chunks = []
+
+    ## Encoding
+
+    def encode(self, region, state):
+        """Move as much of the geometry of a region as possible into the store.
+
+        The attributes which were moved are deleted from the given state dictionary
+        (as returned by the region's ``__getstate__``), and a `_LazyGeometry` which
+        can restore them is added. Attributes which could not be restored exactly are
+        left in place.
+        """
+        # cached arrays derived from the geometry; recomputed or restored as needed
+        for name in ('_cached__segmentArray', '_cached__cumulativeLengthArray',
+                     '_cached__triangleArray', '_cached__cumulativeAreaArray'):
+            state.pop(name, None)
+        if isinstance(region, PolygonalRegion):
+            parts = [self._encodePolygons(state), self._encodeTriangulation(state)]
+        else:
+            parts = [self._encodePolyline(state)]
+        parts = [part for part in parts if part is not None]
+        if parts:
+            state['_lazyGeometry'] = _LazyGeometry(self, parts)
+
+    def _encodePoints(self, points):
+        """Encode a tuple of points, returning None if they would not round-trip.
+
+        The points must all be tuples or all be lists, of the same length, and their
+        coordinates must be floats.
+        """
+        if not isinstance(points, tuple) or not points:
+            return None
+        pointType, dimension = type(points[0]), len(points[0])
+        if pointType not in (tuple, list):
+            return None
+        for point in points:
+            if type(point) is not pointType or len(point) != dimension:
+                return None
+            if not all(type(coordinate) is float for coordinate in point):
+                return None
+        return (pointType is tuple, dimension, self._add(points))
+
+    def _encodeLines(self, lines):
+        """Encode a sequence of Shapely LineStrings or LinearRings."""
+        return tuple(self._add(line.coords) for line in lines)
+
+    def _encodePolygons(self, state):
+        polygons = state.get('polygons')
+        if not isinstance(polygons, MultiPolygon) or polygons.has_z:
+            return None
+        spec = tuple(self._encodeLines((polygon.exterior, *polygon.interiors))
+                     for polygon in polygons.geoms)
+        attributes = ['polygons']
+        del state['polygons']
+        # the original polygon of a NetworkElement is usually the same as its polygons
+        polygonMode = None
+        polygon = state.get('polygon')
+        if polygon is polygons:
+            polygonMode = 'same'
+        elif (isinstance(polygon, Polygon) and len(polygons.geoms) == 1
+              and polygon.equals_exact(polygons.geoms[0], 0)):
+            polygonMode = 'first'
+        if polygonMode:
+            attributes.append('polygon')
+            del state['polygon']
+        points = self._encodePoints(state.get('points'))
+        if points is not None:
+            attributes.append('points')
+            del state['points']
+        return ('_decodePolygons', tuple(attributes), (spec, polygonMode, points))
+
+    def _encodeTriangulation(self, state):
+        triangles = state.get('triangles')
+        areas = state.get('cumulativeTriangleAreas')
+        if not isinstance(triangles, tuple) or not isinstance(areas, tuple):
+            return None
+        vertices = numpy.array(triangles, dtype=float)
+        if vertices.shape != (len(triangles), 3, 2) or len(areas) != len(triangles):
+            return None
+        if tuple(tuple(map(tuple, tri)) for tri in vertices.tolist()) != triangles:
+            return None
+        spec = (self._add(vertices), self._add(areas))
+        del state['triangles'], state['cumulativeTriangleAreas']
+        return ('_decodeTriangulation', _triangulationAttributes, spec)
+
+    def _encodePolyline(self, state):
+        lineString = state.get('lineString')
+        cumulativeLengths = state.get('cumulativeLengths')
+        if (not isinstance(lineString, (LineString, MultiLineString))
+            or not isinstance(cumulativeLengths, list)):
+            return None
+        isMulti = isinstance(lineString, MultiLineString)
+        lines = self._encodeLines(lineString.geoms if isMulti else (lineString,))
+        segments = PolylineRegion.segmentsOf(lineString)
+        points = state.get('points')
+        if isinstance(points, list) and points == self._derivedPoints(segments):
+            pointsMode = 'derived'
+        else:
+            pointsMode = self._encodePoints(points)
+        attributes = ['lineString', 'segments', 'cumulativeLengths']
+        if pointsMode is not None:
+            attributes.append('points')
+            del state['points']
+        spec = (lines, 3 if lineString.has_z else 2, isMulti, pointsMode,
+                self._add(cumulativeLengths))
+        del state['lineString'], state['segments'], state['cumulativeLengths']
+        return ('_decodePolyline', tuple(attributes), spec)
+
+    @staticmethod
+    def _derivedPoints(segments):
+        # points of a PolylineRegion created from a LineString; see its __init__
+        points = [start for start, end in segments]
+        points.append(segments[-1][1])
+        return points
+
+    ## Decoding
+
+    def _decodePoints(self, spec):
+        isTuple, dimension, span = spec
+        points = self._get(span, dimension).tolist()
+        return tuple(map(tuple, points)) if isTuple else tuple(points)
+
+    def _decodePolygons(self, spec):
+        polygonSpecs, polygonMode, points = spec
+        polygons = []
+        for shell, *holes in polygonSpecs:
+            polygons.append(Polygon(self._get(shell, 2),
+                                    [self._get(hole, 2) for hole in holes]))
+        polygons = MultiPolygon(polygons)
+        attributes = {'polygons': polygons}
+        if polygonMode == 'same':
+            attributes['polygon'] = polygons
+        elif polygonMode == 'first':
+            attributes['polygon'] = polygons.geoms[0]
+        if points is not None:
+            attributes['points'] = self._decodePoints(points)
+        return attributes
+
+    def _decodeTriangulation(self, spec):
+        vertices, areas = spec
+        vertices = self._get(vertices).reshape((-1, 3, 2))
+        areas = self._get(areas)
+        return {
+            'triangles': tuple(tuple(map(tuple, tri)) for tri in vertices.tolist()),
+            'cumulativeTriangleAreas': tuple(areas.tolist()),
+            '_cached__triangleArray': vertices,
+            '_cached__cumulativeAreaArray': areas,
+        }
+
+    def _decodePolyline(self, spec):
+        lines, dimension, isMulti, pointsMode, lengths = spec
+        lines = [LineString(self._get(line, dimension)) for line in lines]
+        lineString = MultiLineString(lines) if isMulti else lines[0]
+        segments = PolylineRegion.segmentsOf(lineString)
+        cumulativeLengths = self._get(lengths)
+        attributes = {
+            'lineString': lineString,
+            'segments': segments,
+            'cumulativeLengths': cumulativeLengths.tolist(),
+            '_cached__cumulativeLengthArray': cumulativeLengths,
+        }
+        if pointsMode == 'derived':
+            attributes['points'] = self._derivedPoints(segments)
+        elif pointsMode is not None:
+            attributes['points'] = self._decodePoints(pointsMode)
+        return attributes
+
+_triangulationAttributes = ('triangles', 'cumulativeTriangleAreas')
+
+class _LazyGeometry:
+    """Parts of the geometry of a region which are held in a `_GeometryStore`.
+
+    Each part is a tuple giving the method of the store which decodes it, the names
+    of the attributes it provides, and its location in the store. Parts are decoded
+    separately, when one of their attributes is first accessed (see
+    `PolygonalRegion.__getattr__`), so that for example triangulations are not built
+    for regions which are never sampled from.
+
+    :meta private:
+    """
+
+    def __init__(self, store, parts):
+        self.store = store
+        self.parts = parts
+
+    def load(self, region, name):
+        for part in self.parts:
+            if name in part[1]:
+                self._loadPart(region, part)
+                return True
+        return False
+
+    def loadAll(self, region):
+        for part in tuple(self.parts):
+            self._loadPart(region, part)
+
+    def _loadPart(self, region, part):
+        decoder, attributes, spec = part
+        region.__dict__.update(getattr(self.store, decoder)(spec))
+        self.parts.remove(part)
+        if not self.parts:
+            del region.__dict__['_lazyGeometry']
+
+class _NetworkPickler(pickle.Pickler):
+    """Pickler moving the geometry of regions into a `_GeometryStore`.
+
+    :meta private:
+    """
+
+    def __init__(self, file, store):
+        super().__init__(file)
+        self.store = store
+
+    def persistent_id(self, obj):
+        return 'geometry' if obj is self.store else None
+
+    def reducer_override(self, obj):
+        if not isinstance(obj, (PolygonalRegion, PolylineRegion)):
+            return NotImplemented
+        reduction = obj.__reduce_ex__(pickle.DEFAULT_PROTOCOL)
+        state = reduction[2]
+        if not isinstance(state, dict):
+            return reduction
+        state = state.copy()
+        self.store.encode(obj, state)
+        return reduction[:2] + (state,) + reduction[3:]
+
+class _NetworkUnpickler(pickle.Unpickler):
+    """Unpickler for networks saved with `_NetworkPickler`.
+
+    :meta private:
+    """
+
+    def __init__(self, file, store):
+        super().__init__(file)
+        self.store = store
+
+    def persistent_load(self, pid):
+        if pid != 'geometry':
+            raise pickle.UnpicklingError(f'unknown persistent ID {pid!r}')
+        return self.store
+
 @attr.s(auto_attribs=True, kw_only=True, repr=False)
 class Network:
     """Network()
@@ -759,6 +1193,9 @@ class Network:
     #: Traffic flow vector field aggregated over all roads (0 elsewhere).
     roadDirection: VectorField = None
 
+    #: Raster accelerating point queries, if any (see `Network.rasterize`).
+    raster = None
+
     def __attrs_post_init__(self):
         proxy = weakref.proxy(self)
         for uid, elem in self.elements.items():
@@ -800,18 +1237,54 @@ class Network:
             # TODO replace with a PolygonalVectorField for better pruning
             self.roadDirection = VectorField('roadDirection', self._defaultRoadDirection)
 
+        # spatial indices for finding elements containing a point (saved in .snet files)
+        self._elementIndices = {}
+        for layer, elems in self._indexedLayers().items():
+            self._elementIndex(layer, elems)
+
     def _defaultRoadDirection(self, point):
         """Default value for the `roadDirection` vector field.
 
         :meta private:
         """
         point = _toVector(point)
+        if self.raster is not None:
+            heading = self.raster.headingAt(point)
+            if heading is not None:
+                return heading
         road = self.roadAt(point)
         return 0 if road is None else road.orientation[point]
 
+    def rasterize(self, resolution: float = 1) -> NetworkRaster:
+        """Precompute a `NetworkRaster` to speed up point queries on this network.
+
+        This accelerates `roadAt`, `laneAt`, `intersectionAt`, and the functions built on
+        them, as well as `roadDirection` and ``drivableRegion.containsPoint``. Rasters
+        can be cached alongside the map using the **rasterResolution** option of
+        `Network.fromFile`.
+
+        Args:
+            resolution: side length of the raster cells, in meters (default 1).
+        """
+        self._attachRaster(NetworkRaster(self, resolution))
+        return self.raster
+
+    def _attachRaster(self, raster):
+        self.raster = raster
+        self.drivableRegion.raster = raster.drivable
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('raster', None)   # rasters are cached separately; see fromFile
+        return state
+
     #: File extension for cached versions of processed networks.
     pickledExt = '.snet'
 
+    #: File extension for caches of the geometry of individual roads, used to speed
+    #: up reprocessing maps which have been edited (see `fromOpenDrive`).
+    roadCacheExt = '.snetc'
+
     @classmethod
     def _currentFormatVersion(cls):
         """Version number for the road network format.
@@ -824,14 +1297,15 @@ class Network:
 
         :meta private:
         """
-        return 16
+        return 20
 
     class DigestMismatchError(Exception):
         """Exception raised when loading a cached map not matching the original file."""
         pass
 
     @classmethod
-    def fromFile(cls, path, useCache:bool = True, writeCache:bool = True, **kwargs):
+    def fromFile(cls, path, useCache:bool = True, writeCache:bool = True,
+                 rasterResolution:Optional[float] = None, **kwargs):
         """Create a `Network` from a map file.
 
         This function calls an appropriate parsing routine based on the extension of the
@@ -851,7 +1325,14 @@ class Network:
                 and matches the given map file (default true; note that if the map file
                 changes, the cached version will still not be used).
             writeCache: Whether to save a cached version of the processed map
-                after parsing has finished (default true).
+                after parsing has finished (default true). If both this and **useCache**
+                are true, a cache of the geometry of each road is also kept in a
+                `roadCacheExt` file, so that after editing a map only the changed roads
+                need to be reprocessed.
+            rasterResolution: If not :obj:`None`, attach a `NetworkRaster` with this
+                resolution to the network (see `Network.rasterize`). The raster is
+                cached in a `NetworkRaster.cacheExt` file next to the map, subject to
+                the **useCache** and **writeCache** options.
             kwargs: Additional keyword arguments specific to particular map formats.
 
         Raises:
@@ -883,9 +1364,22 @@ class Network:
         elif ext not in handlers:
             raise ValueError(f'unknown type of road network file {path}')
 
+        network, digest = cls._loadNetwork(path, handlers, useCache, writeCache, kwargs)
+        if rasterResolution is not None:
+            network._loadRaster(path.with_suffix(NetworkRaster.cacheExt), digest,
+                                rasterResolution, useCache, writeCache)
+        return network
+
+    @classmethod
+    def _loadNetwork(cls, path, handlers, useCache, writeCache, kwargs):
+        """Helper for `fromFile` returning the network and a digest of the map."""
+        ext = path.suffix
+
         # If we don't have an underlying map file, return the pickled version directly
         if ext == cls.pickledExt:
-            return cls.fromPickle(path)
+            with open(path, 'rb') as f:
+                digest = f.read(68)[4:]     # digest of the original map (see dumpPickle)
+            return cls.fromPickle(path), digest
 
         # Otherwise, hash the underlying file to detect when the pickle is outdated
         with open(path, 'rb') as f:
@@ -896,23 +1390,48 @@ class Network:
         pickledPath = path.with_suffix(cls.pickledExt)
         if useCache and pickledPath.exists():
             try:
-                return cls.fromPickle(pickledPath, originalDigest=digest)
+                return cls.fromPickle(pickledPath, originalDigest=digest), digest
             except pickle.UnpicklingError:
                 verbosePrint('Unable to load cached network (old format or corrupted).')
             except cls.DigestMismatchError:
                 verbosePrint('Cached network does not match original file; ignoring it.')
 
-        # Not using the pickled version; parse the original file based on its extension
+        # Not using the pickled version; parse the original file based on its extension,
+        # reusing as much of the geometry computed for a previous version as possible
+        if ext == '.xodr' and useCache and writeCache:
+            kwargs = dict(kwargs)
+            kwargs.setdefault('roadCache', path.with_suffix(cls.roadCacheExt))
         network = handlers[ext](path, **kwargs)
         if writeCache:
             verbosePrint(f'Caching road network in {cls.pickledExt} file.')
             network.dumpPickle(path.with_suffix(cls.pickledExt), digest)
-        return network
+        return network, digest
+
+    def _loadRaster(self, path, digest, resolution, useCache, writeCache):
+        """Helper for `fromFile` attaching a raster, using the cached one if possible."""
+        if useCache and path.exists():
+            try:
+                self._attachRaster(NetworkRaster.fromFile(path, digest, resolution))
+                return
+            except pickle.UnpicklingError:
+                verbosePrint('Unable to load cached raster (old format or corrupted).')
+            except self.DigestMismatchError:
+                verbosePrint('Cached raster does not match map or resolution; ignoring it.')
+
+        startTime = time.time()
+        verbosePrint('Computing raster of road network...')
+        raster = self.rasterize(resolution)
+        totalTime = time.time() - startTime
+        verbosePrint(f'Computed raster in {totalTime:.2f} seconds.')
+        if writeCache:
+            verbosePrint(f'Caching raster in {NetworkRaster.cacheExt} file.')
+            raster.dumpFile(path, digest)
 
     @classmethod
     def fromOpenDrive(cls, path, ref_points:int = 20, tolerance:float = 0.05,
                       fill_gaps:bool = True, fill_intersections:bool = True,
-                      elide_short_roads:bool = False):
+                      elide_short_roads:bool = False, workers:Optional[int] = 1,
+                      roadCache=None):
         """Create a `Network` from an OpenDRIVE file.
 
         Args:
@@ -925,23 +1444,50 @@ class Network:
                 intersections.
             elide_short_roads: Whether to attempt to fix geometry artifacts by
                 eliding roads with length less than **tolerance**.
+            workers: Number of processes to use for computing the geometry of the
+                roads and intersections, or :obj:`None` to use the number of CPUs. The
+                resulting network is the same regardless of the number of workers.
+            roadCache: Path to a file caching the geometry of each road, or :obj:`None`
+                (the default) to not use one. Roads whose definitions are the same as
+                when the cache was last written reuse their geometry from it, so that
+                reprocessing a map after editing a few roads is much faster. The cache
+                is then updated. `Network.fromFile` uses a `roadCacheExt` file next to
+                the map, subject to its **useCache** and **writeCache** options.
         """
         import scenic.formats.opendrive.xodr_parser as xodr_parser
+        cache = None if roadCache is None else xodr_parser.RoadCache.load(roadCache)
         road_map = xodr_parser.RoadMap(tolerance=tolerance,
                                        fill_intersections=fill_intersections,
-                                       elide_short_roads=elide_short_roads)
+                                       elide_short_roads=elide_short_roads,
+                                       cache=cache)
         startTime = time.time()
         verbosePrint('Parsing OpenDRIVE file...')
         road_map.parse(path)
         verbosePrint('Computing road geometry... (this may take a while)')
-        road_map.calculate_geometry(ref_points, calc_gap=fill_gaps, calc_intersect=True)
+        road_map.calculate_geometry(ref_points, calc_gap=fill_gaps, calc_intersect=True,
+                                    workers=workers)
         network = road_map.toScenicNetwork()
+        if cache is not None:
+            verbosePrint(f'Reused cached geometry for {cache.hits} of '
+                         f'{len(road_map.roads)} roads.')
+            cache.save(roadCache)
         totalTime = time.time() - startTime
         verbosePrint(f'Finished loading OpenDRIVE map in {totalTime:.2f} seconds.')
         return network
 
     @classmethod
     def fromPickle(cls, path, originalDigest=None):
+        """Load a network saved with `dumpPickle`.
+
+        The geometry of the network is memory-mapped from the file rather than read
+        into memory, and the Shapely geometry, triangulation, etc. of each region is
+        only built when first used. So loading a large map is fast, and processes
+        loading the same map share the memory holding its geometry.
+
+        Raises:
+            pickle.UnpicklingError: the file is corrupted or out of date.
+            Network.DigestMismatchError: the file does not match **originalDigest**.
+        """
         startTime = time.time()
         verbosePrint('Loading cached version of road network...')
 
@@ -961,8 +1507,25 @@ class Network:
                     f'{cls.pickledExt} file does not correspond to the original map; '
                     ' regenerate it'
                 )
-            with gzip.open(f) as gf:
-                network = pickle.load(gf)
+            sizes = f.read(16)
+            if len(sizes) != 16:
+                raise pickle.UnpicklingError(f'{cls.pickledExt} file is corrupted')
+            dataSize, numValues = struct.unpack('<QQ', sizes)
+            data = f.read(dataSize)
+            if len(data) != dataSize:
+                raise pickle.UnpicklingError(f'{cls.pickledExt} file is corrupted')
+            # Map the geometry instead of reading it (see _GeometryStore)
+            offset = cls._geometryOffset(f.tell())
+            if os.fstat(f.fileno()).st_size < offset + 8*numValues:
+                raise pickle.UnpicklingError(f'{cls.pickledExt} file is corrupted')
+            if numValues > 0:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                values = numpy.frombuffer(buffer, dtype='<f8', count=numValues,
+                                          offset=offset)
+            else:
+                values = numpy.empty(0)
+        store = _GeometryStore(values)
+        network = _NetworkUnpickler(io.BytesIO(gzip.decompress(data)), store).load()
 
         # Reconnect links between network elements
         def reconnect(thing):
@@ -983,16 +1546,43 @@ class Network:
         return network
 
     def dumpPickle(self, path, digest):
+        """Save this network in the `pickledExt` format.
+
+        The file consists of a header giving the format version and the digest of the
+        original map, a compressed pickle of the network with the geometry of its
+        regions removed, and then the geometry stored in a flat array (see
+        `_GeometryStore`), which `fromPickle` memory-maps and decodes lazily.
+        """
         path = pathlib.Path(path)
         if not path.suffix:
             path = path.with_suffix(self.pickledExt)
         version = struct.pack('<I', self._currentFormatVersion())
-        data = pickle.dumps(self)
-        with open(path, 'wb') as f:
-            f.write(version)    # uncompressed in case we change compression schemes later
-            f.write(digest)     # uncompressed for quick lookup
-            with gzip.open(f, 'wb') as gf:
-                gf.write(data)
+        store = _GeometryStore()
+        buffer = io.BytesIO()
+        _NetworkPickler(buffer, store).dump(self)
+        store.finish()
+        data = gzip.compress(buffer.getvalue())
+        sizes = struct.pack('<QQ', len(data), len(store.values))
+        # Write to a temporary file first, since other processes may have the old
+        # version of the file mapped into memory (and to avoid leaving partial files)
+        tempPath = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tempPath, 'wb') as f:
+                f.write(version)    # uncompressed in case we change compression schemes later
+                f.write(digest)     # uncompressed for quick lookup
+                f.write(sizes)
+                f.write(data)
+                f.write(bytes(self._geometryOffset(f.tell()) - f.tell()))
+                f.write(store.values.astype('<f8').tobytes())
+            os.replace(tempPath, path)
+        except BaseException:
+            os.remove(tempPath)
+            raise
+
+    @staticmethod
+    def _geometryOffset(position):
+        """Offset of the geometry in a `pickledExt` file (aligned for mapping)."""
+        return position + (-position % 8)
 
     @distributionMethod
     def findPointIn(self, point: Vectorlike,
@@ -1047,15 +1637,58 @@ class Network:
             return intersection
         return self.roadAt(point, reject=reject)
 
+    def _indexedLayers(self):
+        return {
+            'roads': self.allRoads,
+            'lanes': self.lanes,
+            'intersections': self.intersections,
+        }
+
+    def _elementIndex(self, layer, elems):
+        """Get the spatial index for a layer of elements, building it if necessary.
+
+        The index is a `BoundingBoxGrid` over the bounding boxes of the elements, enlarged
+        by the network's **tolerance** so that it finds every element which
+        `findPointIn` could return.
+        """
+        tolerance, index = self._elementIndices.get(layer, (None, None))
+        if tolerance != self.tolerance:     # tolerance may have been changed
+            tolerance = self.tolerance
+            boxes = []
+            for elem in elems:
+                minx, miny, maxx, maxy = elem.polygons.bounds
+                boxes.append((minx - tolerance, miny - tolerance,
+                              maxx + tolerance, maxy + tolerance))
+            index = geometry.BoundingBoxGrid(boxes, maxBucketsPerBox=256)
+            self._elementIndices[layer] = (tolerance, index)
+        return index
+
+    def _findPointInLayer(self, point, elems, layer, reject):
+        """Version of `findPointIn` using a spatial index (and raster, if any).
+
+        Only the elements whose bounding boxes are near the point are checked, in their
+        original order, so the result is the same as that of `findPointIn`.
+        """
+        point = _toVector(point)
+        if self.raster is not None:
+            index = getattr(self.raster, layer).indexAt(point)
+            if index >= 0:
+                return elems[index]
+            elif index == geometry.RasterIndex.EMPTY:
+                # no element is within the tolerance of the point
+                return self.findPointIn(point, (), reject)
+        candidates = self._elementIndex(layer, elems).candidatesFor(point)
+        return self.findPointIn(point, [elems[i] for i in candidates], reject)
+
     @distributionMethod
     def roadAt(self, point: Vectorlike, reject=False) -> Union[Road, None]:
         """Get the `Road` passing through a given point."""
-        return self.findPointIn(point, self.allRoads, reject)
+        return self._findPointInLayer(point, self.allRoads, 'roads', reject)
 
     @distributionMethod
     def laneAt(self, point: Vectorlike, reject=False) -> Union[Lane, None]:
         """Get the `Lane` passing through a given point."""
-        return self.findPointIn(point, self.lanes, reject)
+        return self._findPointInLayer(point, self.lanes, 'lanes', reject)
 
     @distributionMethod
     def laneSectionAt(self, point: Vectorlike, reject=False) -> Union[LaneSection, None]:
@@ -1083,7 +1716,7 @@ class Network:
     def intersectionAt(self, point: Vectorlike,
                        reject=False) -> Union[Intersection, None]:
         """Get the `Intersection` at a given point."""
-        return self.findPointIn(point, self.intersections, reject)
+        return self._findPointInLayer(point, self.intersections, 'intersections', reject)
 
     @distributionMethod
     def nominalDirectionsAt(self, point: Vectorlike, reject=False) -> Tuple[float]:
@@ -1097,6 +1730,10 @@ class Network:
             return inter.nominalDirectionsAt(point)
         road = self.roadAt(point, reject=reject)
         if road is not None:
+            if self.raster is not None:
+                heading = self.raster.headingAt(point)
+                if heading is not None:
+                    return (heading,)
             return road.nominalDirectionsAt(point)
         return ()
 
@@ -2,12 +2,16 @@
 
 import math
 import itertools
+import os
+import concurrent.futures
+import hashlib
+import pickle
+import zlib
 import warnings
 import xml.etree.ElementTree as ET
 import numpy as np
 from scipy.integrate import quad
-from scipy.integrate import solve_ivp
-from pynverse import inversefunc
+import scipy.special
 from shapely.geometry import Polygon, MultiPolygon, GeometryCollection, Point, MultiPoint
 from shapely.ops import unary_union, snap
 import abc
@@ -37,6 +41,37 @@ class Poly3:
         return self.b + 2 * self.c * x + 3 * self.d * x ** 2
 
 
+#: Gauss-Legendre nodes and weights used to integrate the speed of polynomial curves.
+_gauss_nodes, _gauss_weights = np.polynomial.legendre.leggauss(8)
+
+def _integrate_speed(speed, a, b):
+    '''Integrate SPEED over each of the intervals [a, b] (given as arrays).'''
+    half = (b - a) / 2
+    nodes = ((a + b) / 2)[..., np.newaxis] + half[..., np.newaxis] * _gauss_nodes
+    return half * (speed(nodes) @ _gauss_weights)
+
+def _invert_arclength(speed, s, p_max, panels=64, max_iterations=8):
+    '''Find the parameter values at which a curve reaches the arc lengths S.
+
+    The curve is parametrized over [0, P_MAX] and its speed (the derivative of
+    arc length with respect to the parameter) is given by the vectorized function
+    SPEED. We tabulate the arc length at the boundaries of equal-sized panels,
+    interpolate an initial guess, and then refine it with Newton's method.
+    '''
+    edges = np.linspace(0, p_max, panels + 1)
+    lengths = np.concatenate(([0], np.cumsum(_integrate_speed(speed, edges[:-1], edges[1:]))))
+    panel = np.clip(np.searchsorted(lengths, s, side='right') - 1, 0, panels - 1)
+    start, start_length = edges[panel], lengths[panel]
+    p = np.interp(s, lengths, edges)
+    tolerance = 1e-12 * max(lengths[-1], 1)
+    for i in range(max_iterations):
+        error = start_length + _integrate_speed(speed, start, p) - s
+        p = p - error / np.maximum(speed(p), 1e-12)
+        if np.all(np.abs(error) <= tolerance):
+            break
+    return p
+
+
 class Curve:
     ''' Geometric elements which compose road reference lines.
     See the OpenDRIVE Format Specification for coordinate system details.'''
@@ -59,19 +94,24 @@ class Curve:
         extras = itertools.chain(extra_points, itertools.repeat(float('inf')))
         next_extra = next(extras)
         last_s = 0
-        for s in np.linspace(0, self.length, num=num):
+        for s in np.linspace(0, self.length, num=num).tolist():
             while next_extra <= s:
                 if last_s + 1e-6 < next_extra < s - 1e-6:
                     s_vals.append(next_extra)
                 next_extra = next(extras)
             s_vals.append(s)
             last_s = s
-        return [self.point_at(s) for s in s_vals]
+        points = self.points_at(np.array(s_vals, dtype=float))
+        return list(map(tuple, points.tolist()))
 
     @abc.abstractmethod
+    def points_at(self, s):
+        '''Get an array of (x, y, s) points along the curve at an array of s coordinates.'''
+        return
+
     def point_at(self, s):
         '''Get an (x, y, s) point along the curve at the given s coordinate.'''
-        return
+        return tuple(self.points_at(np.array([s], dtype=float))[0].tolist())
 
     def rel_to_abs(self, point):
         '''Convert from relative coordinates of curve to absolute coordinates.
@@ -81,6 +121,12 @@ class Curve:
                 self.y0 + self.sin_hdg * x + self.cos_hdg * y,
                 s)
 
+    def rel_to_abs_array(self, x, y, s):
+        '''Vectorized version of rel_to_abs, taking arrays of coordinates.'''
+        return np.column_stack((self.x0 + self.cos_hdg * x - self.sin_hdg * y,
+                                self.y0 + self.sin_hdg * x + self.cos_hdg * y,
+                                s))
+
 
 class Cubic(Curve):
     '''A curve defined by the cubic polynomial a + bu + cu^2 + du^3.
@@ -89,14 +135,16 @@ class Cubic(Curve):
         super().__init__(x0, y0, hdg, length)
         self.poly = Poly3(a, b, c, d)
 
+    def speed(self, u):
+        return np.sqrt(1 + self.poly.grad_at(u) ** 2)
+
     def arclength(self, u):
-        d_arc = lambda x: np.sqrt(1 + self.poly.grad_at(x) ** 2)
-        return quad(d_arc, 0, u)[0]
+        return quad(self.speed, 0, u)[0]
 
-    def point_at(self, s):
-        u = inversefunc(self.arclength, s)[0]
-        pt = (s, self.poly.eval_at(u), s)
-        return self.rel_to_abs(pt)
+    def points_at(self, s):
+        # Since the speed is at least 1, u never exceeds s.
+        u = _invert_arclength(self.speed, s, self.length)
+        return self.rel_to_abs_array(u, self.poly.eval_at(u), s)
 
 
 class ParamCubic(Curve):
@@ -112,15 +160,15 @@ class ParamCubic(Curve):
         self.v_poly = Poly3(av, bv, cv, dv)
         self.p_range = p_range if p_range else 1
 
+    def speed(self, p):
+        return np.hypot(self.u_poly.grad_at(p), self.v_poly.grad_at(p))
+
     def arclength(self, p):
-        d_arc = lambda x: math.hypot(self.u_poly.grad_at(x),
-                                     self.v_poly.grad_at(x))
-        return quad(d_arc, 0, p)[0]
+        return quad(self.speed, 0, p)[0]
 
-    def point_at(self, s):
-        p = inversefunc(self.arclength, s)[0]
-        pt = (self.u_poly.eval_at(p), self.v_poly.eval_at(p), s)
-        return self.rel_to_abs(pt)
+    def points_at(self, s):
+        p = _invert_arclength(self.speed, s, self.p_range)
+        return self.rel_to_abs_array(self.u_poly.eval_at(p), self.v_poly.eval_at(p), s)
 
 
 class Clothoid(Curve):
@@ -134,31 +182,35 @@ class Clothoid(Curve):
         self.curve_rate = (curv1 - curv0) / length
         self.a = abs(curv0)
         self.r = 1 / self.a if curv0 != 0 else 1    # value not used if curv0 == 0
-        self.ode_init = np.array([x0, y0, hdg])
 
-    def point_at(self, s):
-        # Generate a origin-centered clothoid with zero curvature at origin,
-        # then translate/rotate the relevant segment.
+    def points_at(self, s):
         # Arcs are just a degenerate clothoid:
         if self.curv0 == self.curv1:
             if self.curv0 == 0:
-                pt = (s, 0, s)
+                return self.rel_to_abs_array(s, 0, s)
+            r = self.r
+            th = s * self.a
+            if self.curv0 > 0:
+                y = r - r * np.cos(th)
             else:
-                r = self.r
-                th = s * self.a
-                if self.curv0 > 0:
-                    pt = (r * math.sin(th), r - r * math.cos(th), s)
-                else:
-                    pt = (r * math.sin(th), -r + r * math.cos(th), s)
-            return self.rel_to_abs(pt)
-        else:
-            def clothoid_ode(s, state):
-                x, y, theta = state
-                return np.array([math.cos(theta), math.sin(theta),
-                                self.curv0 + (self.curve_rate * s)])
-            sol = solve_ivp(clothoid_ode, (0, s), self.ode_init)
-            x, y, hdg = sol.y[:,-1]
-            return (x, y, s)
+                y = -r + r * np.cos(th)
+            return self.rel_to_abs_array(r * np.sin(th), y, s)
+        # Otherwise the heading is hdg + curv0*t + (rate/2)*t^2 at arc length t.
+        # Completing the square and substituting u = (t + curv0/rate) / scale turns
+        # the coordinates into differences of the Fresnel integrals
+        # C(u) = \int_0^u cos(pi/2 w^2) dw and S(u) = \int_0^u sin(pi/2 w^2) dw.
+        rate = self.curve_rate
+        sign = 1 if rate > 0 else -1
+        scale = math.sqrt(math.pi / abs(rate))
+        offset = self.curv0 / rate
+        phase = self.hdg - self.curv0 * offset / 2
+        S0, C0 = scipy.special.fresnel(offset / scale)
+        S, C = scipy.special.fresnel((s + offset) / scale)
+        dC, dS = scale * (C - C0), sign * scale * (S - S0)
+        cos_phase, sin_phase = math.cos(phase), math.sin(phase)
+        return np.column_stack((self.x0 + cos_phase * dC - sin_phase * dS,
+                                self.y0 + sin_phase * dC + cos_phase * dS,
+                                s))
 
 class Line(Curve):
     '''A line segment between (x0, y0) and (x1, y1).'''
@@ -168,8 +220,8 @@ class Line(Curve):
         self.x1 = x0 + length * math.cos(hdg)
         self.y1 = y0 + length * math.sin(hdg)
 
-    def point_at(self, s):
-        return self.rel_to_abs((s, 0, s))
+    def points_at(self, s):
+        return self.rel_to_abs_array(s, 0, s)
 
 
 class Lane():
@@ -1006,6 +1058,118 @@ class Road:
 
         return road, allElements
 
+def _calculate_road_geometry(road, args):
+    '''Compute the geometry of a road in a worker process (see RoadMap.calculate_geometry).'''
+    road.calculate_geometry(*args)
+    return road
+
+def _junction_union(polys, tolerance, fill_intersections):
+    union = buffer_union(polys, tolerance=tolerance)
+    if fill_intersections:
+        union = removeHoles(union)
+    return union
+
+class RoadCache:
+    '''Cache of the geometry computed for the individual roads of a map.
+
+    Entries are keyed by a digest of the XML defining a road (and the signals it
+    references) together with the parameters affecting its geometry, so that when a
+    map is edited only the roads whose definitions changed need to be recomputed.
+    Operations combining several roads (filling gaps, computing intersections,
+    linking roads, etc.) are always redone, so roads neighboring an edited one are
+    updated as usual.
+    '''
+    # attributes of a Road which depend on other parts of the map, and so are not cached
+    uncached_attributes = ('predecessor', 'successor')
+
+    def __init__(self, entries=None):
+        self.entries = {} if entries is None else entries
+        self.used = {}      # entries used during this run, which are the ones saved
+        self.modified = False
+        self.hits = 0
+
+    @staticmethod
+    def _version():
+        return roadDomain.Network._currentFormatVersion().to_bytes(4, 'little')
+
+    @classmethod
+    def load(cls, path):
+        '''Load a cache saved with `save`, returning an empty cache if that fails.'''
+        try:
+            with open(path, 'rb') as f:
+                if f.read(4) != cls._version():
+                    return cls()
+                entries = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return cls()
+        return cls(entries) if isinstance(entries, dict) else cls()
+
+    def save(self, path):
+        '''Save the entries used since the cache was loaded, discarding the others.'''
+        if not self.modified and self.used.keys() == self.entries.keys():
+            return      # file is already up to date
+        # entries are compressed individually (see _pack), so no need to compress here
+        data = pickle.dumps(self.used, protocol=pickle.HIGHEST_PROTOCOL)
+        tempPath = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tempPath, 'wb') as f:
+                f.write(self._version())
+                f.write(data)
+            os.replace(tempPath, path)
+        except BaseException:
+            os.remove(tempPath)
+            raise
+
+    def _pack(self, value):
+        self.modified = True
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return zlib.compress(data, 1)     # favor speed over size
+
+    @staticmethod
+    def _unpack(data):
+        return pickle.loads(zlib.decompress(data))
+
+    def _entry(self, key):
+        entry = self.used.get(key)
+        if entry is None:
+            # entries hold the pickled road geometry and Scenic elements (if computed)
+            entry = self.entries.get(key, [None, None])
+            self.used[key] = entry
+        return entry
+
+    def restore_geometry(self, road, key):
+        '''Restore the result of `Road.calculate_geometry` if cached.'''
+        data = self._entry(key)[0]
+        if data is None:
+            return False
+        road.__dict__.update(self._unpack(data))
+        self.hits += 1
+        return True
+
+    def store_geometry(self, road, key):
+        state = {name: value for name, value in road.__dict__.items()
+                 if name not in self.uncached_attributes}
+        self._entry(key)[0] = self._pack(state)
+
+    def scenic_road(self, road, key, tolerance):
+        '''Get the result of `Road.toScenicRoad`, computing it if not cached.'''
+        entry = self._entry(key)
+        if entry[1] is None:
+            newRoad, elts = road.toScenicRoad(tolerance=tolerance)
+            entry[1] = self._pack((newRoad, elts))
+            return newRoad, elts
+        newRoad, elts = self._unpack(entry[1])
+        # Reconnect links between elements (which are all within this road so far)
+        elements = {elt.uid: elt for elt in elts}
+        for elt in elts:
+            state = elt.__dict__
+            for name, value in state.items():
+                if isinstance(value, roadDomain._ElementPlaceholder):
+                    state[name] = elements[value.uid]
+            if isinstance(elt, roadDomain.NetworkElement):
+                elt.network = None
+        return newRoad, elts
+
 class Signal:
     '''Traffic lights, stop signs, etc.'''
     def __init__(self, id_, country, type_, subtype, orientation, validity=None):
@@ -1036,7 +1200,7 @@ class RoadMap:
                                       'connectingRamp'),
                  sidewalk_lane_types=('sidewalk',),
                  shoulder_lane_types=('shoulder', 'parking', 'stop', 'border'),
-                 elide_short_roads=False):
+                 elide_short_roads=False, cache=None):
         self.tolerance = self.defaultTolerance if tolerance is None else tolerance
         self.roads = {}
         self.road_links = []
@@ -1049,16 +1213,53 @@ class RoadMap:
         self.sidewalk_lane_types = sidewalk_lane_types
         self.shoulder_lane_types = shoulder_lane_types
         self.elide_short_roads = elide_short_roads
+        self.cache = cache      # optional RoadCache
+        self.road_digests = {}  # digests of the XML of each road, if using a cache
+        self.road_keys = {}     # keys of each road in the cache
 
-    def calculate_geometry(self, num, calc_gap=False, calc_intersect=True):
+    def calculate_geometry(self, num, calc_gap=False, calc_intersect=True, workers=1):
         # If calc_gap=True, fills in gaps between connected roads.
         # If calc_intersect=True, calculates intersection regions.
-        # These are fairly expensive.
-        for road in self.roads.values():
-            road.calculate_geometry(num, calc_gap=calc_gap, tolerance=self.tolerance,
-                                    drivable_lane_types=self.drivable_lane_types,
-                                    sidewalk_lane_types=self.sidewalk_lane_types,
-                                    shoulder_lane_types=self.shoulder_lane_types)
+        # These are fairly expensive, so if workers > 1 (or is None, meaning the number
+        # of CPUs), the geometry of each road and the unions of polygons are computed
+        # in parallel by a pool of processes. The results are the same either way.
+        # If there is a cache, the geometry of roads found in it is not recomputed.
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers > 1 and len(self.roads) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                self._calculate_geometry(num, calc_gap, calc_intersect, pool, workers)
+        else:
+            self._calculate_geometry(num, calc_gap, calc_intersect, None, 1)
+
+    def _calculate_geometry(self, num, calc_gap, calc_intersect, pool, workers):
+        roads = list(self.roads.values())
+        args = (num, self.tolerance, calc_gap, self.drivable_lane_types,
+                self.sidewalk_lane_types, self.shoulder_lane_types)
+        if self.cache is None:
+            pending = roads
+        else:
+            params = repr(args).encode()
+            for road in roads:
+                digest = hashlib.blake2b(params + self.road_digests[road.id_]).digest()
+                self.road_keys[road.id_] = digest
+            pending = [road for road in roads
+                       if not self.cache.restore_geometry(road, self.road_keys[road.id_])]
+        if pool is None:
+            for road in pending:
+                road.calculate_geometry(*args)
+        else:
+            # roads only refer to each other by ID, so we can update each one in place
+            # from its copy processed by a worker
+            chunksize = max(1, len(pending) // (4 * workers))
+            results = pool.map(_calculate_road_geometry, pending,
+                               itertools.repeat(args), chunksize=chunksize)
+            for road, result in zip(pending, results):
+                road.__dict__.update(result.__dict__)
+        if self.cache is not None:
+            for road in pending:
+                self.cache.store_geometry(road, self.road_keys[road.id_])
+        for road in roads:
             self.sec_lane_polys.extend(road.sec_lane_polys)
             self.lane_polys.extend(road.lane_polys)
 
@@ -1125,21 +1326,37 @@ class RoadMap:
             sidewalk_polys = [road.sidewalk_region for road in self.roads.values()]
             shoulder_polys = [road.shoulder_region for road in self.roads.values()]
 
-        self.drivable_region = buffer_union(drivable_polys, tolerance=self.tolerance)
-        self.sidewalk_region = buffer_union(sidewalk_polys, tolerance=self.tolerance)
-        self.shoulder_region = buffer_union(shoulder_polys, tolerance=self.tolerance)
-
-        if calc_intersect:
-            self.calculate_intersections()
-
-    def calculate_intersections(self):
-        intersect_polys = []
-        for junc in self.junctions.values():
+        regions = (drivable_polys, sidewalk_polys, shoulder_polys)
+        if pool is None:
+            unions = [buffer_union(polys, tolerance=self.tolerance) for polys in regions]
+            self.drivable_region, self.sidewalk_region, self.shoulder_region = unions
+            if calc_intersect:
+                self.calculate_intersections()
+        else:
+            # compute these unions at the same time as those for the junctions
+            unions = [pool.submit(buffer_union, polys, tolerance=self.tolerance)
+                      for polys in regions]
+            if calc_intersect:
+                self.calculate_intersections(pool)
+            unions = [union.result() for union in unions]
+            self.drivable_region, self.sidewalk_region, self.shoulder_region = unions
+
+    def calculate_intersections(self, pool=None):
+        junctions = list(self.junctions.values())
+        all_junc_polys = []
+        for junc in junctions:
             junc_polys = [self.roads[i].drivable_region for i in junc.paths]
             assert junc_polys, junc
-            union = buffer_union(junc_polys, tolerance=self.tolerance)
-            if self.fill_intersections:
-                union = removeHoles(union)
+            all_junc_polys.append(junc_polys)
+        if pool is None:
+            unions = [_junction_union(polys, self.tolerance, self.fill_intersections)
+                      for polys in all_junc_polys]
+        else:
+            unions = pool.map(_junction_union, all_junc_polys,
+                              itertools.repeat(self.tolerance),
+                              itertools.repeat(self.fill_intersections))
+        intersect_polys = []
+        for junc, union in zip(junctions, unions):
             assert union.is_valid
             junc.poly = union
             intersect_polys.append(union)
@@ -1291,12 +1508,14 @@ class RoadMap:
 
         # Creating temporal signals container to resolve referenced signals.
         _temp_signals = {}
+        _temp_signal_elems = {}
         for r in root.iter('road'):
             signals = r.find('signals')
             if signals is not None:
                 for s in signals.iter('signal'):
                     signal = self.__parse_signal(s)
                     _temp_signals[signal.id_] = signal
+                    _temp_signal_elems[signal.id_] = s
 
         # parse roads
         self.elidedRoads = {}
@@ -1353,13 +1572,13 @@ class RoadMap:
                     curv1 = float(curve_elem.get('curvEnd'))
                     curve = Clothoid(x0, y0, hdg, length, curv0, curv1)
                 elif curve_elem.tag == 'poly3':
-                    a, b, c, d = cubic_elem.get('a'), \
+                    a, b, c, d = float(curve_elem.get('a')), \
                         float(curve_elem.get('b')), \
                         float(curve_elem.get('c')), \
                         float(curve_elem.get('d'))
                     curve = Cubic(x0, y0, hdg, length, a, b, c, d)
                 elif curve_elem.tag == 'paramPoly3':
-                    au, bu, cu, du, av, bv, cv, dv, p_range = \
+                    au, bu, cu, du, av, bv, cv, dv = \
                         float(curve_elem.get('aU')), \
                         float(curve_elem.get('bU')), \
                         float(curve_elem.get('cU')), \
@@ -1367,8 +1586,9 @@ class RoadMap:
                         float(curve_elem.get('aV')), \
                         float(curve_elem.get('bV')), \
                         float(curve_elem.get('cV')), \
-                        float(curve_elem.get('dV')), \
-                        float(curve_elem.get('pRange'))
+                        float(curve_elem.get('dV'))
+                    # p ranges over [0, 1] unless it is given as arc length.
+                    p_range = length if curve_elem.get('pRange') == 'arcLength' else 1
                     curve = ParamCubic(x0, y0, hdg, length,
                                        au, bu, cu, du, av, bv,
                                        cv, dv, p_range)
@@ -1489,6 +1709,16 @@ class RoadMap:
             assert road.lane_secs
             self.roads[road.id_] = road
 
+            # digest the definition of the road for looking it up in the cache
+            if self.cache is not None:
+                digest = hashlib.blake2b(ET.tostring(r))
+                if signals is not None:
+                    for signal_ref_elem in signals.iter('signalReference'):
+                        signal_elem = _temp_signal_elems.get(signal_ref_elem.get('id'))
+                        if signal_elem is not None:
+                            digest.update(ET.tostring(signal_elem))
+                self.road_digests[road.id_] = digest.digest()
+
         # Handle links to/from elided roads
         new_links = []
         for link in self.road_links:
@@ -1525,7 +1755,11 @@ class RoadMap:
         for id_, road in self.roads.items():
             if road.drivable_region.is_empty:
                 continue    # not actually a road you can drive on
-            newRoad, elts = road.toScenicRoad(tolerance=self.tolerance)
+            if self.cache is None:
+                newRoad, elts = road.toScenicRoad(tolerance=self.tolerance)
+            else:
+                key = self.road_keys[id_]
+                newRoad, elts = self.cache.scenic_road(road, key, self.tolerance)
             registerAll(elts)
             (connectingRoads if road.junction else mainRoads)[id_] = newRoad
             roads[id_] = newRoad
@@ -12,13 +12,11 @@ from scenic.syntax.translator import verbosity
 if verbosity == 0:	# suppress pygame advertisement at zero verbosity
 	import os
 	os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
-import pygame
 
 from scenic.domains.driving.simulators import DrivingSimulator, DrivingSimulation
 from scenic.core.simulators import SimulationCreationError
 from scenic.syntax.veneer import verbosePrint
 import scenic.simulators.carla.utils.utils as utils
-import scenic.simulators.carla.utils.visuals as visuals
 
 
 class CarlaSimulator(DrivingSimulator):
@@ -93,6 +91,8 @@ class CarlaSimulation(DrivingSimulation):
 		self.record = record
 		self.scenario_number = scenario_number
 		if self.render:
+			import pygame	# slow import only needed for rendering
+			import scenic.simulators.carla.utils.visuals as visuals
 			self.displayDim = (1280, 720)
 			self.displayClock = pygame.time.Clock()
 			self.camTransform = 0
@@ -199,6 +199,7 @@ class CarlaSimulation(DrivingSimulation):
 
 		# Render simulation
 		if self.render:
+			import pygame
 			# self.hud.tick(self.world, self.ego, self.displayClock)
 			self.cameraManager.render(self.display)
 			# self.hud.render(self.display)
@@ -7,7 +7,6 @@
 
 import carla
 
-import cv2
 import json
 import numpy as np
 
@@ -270,6 +269,7 @@ class VideoRecording:
 
     @staticmethod
     def import_from_file(filepath):
+        import cv2  # slow import not often needed
         stream = cv2.VideoCapture(filepath)
         num_frames = int(stream.get(cv2.CAP_PROP_FRAME_COUNT))
 
@@ -287,6 +287,7 @@ class VideoRecording:
             print('Tried to save video, but no frames have been recorded')
             return
 
+        import cv2  # slow import not often needed
         frame_height, frame_width, _ = self.frames[0].shape
 
         out = cv2.VideoWriter(
@@ -4,7 +4,6 @@ import math
 
 import lgsvl
 import numpy as np
-from scipy import linalg
 
 from scenic.domains.driving.actions import *	# Most actions imported here
 import scenic.simulators.lgsvl.utils as utils
@@ -75,6 +74,7 @@ class TrackWaypointsAction(Action):
 		return agent.lgsvlAgentType is lgsvl.AgentType.EGO
 
 	def LQR(v_target, wheelbase, Q, R):
+		from scipy import linalg	# slow import not often needed
 		A = np.matrix([[0, v_target*(5./18.)], [0, 0]])
 		B = np.matrix([[0], [(v_target/wheelbase)*(5./18.)]])
 		V = np.matrix(linalg.solve_continuous_are(A, B, Q, R))
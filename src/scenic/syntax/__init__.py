@@ -7,6 +7,7 @@
 .. autosummary::
    :toctree:
 
+   importer
    relations
    translator
    veneer
@@ -0,0 +1,47 @@
+"""Import hook allowing Scenic modules to be imported like Python modules.
+
+The hook is installed when the :mod:`scenic` package is imported. It only looks for
+files with Scenic extensions, so that the translator (and the heavy dependencies it
+pulls in) need not be loaded until a Scenic module is actually imported.
+"""
+
+import importlib.util
+import os
+import sys
+
+scenicExtensions = ('sc', 'scenic')
+
+class ScenicMetaFinder:
+	"""Meta path finder for Scenic modules.
+
+	This does not inherit from `importlib.abc.MetaPathFinder` since that module is
+	surprisingly expensive to import.
+	"""
+
+	def find_spec(self, name, paths, target=None):
+		if paths is None:
+			paths = sys.path
+			modname = name
+		else:
+			modname = name.rpartition('.')[2]
+		for path in paths:
+			for extension in scenicExtensions:
+				filename = modname + '.' + extension
+				filepath = os.path.join(path, filename)
+				if os.path.exists(filepath):
+					filepath = os.path.abspath(filepath)
+					from scenic.syntax import translator
+					cached = translator.worldModelCache.get(name)
+					if cached is not None and cached.canReplay(filepath):
+						loader = translator.CachedScenicLoader(filepath, filename, cached)
+					else:
+						loader = translator.ScenicLoader(filepath, filename)
+					spec = importlib.util.spec_from_file_location(name, filepath,
+						loader=loader)
+					return spec
+		return None
+
+def install():
+	"""Register the meta path finder, if it has not been already."""
+	if not any(isinstance(finder, ScenicMetaFinder) for finder in sys.meta_path):
+		sys.meta_path.insert(0, ScenicMetaFinder())
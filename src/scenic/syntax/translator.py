@@ -9,7 +9,7 @@ The top-level interface to Scenic is provided by two functions:
 These output a `Scenario` object, from which scenes can be generated.
 See the documentation for `Scenario` for details.
 
-When imported, this module hooks the Python import system so that Scenic
+The Python import system is hooked (see `scenic.syntax.importer`) so that Scenic
 modules can be imported using the ``import`` statement. This is primarily for the
 translator's own use, but you could import Scenic modules from Python to
 inspect them. Because Scenic uses Python's import system, the latter's rules
@@ -32,6 +32,9 @@ import typing
 import importlib
 import importlib.abc
 import importlib.util
+import hashlib
+import marshal
+import pickle
 import itertools
 import pathlib
 from collections import namedtuple, defaultdict
@@ -61,6 +64,7 @@ from scenic.core.errors import (TokenParseError, PythonParseError, ASTParseError
 import scenic.core.dynamics as dynamics
 import scenic.core.pruning as pruning
 import scenic.syntax.veneer as veneer
+import scenic.syntax.importer as importer
 
 ### THE TOP LEVEL: compiling a Scenic program
 
@@ -87,7 +91,9 @@ def scenarioFromFile(path, params={}, model=None, scenario=None, cacheImports=Fa
 		  to import such modules will cause them to be recompiled. If it is
 		  safe to cache Scenic modules across multiple compilations, set this
 		  argument to True. Then importing a Scenic module will have the same
-		  behavior as importing a Python module.
+		  behavior as importing a Python module. Alternatively, setting the
+		  module-level option ``cacheWorldModels`` to True allows modules like
+		  world models to be reused safely (see `ModuleRecord`).
 
 	Returns:
 		A `Scenario` object representing the Scenic scenario.
@@ -160,20 +166,29 @@ def compileStream(stream, namespace, params={}, model=None, filename='<stream>')
 		6. Compile and execute the modified AST.
 		7. After executing all blocks, extract the global state (e.g. objects).
 		   This is done by the `storeScenarioStateIn` function.
+
+	When compiling a file, the code objects produced by steps 1-6 are cached on disk
+	(see `TranslationCache`), so that those steps can be skipped for unchanged
+	files. This can be disabled by setting ``cacheTranslations`` to False.
 	"""
 	if verbosity >= 2:
 		veneer.verbosePrint(f'  Compiling Scenic module from {filename}...')
 		startTime = time.time()
-	# Tokenize input stream
-	try:
-		tokens = list(tokenize.tokenize(stream.readline))
-	except tokenize.TokenError as e:
-		line = e.args[1][0] if isinstance(e.args[1], tuple) else e.args[1]
-		raise TokenParseError(line, filename, 'file ended during multiline string or expression')
+	source = stream.read()
+	# Look up previous translations of this module, if possible
+	useCache = (cacheTranslations
+	            and not (dumpTranslatedPython or dumpFinalAST or dumpASTPython))
+	cache = TranslationCache.forModule(filename, source) if useCache else None
 	# Partition into blocks with all imports at the end (since imports could
 	# pull in new constructor (Scenic class) definitions, which change the way
-	# subsequent tokens are transformed)
-	blocks = partitionByImports(tokens)
+	# subsequent tokens are transformed); if every block has been translated
+	# before, we can skip this step
+	if cache is not None and cache.blockCount is not None:
+		blocks = None
+		blockCount = cache.blockCount
+	else:
+		blocks = tokenizeAndPartition(source, filename)
+		blockCount = len(blocks)
 	veneer.activate(params, model, filename, namespace)
 	newSourceBlocks = []
 	try:
@@ -181,51 +196,184 @@ def compileStream(stream, namespace, params={}, model=None, filename='<stream>')
 		exec(compile(preamble, '<veneer>', 'exec'), namespace)
 		namespace[namespaceReference] = namespace
 		# Execute each block
-		for blockNum, block in enumerate(blocks):
+		for blockNum in range(blockCount):
 			# Find all custom constructors defined so far (possibly imported)
 			constructors = findConstructorsIn(namespace)
-			# Translate tokens to valid Python syntax
-			startLine = max(1, block[0][2][0])
-			translator = TokenTranslator(constructors, filename)
-			newSource, allConstructors = translator.translate(block)
-			trimmed = newSource[2*(startLine-1):]	# fix up blank lines used to align errors
-			newSource = '\n'*(startLine-1) + trimmed
+			cached = None if cache is None else cache.lookup(blockNum, constructors)
+			if cached is not None:
+				code, requirements, trimmed = cached
+			else:
+				if blocks is None:
+					blocks = tokenizeAndPartition(source, filename)
+				code, requirements, trimmed = translateBlock(blocks[blockNum], blockNum,
+				                                             constructors, filename)
+				if cache is not None:
+					cache.store(blockNum, constructors, code, requirements, trimmed)
 			newSourceBlocks.append(trimmed)
-			if dumpTranslatedPython:
-				print(f'### Begin translated Python from block {blockNum} of {filename}')
-				print(newSource)
-				print('### End translated Python')
-			# Parse the translated source
-			tree = parseTranslatedSource(newSource, filename)
-			# Modify the parse tree to produce the correct semantics
-			newTree, requirements = translateParseTree(tree, allConstructors, filename)
-			if dumpFinalAST:
-				print(f'### Begin final AST from block {blockNum} of {filename}')
-				print(ast.dump(newTree, include_attributes=True))
-				print('### End final AST')
-			if dumpASTPython:
-				try:
-					import astor
-				except ModuleNotFoundError as e:
-					raise RuntimeError('dumping the Python equivalent of the AST'
-									   'requires the astor package')
-				print(f'### Begin Python equivalent of final AST from block {blockNum} of {filename}')
-				print(astor.to_source(newTree, add_line_information=True))
-				print('### End Python equivalent of final AST')
-			# Compile the modified tree
-			code = compileTranslatedTree(newTree, filename)
 			# Execute it
 			executeCodeIn(code, namespace)
 		# Extract scenario state from veneer and store it
 		storeScenarioStateIn(namespace, requirements)
 	finally:
 		veneer.deactivate()
+	if cache is not None:
+		cache.save(blockCount)
 	if verbosity >= 2:
 		totalTime = time.time() - startTime
 		veneer.verbosePrint(f'  Compiled Scenic module in {totalTime:.4g} seconds.')
 	allNewSource = ''.join(newSourceBlocks)
 	return code, allNewSource
 
+def tokenizeAndPartition(source, filename):
+	"""Tokenize Scenic source code and partition it into blocks (see `compileStream`)."""
+	try:
+		tokens = list(tokenize.tokenize(io.BytesIO(source).readline))
+	except tokenize.TokenError as e:
+		line = e.args[1][0] if isinstance(e.args[1], tuple) else e.args[1]
+		raise TokenParseError(line, filename, 'file ended during multiline string or expression')
+	return partitionByImports(tokens)
+
+def translateBlock(block, blockNum, constructors, filename):
+	"""Translate a block of tokens into a Python code object (see `compileStream`).
+
+	Returns:
+		A triple consisting of the code object, the syntax of the requirements in the
+		block (for use in pruning), and the translated Python source.
+	"""
+	# Translate tokens to valid Python syntax
+	startLine = max(1, block[0][2][0])
+	translator = TokenTranslator(constructors, filename)
+	newSource, allConstructors = translator.translate(block)
+	trimmed = newSource[2*(startLine-1):]	# fix up blank lines used to align errors
+	newSource = '\n'*(startLine-1) + trimmed
+	if dumpTranslatedPython:
+		print(f'### Begin translated Python from block {blockNum} of {filename}')
+		print(newSource)
+		print('### End translated Python')
+	# Parse the translated source
+	tree = parseTranslatedSource(newSource, filename)
+	# Modify the parse tree to produce the correct semantics
+	newTree, requirements = translateParseTree(tree, allConstructors, filename)
+	if dumpFinalAST:
+		print(f'### Begin final AST from block {blockNum} of {filename}')
+		print(ast.dump(newTree, include_attributes=True))
+		print('### End final AST')
+	if dumpASTPython:
+		try:
+			import astor
+		except ModuleNotFoundError as e:
+			raise RuntimeError('dumping the Python equivalent of the AST'
+							   'requires the astor package')
+		print(f'### Begin Python equivalent of final AST from block {blockNum} of {filename}')
+		print(astor.to_source(newTree, add_line_information=True))
+		print('### End Python equivalent of final AST')
+	# Compile the modified tree
+	code = compileTranslatedTree(newTree, filename)
+	return code, requirements, trimmed
+
+class TranslationCache:
+	"""Persistent cache of the translated code of a Scenic module.
+
+	Like the bytecode of Python modules, the translated code of a Scenic file
+	``dir/name.scenic`` is stored in a ``__pycache__`` directory, in a file
+	``dir/__pycache__/name.scenic.<tag>.pickle`` where ``<tag>`` identifies the
+	Python implementation. The cache is only valid for the exact same source code,
+	version of Scenic (and of this translator), and Python version; otherwise it is
+	ignored and overwritten.
+
+	Since the translation of a block of a module depends on the Scenic classes
+	defined in the blocks and modules imported before it, each block is cached
+	together with the classes that were defined when it was translated, and is
+	retranslated if they change (e.g. if an imported module is edited).
+	"""
+	#: Version of the format of cache files; increment when changing the format.
+	formatVersion = 1
+
+	def __init__(self, path, key, blocks=None):
+		self.path = path
+		self.key = key
+		self.blocks = {} if blocks is None else blocks
+		self.modified = False
+
+	@classmethod
+	def forModule(cls, filename, source):
+		"""Get the cache for a module, or :obj:`None` if the module cannot be cached."""
+		if not os.path.isabs(filename) or not os.path.isfile(filename):
+			return None		# e.g. '<string>'
+		directory, name = os.path.split(filename)
+		cacheName = f'{name}.{sys.implementation.cache_tag}.pickle'
+		path = os.path.join(directory, '__pycache__', cacheName)
+		key = (cls.formatVersion, translatorFingerprint(), filename,
+		       hashlib.sha256(source).hexdigest())
+		blocks = None
+		try:
+			with open(path, 'rb') as cacheFile:
+				storedKey, storedBlocks = pickle.load(cacheFile)
+			if storedKey == key:
+				blocks = storedBlocks
+		except Exception:	# cache missing, corrupt, or unreadable
+			pass
+		return cls(path, key, blocks)
+
+	@property
+	def blockCount(self):
+		"""Number of blocks in the module, or :obj:`None` if some block is not cached."""
+		if not self.blocks:
+			return None
+		count = len(self.blocks)
+		return count if all(i in self.blocks for i in range(count)) else None
+
+	@staticmethod
+	def constructorsKey(constructors):
+		return tuple((con.name, tuple(con.bases)) for con in constructors)
+
+	def lookup(self, blockNum, constructors):
+		"""Get the code, requirement syntax, and Python source of a block, if cached."""
+		entry = self.blocks.get(blockNum)
+		if entry is None or entry[0] != self.constructorsKey(constructors):
+			return None
+		_, code, requirements, source = entry
+		return marshal.loads(code), requirements, source
+
+	def store(self, blockNum, constructors, code, requirements, source):
+		entry = (self.constructorsKey(constructors), marshal.dumps(code), requirements,
+		         source)
+		self.blocks[blockNum] = entry
+		self.modified = True
+
+	def save(self, blockCount):
+		"""Write the cache to disk if it was modified (and we are allowed to)."""
+		if not self.modified or sys.dont_write_bytecode:
+			return
+		blocks = { i: entry for i, entry in self.blocks.items() if i < blockCount }
+		try:
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+			# write to a temporary file first, so concurrent readers never see a
+			# partially-written cache
+			tempPath = f'{self.path}.{os.getpid()}.tmp'
+			with open(tempPath, 'wb') as cacheFile:
+				pickle.dump((self.key, blocks), cacheFile)
+			os.replace(tempPath, self.path)
+		except Exception:	# e.g. read-only directory; just skip caching
+			pass
+		self.modified = False
+
+_translatorFingerprint = None
+
+def translatorFingerprint():
+	"""Identify the version of Scenic and the translator, for validating caches."""
+	global _translatorFingerprint
+	if _translatorFingerprint is None:
+		import importlib.metadata  # slow import not often needed
+		try:
+			version = importlib.metadata.version('scenic')
+		except importlib.metadata.PackageNotFoundError:
+			version = None
+		with open(__file__, 'rb') as translatorFile:
+			digest = hashlib.sha256(translatorFile.read()).hexdigest()
+		_translatorFingerprint = (version, digest, importlib.util.MAGIC_NUMBER)
+	return _translatorFingerprint
+
 ### TRANSLATION PHASE ZERO: definitions of language elements not already in Python
 
 ## Options
@@ -235,6 +383,7 @@ dumpFinalAST = False
 dumpASTPython = False
 verbosity = 0
 usePruning = True
+cacheTranslations = True	# whether to cache translated code on disk; see TranslationCache
 
 ## Preamble
 # (included at the beginning of every module to be translated;
@@ -589,25 +738,7 @@ keywords = (
 
 ## Meta path finder and loader for Scenic files
 
-scenicExtensions = ('sc', 'scenic')
-
-class ScenicMetaFinder(importlib.abc.MetaPathFinder):
-	def find_spec(self, name, paths, target=None):
-		if paths is None:
-			paths = sys.path
-			modname = name
-		else:
-			modname = name.rpartition('.')[2]
-		for path in paths:
-			for extension in scenicExtensions:
-				filename = modname + '.' + extension
-				filepath = os.path.join(path, filename)
-				if os.path.exists(filepath):
-					filepath = os.path.abspath(filepath)
-					spec = importlib.util.spec_from_file_location(name, filepath,
-						loader=ScenicLoader(filepath, filename))
-					return spec
-		return None
+from scenic.syntax.importer import ScenicMetaFinder, scenicExtensions
 
 class ScenicLoader(importlib.abc.InspectLoader):
 	def __init__(self, filepath, filename):
@@ -618,17 +749,31 @@ class ScenicLoader(importlib.abc.InspectLoader):
 		return None
 
 	def exec_module(self, module):
-		# Read source file and compile it
+		# Read source file and compile it, recording its effects if it may be reused
 		with open(self.filepath, 'r') as stream:
 			source = stream.read()
-		with open(self.filepath, 'rb') as stream:
-			code, pythonSource = compileStream(stream, module.__dict__, filename=self.filepath)
+		recording = cacheWorldModels and veneer.isActive()
+		if recording:
+			record = ModuleRecord(self.filepath)
+			module.__dict__['__builtins__'] = recordingBuiltins(record)
+			try:
+				with recordingModule(record):
+					with open(self.filepath, 'rb') as stream:
+						code, pythonSource = compileStream(stream, module.__dict__,
+						                                   filename=self.filepath)
+			finally:
+				module.__dict__['__builtins__'] = builtins.__dict__
+		else:
+			with open(self.filepath, 'rb') as stream:
+				code, pythonSource = compileStream(stream, module.__dict__, filename=self.filepath)
 		# Mark as a Scenic module
 		module._isScenicModule = True
 		# Save code, source, and translated source for later inspection
 		module._code = code
 		module._source = source
 		module._pythonSource = pythonSource
+		if recording and record.isReusable(module):
+			worldModelCache[module.__name__] = CachedModule(module, record)
 
 		# If we're in the process of compiling another Scenic module, inherit
 		# objects, parameters, etc. from this one
@@ -648,8 +793,226 @@ class ScenicLoader(importlib.abc.InspectLoader):
 		assert module._isScenicModule, module
 		return module._pythonSource
 
-# register the meta path finder
-sys.meta_path.insert(0, ScenicMetaFinder())
+## Reuse of Scenic modules across compilations
+
+# Scenic modules are normally recompiled every time a scenario imports them (see
+# the cacheImports argument of scenarioFromFile), since executing a module can
+# have side effects on the scenario being compiled: defining global parameters,
+# objects, requirements, and so forth. However, world models typically only
+# define classes, functions, and parameters (and load data like road networks,
+# which can be slow). Such modules can be reused if we record their side effects
+# and replay them when the module is imported again. We do this for every
+# imported module which does not create objects, requirements, etc. (see
+# ModuleRecord.isReusable), as long as its source has not changed and the global
+# parameters it reads would have the same values.
+
+cacheWorldModels = False	# whether to reuse modules as described above
+worldModelCache = {}		# maps module names to CachedModule objects
+
+def clearWorldModelCache():
+	"""Forget all Scenic modules saved for reuse across compilations."""
+	worldModelCache.clear()
+
+_missing = object()		# marker for parameters which were not defined when read
+
+class ModuleRecord:
+	"""Record of the side effects of executing a Scenic module.
+
+	The record consists of a list of events, in the order they happened:
+
+		* ``('param', name, value, quoted)``: the module defined a global parameter;
+		* ``('read', name, value)``: the module read a global parameter, getting the
+		  given value (or ``_missing`` if it was not defined);
+		* ``('import', name)``: the module imported another Scenic module;
+		* ``('model', requestedName, actualName)``: the module imported a world model
+		  using the model statement;
+		* ``('simulator', factory)``: the module specified a simulator.
+
+	Side effects of imported modules are recorded in their own records.
+	"""
+	def __init__(self, filepath):
+		self.filepath = filepath
+		self.signature = fileSignature(filepath)
+		self.events = []
+		self.readsAllParameters = False
+
+	def recordParameter(self, name, value, quoted):
+		self.events.append(('param', name, value, quoted))
+
+	def recordParameterRead(self, name, table):
+		self.events.append(('read', name, table.get(name, _missing)))
+
+	def recordImport(self, name):
+		self.events.append(('import', name))
+
+	def recordModel(self, requestedName, actualName):
+		self.events.append(('model', requestedName, actualName))
+
+	def recordSimulator(self, factory):
+		self.events.append(('simulator', factory))
+
+	def isReusable(self, module):
+		"""Whether the module's side effects are all captured by this record."""
+		if self.readsAllParameters or module._scenarios:
+			return False
+		scenario = module._scenario
+		return not (scenario._objects or scenario._externalParameters
+		            or scenario._pendingRequirements or scenario._requirements
+		            or scenario._alwaysRequirements or scenario._terminationConditions
+		            or scenario._terminateSimulationConditions or scenario._monitors)
+
+	def wouldReplay(self, parameters, loadingModel, imported):
+		"""Whether executing the module again would have the same side effects.
+
+		Args:
+			parameters (dict): Global parameters defined before the module would be
+			  executed; this dict is updated with the parameters defined by the
+			  module (and any modules it imports).
+			loadingModel (bool): Whether the module would be imported as a world model.
+			imported (set): Names of Scenic modules which have already been imported;
+			  this set is updated with any modules imported by the module.
+		"""
+		for event in self.events:
+			kind = event[0]
+			if kind == 'param':
+				_, name, value, quoted = event
+				if name in veneer.lockedParameters:
+					continue
+				if quoted or not loadingModel or name not in parameters:
+					parameters[name] = value
+			elif kind == 'read':
+				_, name, value = event
+				if not sameParameterValue(parameters.get(name, _missing), value):
+					return False
+			elif kind in ('import', 'model'):
+				if kind == 'import':
+					name = event[1]
+					loadingSubmodel = loadingModel
+				else:
+					_, requestedName, name = event
+					if (veneer.lockedModel or requestedName) != name:
+						return False
+					loadingSubmodel = True
+				if name in imported:
+					continue
+				imported.add(name)
+				cached = worldModelCache.get(name)
+				if cached is None or not cached.record.isCurrent():
+					return False	# module would be recompiled, with unknown effects
+				if not cached.record.wouldReplay(parameters, loadingSubmodel, imported):
+					return False
+		return True
+
+	def replay(self):
+		"""Reproduce the side effects of executing the module."""
+		for event in self.events:
+			kind = event[0]
+			if kind == 'param':
+				_, name, value, quoted = event
+				if quoted:
+					veneer.param(name, value)
+				else:
+					veneer.param(**{ name: value })
+			elif kind == 'import':
+				importlib.import_module(event[1])
+			elif kind == 'model':
+				veneer.importModel(event[1])
+			elif kind == 'simulator':
+				veneer.simulator(event[1])
+
+	def isCurrent(self):
+		"""Whether the source file of the module is unchanged."""
+		return fileSignature(self.filepath) == self.signature
+
+class CachedModule(typing.NamedTuple):
+	module: types.ModuleType
+	record: ModuleRecord
+
+	def canReplay(self, filepath):
+		"""Whether the module can be reused when importing it from the given file."""
+		if not (cacheWorldModels and veneer.isActive()):
+			return False
+		record = self.record
+		if filepath != record.filepath or not record.isCurrent():
+			return False
+		imported = { name for name, module in sys.modules.items()
+		             if getattr(module, '_isScenicModule', False) }
+		imported.add(self.module.__name__)
+		parameters = dict(veneer._globalParameters)
+		return record.wouldReplay(parameters, veneer.loadingModel, imported)
+
+class CachedScenicLoader(ScenicLoader):
+	"""Loader reusing a Scenic module compiled previously; see `ModuleRecord`."""
+	def __init__(self, filepath, filename, cached):
+		super().__init__(filepath, filename)
+		self.cached = cached
+
+	def create_module(self, spec):
+		return self.cached.module
+
+	def exec_module(self, module):
+		# don't let the replayed side effects be recorded by modules importing this one
+		with recordingModule(ModuleRecord(self.filepath)):
+			self.cached.record.replay()
+		veneer.currentScenario._inherit(module._scenario)
+
+def fileSignature(path):
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return (stat.st_mtime_ns, stat.st_size)
+
+def sameParameterValue(a, b):
+	"""Whether two values of a global parameter are interchangeable."""
+	if a is b:
+		return True
+	if type(a) is not type(b) or type(a) not in (str, int, float, bool, tuple, list, dict):
+		return False
+	try:
+		return bool(a == b)
+	except Exception:	# e.g. comparing containers of Distributions
+		return False
+
+@contextmanager
+def recordingModule(record):
+	"""Context manager recording the side effects of a module into the given record.
+
+	Imports are recorded separately, using `recordingBuiltins`.
+	"""
+	veneer.moduleRecorders.append(record)
+	try:
+		yield
+	finally:
+		veneer.moduleRecorders.pop()
+
+def recordingBuiltins(record):
+	"""Builtins for a module being recorded, noting which Scenic modules it imports.
+
+	Import statements look up ``__import__`` in the builtins of the module executing
+	them, so installing these as the ``__builtins__`` of the module lets us see its
+	imports without affecting any other code (e.g. in other threads). Imports done
+	after the module has finished executing, e.g. inside its functions, are not
+	recorded.
+	"""
+	def recordingImport(name, globals=None, locals=None, fromlist=(), level=0):
+		module = builtins.__import__(name, globals, locals, fromlist, level)
+		if record in veneer.moduleRecorders:
+			if level > 0:
+				name = importlib.util.resolve_name('.'*level + name,
+				                                   globals.get('__package__'))
+			names = [name]
+			names.extend(f'{name}.{item}' for item in (fromlist or ()) if item != '*')
+			for name in names:
+				if getattr(sys.modules.get(name), '_isScenicModule', False):
+					record.recordImport(name)
+		return module
+	namespace = dict(builtins.__dict__)
+	namespace['__import__'] = recordingImport
+	return namespace
+
+# register the meta path finder (normally already done by scenic/__init__.py)
+importer.install()
 
 ## Miscellaneous utilities
 
@@ -108,6 +108,7 @@ runningScenarios = set()
 currentBehavior = None
 simulatorFactory = None
 evaluatingGuard = False
+moduleRecorders = []	# records of Scenic modules being executed (see translator.ModuleRecord)
 
 ## APIs used internally by the rest of Scenic
 
@@ -433,14 +434,29 @@ def simulation():
 def simulator(sim):
 	global simulatorFactory
 	simulatorFactory = sim
+	if moduleRecorders:
+		moduleRecorders[-1].recordSimulator(sim)
 
 def in_initial_scenario():
 	return inInitialScenario
 
 def model(namespace, modelName):
-	global loadingModel
 	if loadingModel:
 		raise RuntimeParseError(f'Scenic world model itself uses the "model" statement')
+	module = importModel(modelName)
+	names = module.__dict__.get('__all__', None)
+	if names is not None:
+		for name in names:
+			namespace[name] = getattr(module, name)
+	else:
+		for name, value in module.__dict__.items():
+			if not name.startswith('_'):
+				namespace[name] = value
+
+def importModel(modelName):
+	"""Import a world model as done by the model statement, without importing its names."""
+	global loadingModel
+	requestedName = modelName
 	if lockedModel is not None:
 		modelName = lockedModel
 	try:
@@ -453,14 +469,9 @@ def model(namespace, modelName):
 			raise
 	finally:
 		loadingModel = False
-	names = module.__dict__.get('__all__', None)
-	if names is not None:
-		for name in names:
-			namespace[name] = getattr(module, name)
-	else:
-		for name, value in module.__dict__.items():
-			if not name.startswith('_'):
-				namespace[name] = value
+	if moduleRecorders:
+		moduleRecorders[-1].recordModel(requestedName, modelName)
+	return module
 
 @distributionFunction
 def filter(function, iterable):
@@ -474,25 +485,37 @@ def param(*quotedParams, **params):
 	elif currentSimulation is not None:
 		raise RuntimeParseError('tried to create a global parameter during a simulation')
 	for name, value in params.items():
+		value = toDistribution(value)
 		if name not in lockedParameters and (not loadingModel or name not in _globalParameters):
-			_globalParameters[name] = toDistribution(value)
+			_globalParameters[name] = value
+		if moduleRecorders:
+			moduleRecorders[-1].recordParameter(name, value, quoted=False)
 	assert len(quotedParams) % 2 == 0, quotedParams
 	it = iter(quotedParams)
 	for name, value in zip(it, it):
+		value = toDistribution(value)
 		if name not in lockedParameters:
-			_globalParameters[name] = toDistribution(value)
+			_globalParameters[name] = value
+		if moduleRecorders:
+			moduleRecorders[-1].recordParameter(name, value, quoted=True)
 
 class ParameterTableProxy(collections.abc.Mapping):
 	def __init__(self, map):
 		self._internal_map = map
 
 	def __getitem__(self, name):
+		if moduleRecorders and self._internal_map is _globalParameters:
+			moduleRecorders[-1].recordParameterRead(name, self._internal_map)
 		return self._internal_map[name]
 
 	def __iter__(self):
+		if moduleRecorders and self._internal_map is _globalParameters:
+			moduleRecorders[-1].readsAllParameters = True
 		return iter(self._internal_map)
 
 	def __len__(self):
+		if moduleRecorders and self._internal_map is _globalParameters:
+			moduleRecorders[-1].readsAllParameters = True
 		return len(self._internal_map)
 
 	def __getattr__(self, name):
@@ -1,10 +1,12 @@
 
 import warnings
 
+import numpy
 import scipy.stats
 import numpy.linalg
 
-from scenic.core.distributions import Range, Normal, TruncatedNormal, DiscreteRange, Options
+from scenic.core.distributions import (Range, Normal, TruncatedNormal, DiscreteRange, Options,
+                                       Samplable)
 
 def similarDistributions(d1, d2, samples=3000, p=0.002):
     s1 = [d1.sample() for i in range(samples)]
@@ -16,6 +18,18 @@ def similarDistributions(d1, d2, samples=3000, p=0.002):
         except numpy.linalg.LinAlgError:
             assert scipy.stats.ks_2samp(s1, s2).pvalue > p, p
 
+def similarBatchDistribution(d, samples=3000, p=0.002):
+    rng = numpy.random.default_rng(12345)
+    batch = Samplable.batchSampleAll([d], samples, rng)
+    assert d in batch
+    s1 = batch[d].tolist()
+    s2 = [d.sample() for i in range(samples)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            assert scipy.stats.epps_singleton_2samp(s1, s2).pvalue > p, p
+        except numpy.linalg.LinAlgError:
+            assert scipy.stats.ks_2samp(s1, s2).pvalue > p, p
 
 def test_bucketed_range():
     r = Range(-3, 7)
@@ -41,3 +55,31 @@ def test_bucketed_discrete_range():
 def test_bucketed_options():
     o = Options({0: 1, 1: 3})
     similarDistributions(o, o.bucket())
+
+def test_batch_primitives():
+    similarBatchDistribution(Range(-3, 7))
+    similarBatchDistribution(Normal(22, 5))
+    similarBatchDistribution(TruncatedNormal(-10, 3, -1, 5))
+    similarBatchDistribution(DiscreteRange(-3, 7, weights=range(1, 12)))
+    similarBatchDistribution(Options({0: 1, 1: 3}))
+
+def test_batch_operators():
+    x = Range(0, 1)
+    similarBatchDistribution(2 * x + Normal(0, 1))
+    similarBatchDistribution(Options([Range(0, 1), Range(5, 6)]) - x)
+
+def test_batch_dependencies():
+    x = Range(0, 1)
+    y = x + Range(10, 11)
+    batch = Samplable.batchSampleAll([y], 100, numpy.random.default_rng(0))
+    assert x in batch
+    assert numpy.all(batch[y] - batch[x] >= 10)
+    assert numpy.all(batch[y] - batch[x] <= 11)
+
+def test_batch_unsupported():
+    x = Range(0, 1)
+    opts = Options(['a', 'b'])
+    batch = Samplable.batchSampleAll([opts, x], 10, numpy.random.default_rng(0))
+    assert x in batch
+    assert opts not in batch
+    assert opts.index in batch
@@ -52,3 +52,37 @@ def test_triangulation_holes():
         ]
     )
     checkTriangulation(p)
+
+@pytest.mark.parametrize('resolution,margin', ((1, 0), (0.37, 0.05), (3, 0.5)))
+def test_raster_index(resolution, margin):
+    polygons = [
+        shapely.geometry.box(0, 0, 10, 4),
+        shapely.geometry.Point(8, 5).buffer(3).difference(shapely.geometry.Point(8, 5).buffer(1)),
+        shapely.geometry.Polygon(),
+        shapely.geometry.MultiPolygon([shapely.geometry.box(-6, -6, -2, -2),
+                                       shapely.geometry.box(12, 0, 15, 12)]),
+        shapely.geometry.Polygon([(0, 0), (20, 20), (0, 20)]),
+    ]
+    raster = geometry.RasterIndex(polygons, resolution, margin)
+    xs = [-8 + (0.173 * i) for i in range(180)]
+    points = [(x, y) for x in xs for y in xs[::3]]
+    points.extend((x, y) for x in range(-8, 22) for y in range(-8, 22))   # cell corners
+    indices = raster.indicesAt(points)
+    assert 0 < (indices == geometry.RasterIndex.UNKNOWN).mean() < 0.6
+    for point, index in zip(points, indices):
+        assert raster.indexAt(point) == index
+        if index == geometry.RasterIndex.UNKNOWN:
+            continue
+        shape = shapely.geometry.Point(point)
+        containing = [i for i, poly in enumerate(polygons) if poly.intersects(shape)]
+        if index == geometry.RasterIndex.EMPTY:
+            assert not containing
+            assert all(poly.distance(shape) > margin for poly in polygons if not poly.is_empty)
+        else:
+            assert containing[0] == index
+
+def test_raster_index_empty():
+    raster = geometry.RasterIndex([shapely.geometry.Polygon()], 1)
+    assert raster.indexAt((0, 0)) == geometry.RasterIndex.EMPTY
+    with pytest.raises(ValueError):
+        geometry.RasterIndex([shapely.geometry.box(0, 0, 1, 1)], 0)
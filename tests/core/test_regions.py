@@ -1,7 +1,15 @@
 
+import math
+import pickle
+
+import numpy
+import pytest
 import shapely.geometry
 
 from scenic.core.regions import *
+import scenic.core.geometry as geometry
+from scenic.core.vectors import Vector, VectorField, OrientedVector
+from scenic.core.distributions import RejectionException
 
 def test_polygon_sampling():
     p = shapely.geometry.Polygon(
@@ -18,3 +26,279 @@ def test_polygon_sampling():
     assert sum(1 <= y <= 2 for y in ys) <= 870
     assert sum(x >= 1.5 for x in xs) >= 1250
     assert sum(y >= 1.5 for y in ys) >= 1250
+
+def test_polygon_sampling_batch():
+    p = shapely.geometry.Polygon(
+        [(0,0), (0,3), (3,3), (3,0)],
+        holes=[[(1,1), (1,2), (2,2), (2,1)]]
+    )
+    r = PolygonalRegion(polygon=p)
+    pts = r.uniformPoints(3000, rng=numpy.random.default_rng(0))
+    assert pts.shape == (3000, 2)
+    xs, ys = pts[:, 0], pts[:, 1]
+    assert numpy.all((0 <= xs) & (xs <= 3) & (0 <= ys) & (ys <= 3))
+    assert not numpy.any((1 < xs) & (xs < 2) & (1 < ys) & (ys < 2))
+    assert numpy.sum((1 <= xs) & (xs <= 2)) <= 870
+    assert numpy.sum((1 <= ys) & (ys <= 2)) <= 870
+    assert numpy.sum(xs >= 1.5) >= 1250
+    assert numpy.sum(ys >= 1.5) >= 1250
+
+def test_polygon_sampling_triangle():
+    # points should be uniform over the triangle, not its bounding box
+    r = PolygonalRegion([(0,0), (4,0), (0,4)])
+    pts = r.uniformPoints(4000, rng=numpy.random.default_rng(1))
+    assert numpy.all(pts.sum(axis=1) <= 4)
+    assert abs(numpy.mean(pts[:, 0]) - 4/3) < 0.1
+    for i in range(100):
+        x, y = r.uniformPointInner()
+        assert x >= 0 and y >= 0 and x + y <= 4
+
+def checkContainsPoints(region, low=-6, high=6, n=2000):
+    pts = numpy.random.default_rng(0).uniform(low, high, size=(n, 2))
+    mask = region.containsPoints(pts)
+    assert mask.shape == (n,) and mask.dtype == bool
+    expected = [region.containsPoint(Vector(x, y)) for x, y in pts]
+    assert list(mask) == expected
+    return mask
+
+def test_contains_points_shapes():
+    circle = CircularRegion(Vector(1, 2), 3)
+    rect = RectangularRegion(Vector(1, -1), 0.6, 3, 5)
+    assert 0 < checkContainsPoints(circle).sum() < 2000
+    assert 0 < checkContainsPoints(rect).sum() < 2000
+    assert 0 < checkContainsPoints(SectorRegion(Vector(1, 2), 4, 0.7, 1.4)).sum() < 2000
+    assert 0 < checkContainsPoints(SectorRegion(Vector(0, 0), 4, -2.5, 5)).sum() < 2000
+    assert 0 < checkContainsPoints(IntersectionRegion(circle, rect)).sum() < 2000
+    assert 0 < checkContainsPoints(DifferenceRegion(circle, rect)).sum() < 2000
+    assert checkContainsPoints(everywhere).all()
+    assert not checkContainsPoints(nowhere).any()
+
+def test_contains_points_polygon():
+    p = shapely.geometry.Polygon(
+        [(0,0), (0,3), (3,3), (3,0)],
+        holes=[[(1,1), (1,2), (2,2), (2,1)]]
+    )
+    r = PolygonalRegion(polygon=p)
+    checkContainsPoints(r, low=-1, high=4)
+    assert list(r.containsPoints([(0, 0), (1.5, 1.5), (1, 1.5), (5, 5)])) == [
+        True, False, True, False
+    ]
+
+def test_polygon_raster():
+    p = shapely.geometry.Polygon(
+        [(0,0), (0,30), (30,30), (30,0)],
+        holes=[[(10,10), (10,20), (20,15)]]
+    )
+    r = PolygonalRegion(polygon=p)
+    points = numpy.random.default_rng(0).uniform(-5, 35, (2000, 2))
+    points = numpy.concatenate((points, [(0, 0), (0, 12), (10, 10), (15, 15), (40, 0)]))
+    expected = [r.containsPoint(point) for point in points]
+    r.rasterize(0.7)
+    assert r.raster.cells.size > 0
+    assert [r.containsPoint(point) for point in points] == expected
+    assert list(r.containsPoints(points)) == expected
+    assert pickle.loads(pickle.dumps(r)).raster is None
+
+def test_contains_points_discrete():
+    grid = GridRegion('grid', [[0, 1, 0], [1, 0, 0]], 1.5, 2, -2, -1)
+    checkContainsPoints(grid, low=-3, high=3)
+    points = PointSetRegion('points', [(0, 0), (1, 2), (-3, 4)])
+    assert list(points.containsPoints([(0, 0), (1, 2.1), (-3, 4)])) == [True, False, True]
+    assert points.containsPoints([]).shape == (0,)
+
+def test_grid_region():
+    rng = numpy.random.default_rng(0)
+    grid = (rng.random((40, 50)) < 0.01).astype(int)
+    grid[10:15, 20:30] = 1
+    r = GridRegion('grid', grid, 0.5, 0.7, -10, 5)
+    assert not hasattr(r, '_cached_kdTree')     # index is built lazily
+    free = set(r.points)
+    assert len(free) == (grid == 0).sum()
+    for i in range(100):
+        assert tuple(r.uniformPointInner()) in free
+    assert r.distanceTo(Vector(*r.points[7])) == 0
+    assert r.distanceTo(Vector(-20, 5)) == pytest.approx(10)
+    def slowContainsObject(obj):
+        if not all(r.containsPoint(corner) for corner in obj.corners):
+            return False
+        cells = [r.pointToGrid(corner) for corner in obj.corners]
+        xs, ys = zip(*cells)
+        for x in range(min(xs), max(xs) + 1):
+            for y in range(min(ys), max(ys) + 1):
+                if grid[y, x] == 1 and obj.containsPoint(Vector(*r.gridToPoint((x, y)))):
+                    return False
+        return True
+    results = []
+    for i in range(300):
+        center = Vector(*rng.uniform((-10, 5), (15, 33)))
+        obj = RectangularRegion(center, rng.uniform(-3, 3), *rng.uniform(0.2, 6, 2))
+        results.append(r.containsObject(obj))
+        assert results[-1] == slowContainsObject(obj)
+    assert any(results) and not all(results)
+
+def test_rectangle_intersection():
+    # separating axis test should agree with Shapely
+    rng = numpy.random.default_rng(0)
+    for i in range(500):
+        a, b = (RectangularRegion(Vector(*rng.uniform(-5, 5, 2)), rng.uniform(-4, 4),
+                                  *rng.uniform(0.1, 5, 2))
+                for j in range(2))
+        assert a.intersects(b) == a.polygon.intersects(b.polygon)
+        point = Vector(*rng.uniform(-8, 8, 2))
+        assert a.distanceTo(point) == pytest.approx(
+            a.polygon.distance(shapely.geometry.Point(point)))
+    # touching rectangles intersect
+    a = RectangularRegion(Vector(0, 0), 0, 2, 2)
+    assert a.intersects(RectangularRegion(Vector(2, 0), 0, 2, 2))
+    assert not a.intersects(RectangularRegion(Vector(2.01, 0), 0, 2, 2))
+
+def test_circle_intersection():
+    circle = CircularRegion(Vector(0, 0), 2)
+    assert circle.intersects(CircularRegion(Vector(3, 4), 3))
+    assert not circle.intersects(CircularRegion(Vector(3, 4), 2.9))
+    assert circle.intersects(RectangularRegion(Vector(3, 0), 0, 2, 2))
+    # nearest corner of the rectangle is at distance 1.5 * sqrt(2) from the origin
+    rect = RectangularRegion(Vector(2.5, 2.5), 0, 2, 2)
+    assert not circle.intersects(rect)
+    assert CircularRegion(Vector(0, 0), 2.2).intersects(rect)
+
+def test_sector_distance():
+    sector = SectorRegion(Vector(0, 0), 2, 0, math.pi / 2)     # facing +Y
+    assert sector.distanceTo(Vector(0, 1)) == 0
+    assert sector.distanceTo(Vector(0, 5)) == pytest.approx(3)
+    assert sector.distanceTo(Vector(0, -3)) == pytest.approx(3)
+    edge = Vector(-math.sqrt(2), math.sqrt(2))
+    assert sector.distanceTo(Vector(-3, 0)) == pytest.approx(
+        geometry.distanceToSegment((-3, 0), (0, 0), edge))
+    assert sector.intersects(CircularRegion(Vector(0, -3), 3))
+    assert not sector.intersects(CircularRegion(Vector(0, -3), 2.9))
+
+def test_sector_polygon():
+    for angle in (0.5, math.pi / 2, 3, 5, 6):
+        sector = SectorRegion(Vector(1, 2), 3, 0.4, angle, resolution=64)
+        assert sector.polygon.is_valid
+        assert sector.polygon.area == pytest.approx(9 * angle / 2, rel=1e-2)
+        for i in range(50):
+            pt = sector.uniformPointInner()
+            assert sector.polygon.distance(shapely.geometry.Point(pt)) < 1e-2
+
+def sampleDerived(region, n=1000):
+    pts = []
+    for i in range(n):
+        try:
+            pts.append(region.uniformPointInner())
+        except RejectionException:
+            pass
+    return pts
+
+def test_intersection_sampling():
+    sector = SectorRegion(Vector(0, 0), 50, 0.3, 0.4)
+    circle = CircularRegion(Vector(-15, 40), 3, resolution=4)
+    region = IntersectionRegion(sector, circle)
+    pts = sampleDerived(region)
+    assert all(sector.containsPoint(pt) and circle.containsPoint(pt) for pt in pts)
+    assert region.samplerStatistics.proposals == 1000
+    assert region.samplerStatistics.acceptanceRate > 0.75
+    # the proposal region must cover the whole intersection
+    proposal, box = region._proposal
+    rng = numpy.random.default_rng(0)
+    inside = [pt for pt in rng.uniform((-18, 37), (-12, 43), (5000, 2))
+              if region.containsPoint(Vector(*pt))]
+    assert inside
+    assert proposal.containsPoints(inside).all()
+    # samples with the same operands share the proposal and statistics
+    copy = region._copyWith([sector, circle], None)
+    assert copy._proposal is region._proposal
+    assert copy.samplerStatistics is region.samplerStatistics
+
+def test_intersection_sampling_fallback():
+    rect = RectangularRegion(Vector(0, 0), 0, 100, 100)
+    circle = CircularRegion(Vector(40, 40), 2)
+    region = IntersectionRegion(rect, IntersectionRegion(circle, everywhere))
+    proposal, box = region._proposal
+    assert box == (38, 38, 42, 42)
+    assert proposal.polygons.area == pytest.approx(16)
+    pts = sampleDerived(region)
+    assert all(circle.containsPoint(pt) for pt in pts)
+    assert region.samplerStatistics.acceptanceRate > 0.5
+    region = IntersectionRegion(circle, RectangularRegion(Vector(50, 50), 0, 1, 1))
+    with pytest.raises(RejectionException):
+        region.uniformPointInner()
+
+def test_difference_sampling():
+    circle = CircularRegion(Vector(0, 0), 10)
+    rect = RectangularRegion(Vector(0, 0), 0.2, 19.5, 19.5)
+    region = DifferenceRegion(circle, rect)
+    pts = sampleDerived(region)
+    assert all(region.containsPoint(pt) for pt in pts)
+    assert region.samplerStatistics.acceptanceRate > 0.9
+    assert 'accepted' in str(region.samplerStatistics)
+    with pytest.raises(RejectionException):
+        DifferenceRegion(RectangularRegion(Vector(1, 1), 0, 5, 5), circle).uniformPointInner()
+    assert DifferenceRegion(circle, rect).getAABB() == circle.getAABB()
+
+def test_derived_sampling_orientation():
+    # points are oriented by the first region, as without a proposal region
+    circle = CircularRegion(Vector(0, 0), 10)
+    circle.orientation = VectorField('One', lambda pos: 1)
+    rect = RectangularRegion(Vector(0, 0), 0.2, 19.5, 19.5)
+    rect.orientation = VectorField('Two', lambda pos: 2)
+    intersection = circle.intersect(rect)
+    assert intersection.orientation is None
+    first = intersection.regions[0]
+    for region, heading in ((intersection, 1 if first is circle else 2),
+                            (DifferenceRegion(circle, rect), 1)):
+        assert region._proposal is not None
+        pts = sampleDerived(region, n=100)
+        assert pts
+        for pt in pts:
+            assert isinstance(pt, OrientedVector)
+            assert pt.heading == heading
+
+def test_polyline_nearest_segment():
+    rng = numpy.random.default_rng(0)
+    pts = numpy.cumsum(rng.normal(size=(500, 2)), axis=0)
+    r = PolylineRegion([tuple(p) for p in pts])
+    queries = rng.uniform(pts.min(axis=0), pts.max(axis=0), size=(200, 2))
+    indices = r.nearestSegmentIndices(queries)
+    distances = r.distancesTo(queries)
+    signed = r.signedDistancesTo(queries)
+    projected = r.projectPoints(queries)
+    for query, index, distance, sd, proj in zip(queries, indices, distances, signed, projected):
+        point = shapely.geometry.Point(query)
+        assert distance == pytest.approx(r.lineString.distance(point))
+        assert abs(sd) == pytest.approx(distance)
+        assert shapely.geometry.Point(proj).distance(point) == pytest.approx(distance)
+        start, end = r.nearestSegmentTo(Vector(*query))
+        assert (tuple(start), tuple(end)) == tuple(map(tuple, r.segments[index]))
+        segment = shapely.geometry.LineString([start, end])
+        assert segment.distance(point) == pytest.approx(distance)
+        assert r.signedDistanceTo(Vector(*query)) == pytest.approx(sd)
+
+def test_polyline_nearest_segment_empty():
+    r = PolylineRegion([(0, 0), (1, 1)])
+    assert r.nearestSegmentIndices([]).shape == (0,)
+    assert r.distancesTo([]).shape == (0,)
+    assert r.signedDistancesTo([]).shape == (0,)
+    assert r.projectPoints([]).shape == (0, 2)
+
+def test_polyline_signed_distance():
+    r = PolylineRegion([(0, 0), (10, 0), (10, 10)])
+    assert r.signedDistanceTo(Vector(5, 2)) == pytest.approx(2)
+    assert r.signedDistanceTo(Vector(5, -3)) == pytest.approx(-3)
+    assert r.signedDistanceTo(Vector(12, 5)) == pytest.approx(-2)
+    assert r.nearestSegmentTo(Vector(12, 5)) == (Vector(10, 0), Vector(10, 10))
+    assert r.project(Vector(12, 5)).coords[0] == pytest.approx((10, 5))
+
+def test_polyline_point_along():
+    r = PolylineRegion(polyline=shapely.geometry.MultiLineString(
+        [[(0, 0), (1, 0), (1, 1)], [(5, 5), (5, 5), (6, 5)]]
+    ))
+    distances = [0, 0.5, 1, 1.5, 2, 2.5, 3, 4, -0.5, -4]
+    points = r.pointsAlongBy(distances)
+    for distance, point in zip(distances, points):
+        expected = r.lineString.interpolate(distance)
+        assert tuple(point) == pytest.approx((expected.x, expected.y))
+        assert tuple(r.pointAlongBy(distance)) == pytest.approx(tuple(point))
+    assert tuple(r.pointAlongBy(0.5, normalized=True)) == pytest.approx((1, 0.5))
+    assert r.equallySpacedPoints(1) == [Vector(0, 0), Vector(1, 0), Vector(1, 1)]
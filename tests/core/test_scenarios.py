@@ -0,0 +1,45 @@
+import numpy
+import pytest
+
+from scenic.core.regions import RectangularRegion, SectorRegion
+from scenic.core.scenarios import SceneGeometry
+from scenic.core.vectors import Vector
+from tests.utils import sampleSceneFrom
+
+def randomRectangles(n, size, seed=0):
+    rng = numpy.random.default_rng(seed)
+    return [RectangularRegion(Vector(*rng.uniform(-size, size, 2)), rng.uniform(-4, 4),
+                              rng.uniform(0.1, 3), rng.uniform(0.1, 6))
+            for i in range(n)]
+
+def test_scene_geometry():
+    scene = sampleSceneFrom("""
+        ego = Object at 1 @ 2, facing 30 deg, with width 2, with length 4
+        other = Object at 10 @ 10, with width 3
+    """)
+    geometry = scene.geometry
+    assert geometry is scene.geometry
+    assert len(geometry) == 2
+    assert geometry.positions.tolist() == [[1, 2], [10, 10]]
+    assert list(geometry.widths) == [2, 3]
+    for obj, corners in zip(scene.objects, geometry.corners):
+        assert corners == pytest.approx(numpy.array([tuple(c) for c in obj.corners]))
+    with pytest.raises(ValueError):
+        geometry.positions[0, 0] = 42
+
+@pytest.mark.parametrize('n,size', ((0, 1), (1, 1), (50, 5), (300, 20)))
+def test_scene_geometry_intersections(n, size):
+    rects = randomRectangles(n, size)
+    pairs = SceneGeometry(rects).intersectingPairs()
+    assert pairs.shape[1] == 2
+    expected = [(i, j) for i in range(n) for j in range(i+1, n)
+                if rects[i].polygon.intersects(rects[j].polygon)]
+    assert list(map(tuple, pairs.tolist())) == expected
+
+def test_scene_geometry_visibility():
+    rects = randomRectangles(200, 60)
+    sector = SectorRegion(Vector(0, 0), 50, 0.3, 1.2)
+    visible = SceneGeometry(rects).visibleIn(sector)
+    assert 0 < visible.sum() < 200
+    for rect, vis in zip(rects, visible):
+        assert vis == any(sector.containsPoint(corner) for corner in rect.corners)
@@ -1,7 +1,14 @@
+import math
 
+import numpy
+import pytest
+import shapely.geometry
+
+from scenic.core.regions import (AllRegion, CircularRegion, RectangularRegion,
+                                 PolygonalRegion, IntersectionRegion)
 from scenic.core.vectors import *
 from scenic.core.lazy_eval import DelayedArgument, valueInContext, needsLazyEvaluation
-from scenic.core.distributions import Options, underlyingFunction
+from scenic.core.distributions import Options, RejectionException, underlyingFunction
 
 def test_equality():
     v = Vector(1, 4)
@@ -29,3 +36,133 @@ def test_distribution_method_encapsulation_lazy():
     assert not needsLazyEvaluation(evpt)
     assert isinstance(evpt, VectorMethodDistribution)
     assert evpt.method is underlyingFunction(vf.followFrom)
+
+def test_polygonal_vector_field():
+    cells = [(shapely.geometry.box(i, j, i+1, j+1), 0.1 * ((3*i + j) % 5))
+             for i in range(20) for j in range(10)]
+    cells.append((shapely.geometry.box(0, 0, 30, 30), None))    # covers the gaps
+    vf = PolygonalVectorField('Foo', cells, headingFunction=lambda pos: -pos.x)
+    def slowValueAt(pos):
+        point = shapely.geometry.Point(pos)
+        for cell, heading in cells:
+            if cell.intersects(point):
+                return -pos[0] if heading is None else heading
+    rng = numpy.random.default_rng(0)
+    points = numpy.concatenate((rng.uniform(0, 30, (500, 2)),
+                                rng.integers(0, 21, (50, 2))))  # test cell boundaries
+    values = vf.valuesAt(points)
+    assert values.shape == (550,)
+    for point, value in zip(points, values):
+        expected = slowValueAt(point)
+        assert value == pytest.approx(expected)
+        assert vf[Vector(*point)] == pytest.approx(expected)
+    with pytest.raises(RejectionException):
+        vf[Vector(40, 40)]
+    with pytest.raises(RejectionException):
+        vf.valuesAt([(1, 1), (40, 40)])
+    assert vf.valuesAt([]).shape == (0,)
+
+def test_polygonal_vector_field_default():
+    cells = [(shapely.geometry.box(0, 0, 1, 1), 1), (shapely.geometry.Polygon(), 2)]
+    vf = PolygonalVectorField('Foo', cells, defaultHeading=3)
+    assert list(vf.valuesAt([(0.5, 0.5), (1, 1), (2, 2)])) == [1, 1, 3]
+    assert vf[Vector(2, 2)] == 3
+
+def test_piecewise_vector_field():
+    first = CircularRegion(Vector(0, 0), 5)
+    first.orientation = VectorField('First', lambda pos: 1)
+    second = RectangularRegion(Vector(3, 0), 0, 4, 4)
+    second.orientation = VectorField('Second', lambda pos: pos.x)
+    third = RectangularRegion(Vector(-3, 0), 0, 4, 4)     # no orientation; ignored
+    fourth = PolygonalRegion([(-8, -8), (-8, 8), (-2, 0)])
+    fourth.orientation = VectorField('Fourth', lambda pos: 3)
+    fallback = AllRegion('fallback')
+    fallback.orientation = VectorField('Fallback', lambda pos: 2)
+    vf = PiecewiseVectorField('Foo', [first, second, third, fourth, fallback])
+    rng = numpy.random.default_rng(0)
+    points = rng.uniform(-10, 10, (500, 2))
+    values = vf.valuesAt(points)
+    for point, value in zip(points, values):
+        point = Vector(*point)
+        if first.containsPoint(point):
+            expected = 1
+        elif second.containsPoint(point):
+            expected = point.x
+        elif fourth.containsPoint(point):
+            expected = 3
+        else:
+            expected = 2
+        assert value == expected
+        assert vf[point] == expected
+    partial = PiecewiseVectorField('Bar', [first, second])
+    with pytest.raises(RejectionException):
+        partial.valuesAt(points)
+    assert partial.valuesAt([(0, 0)]) == [1]
+    # empty regions have no bounding box, but are fine to include
+    empty = IntersectionRegion(CircularRegion(Vector(-5, 0), 1),
+                               CircularRegion(Vector(5, 0), 1))
+    empty.orientation = VectorField('Empty', lambda pos: 4)
+    withEmpty = PiecewiseVectorField('Baz', [empty, first])
+    assert withEmpty.valuesAt([(0, 0)]) == [1]
+    assert withEmpty[Vector(0, 0)] == 1
+
+def circularField(**kwargs):
+    # counterclockwise motion around the origin
+    return VectorField('Circle', lambda pos: math.atan2(pos.y, pos.x), **kwargs)
+
+def test_follow_euler():
+    vf = circularField()
+    pt = vf.followFrom(Vector(1, 0), math.pi / 2)
+    expected = Vector(1, 0)
+    for i in range(4):
+        expected = expected.offsetRadially(math.pi / 8, vf[expected])
+    assert pt == expected
+    assert vf.followFrom(Vector(1, 0), 1, steps=1) == Vector(1, 1)
+
+@pytest.mark.parametrize('tolerance', (1e-2, 1e-4, 1e-6))
+def test_follow_adaptive(tolerance):
+    vf = circularField()
+    pt = vf.followFrom(Vector(1, 0), math.pi / 2, tolerance=tolerance)
+    assert pt.distanceTo(Vector(0, 1)) < 10 * tolerance
+    pt = vf.followFrom(Vector(0, 1), -math.pi / 2, tolerance=tolerance)
+    assert pt.distanceTo(Vector(1, 0)) < 10 * tolerance
+    assert vf.followFrom(Vector(1, 0), 0, tolerance=tolerance) == Vector(1, 0)
+    # fields with a default tolerance use it unless fixed steps are requested
+    vf = circularField(tolerance=tolerance)
+    assert vf.followFrom(Vector(1, 0), 1) == circularField().followFrom(
+        Vector(1, 0), 1, tolerance=tolerance)
+    assert vf.followFrom(Vector(1, 0), 1, steps=1) == Vector(1, 1)
+
+@pytest.mark.parametrize('tolerance', (None, 1e-4))
+def test_follow_batched(tolerance):
+    vf = circularField()
+    rng = numpy.random.default_rng(0)
+    points = rng.uniform(-10, 10, (50, 2))
+    distances = rng.uniform(-20, 20, 50)
+    distances[0] = 0
+    results = vf.followFromPoints(points, distances, tolerance=tolerance)
+    assert results.shape == (50, 2)
+    for point, dist, result in zip(points, distances, results):
+        expected = vf.followFrom(Vector(*point), dist, tolerance=tolerance)
+        assert tuple(result) == pytest.approx(tuple(expected))
+    results = vf.followFromPoints(points, 3, steps=2)
+    for point, result in zip(points, results):
+        expected = vf.followFrom(Vector(*point), 3, steps=2)
+        assert tuple(result) == pytest.approx(tuple(expected))
+
+def test_follow_memoized():
+    cells = [(shapely.geometry.box(i, -50, i+1, 50), -0.1 * (i % 7))
+             for i in range(-50, 50)]
+    vf = PolygonalVectorField('Foo', cells, defaultHeading=0, tolerance=1e-3)
+    assert vf.piecewiseConstant
+    plain = PolygonalVectorField('Foo', cells, defaultHeading=0, tolerance=1e-3)
+    plain.piecewiseConstant = False
+    start = Vector(-20.5, 0)
+    for dist in (5, 20, 1, 20, 35, -10, 12.5):
+        assert vf.followFrom(start, dist) == plain.followFrom(start, dist)
+    assert len(vf._trajectories) == 2
+    assert not hasattr(plain, '_cached__trajectories')
+    assert '_cached__trajectories' not in vf.__getstate__()
+    partial = cells[:1] + [(shapely.geometry.box(0, 0, 1, 1), None)]
+    assert not PolygonalVectorField('Bar', partial,
+                                    headingFunction=lambda pos: pos.x).piecewiseConstant
@@ -1,13 +1,18 @@
 
 import os
 import glob
+import pickle
 import pytest
 import shutil
 import inspect
 
+import numpy
+
 from tests.utils import compileScenic, sampleScene, sampleEgo
 from scenic.core.geometry import TriangulationError
 from scenic.core.distributions import RejectionException
+from scenic.core.vectors import Vector
+from scenic.domains.driving.roads import Network, NetworkRaster, LinearElement
 
 template = inspect.cleandoc("""
     param map = '{map}'
@@ -119,3 +124,126 @@ def test_caching(cached_maps):
         """, useCache=cache,
         path='tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr')
         sampleScene(scenario, maxIterations=1000)
+
+def test_raster(cached_maps):
+    path = cached_maps['tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr']
+    network = Network.fromFile(path)
+    def queries(point):
+        elements = (network.roadAt(point), network.laneAt(point),
+                    network.intersectionAt(point))
+        return (tuple(elem and elem.uid for elem in elements),
+                network.roadDirection[point], network.drivableRegion.containsPoint(point),
+                tuple(network.nominalDirectionsAt(point)))
+    (xmin, ymin), (xmax, ymax) = network.drivableRegion.getAABB()
+    rng = numpy.random.default_rng(0)
+    points = rng.uniform((xmin - 5, ymin - 5), (xmax + 5, ymax + 5), (500, 2))
+    points = [Vector(*point) for point in points]
+    expected = [queries(point) for point in points]
+
+    for cache in (False, True):
+        network = Network.fromFile(path, rasterResolution=1.5, useCache=cache)
+        assert network.raster.resolution == 1.5
+        assert os.path.exists(path.new(ext=NetworkRaster.cacheExt))
+        assert [queries(point) for point in points] == expected
+
+def test_element_index(cached_maps):
+    path = cached_maps['tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr']
+    network = Network.fromFile(path, useCache=False)
+    (xmin, ymin), (xmax, ymax) = network.drivableRegion.getAABB()
+    rng = numpy.random.default_rng(0)
+    points = rng.uniform((xmin - 5, ymin - 5), (xmax + 5, ymax + 5), (300, 2))
+    points = [Vector(*point) for point in points]
+    for useCache in (False, True):
+        network = Network.fromFile(path, useCache=useCache)
+        assert set(network._elementIndices) == {'roads', 'lanes', 'intersections'}
+        for tolerance in (0, 0.5):
+            network.tolerance = tolerance
+            for point in points:
+                assert network.roadAt(point) is network.findPointIn(point,
+                                                                    network.allRoads, False)
+                assert network.laneAt(point) is network.findPointIn(point,
+                                                                    network.lanes, False)
+                assert network.intersectionAt(point) is network.findPointIn(
+                    point, network.intersections, False)
+
+def test_lazy_cache(cached_maps):
+    path = cached_maps['tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr']
+    original = Network.fromFile(path, useCache=False)
+    network = Network.fromFile(path)
+    assert 'polygons' not in network.lanes[0].__dict__
+    assert 'lineString' not in network.lanes[0].centerline.__dict__
+    # geometry is loaded on demand, and is identical to that of the original network
+    for uid, elem in original.elements.items():
+        cached = network.elements[uid]
+        assert cached.polygons.wkb == elem.polygons.wkb
+        assert cached.polygon.wkb == elem.polygon.wkb
+        assert cached.triangles == elem.triangles
+        assert cached.cumulativeTriangleAreas == elem.cumulativeTriangleAreas
+        assert getattr(cached, 'points', None) == getattr(elem, 'points', None)
+        if isinstance(elem, LinearElement):
+            for name in ('centerline', 'leftEdge', 'rightEdge'):
+                line, cachedLine = getattr(elem, name), getattr(cached, name)
+                assert cachedLine.lineString.wkb == line.lineString.wkb
+                assert cachedLine.segments == line.segments
+                assert cachedLine.cumulativeLengths == line.cumulativeLengths
+                assert cachedLine.points == line.points
+                assert list(map(type, cachedLine.points)) == list(map(type, line.points))
+    assert network.curbRegion.lineString.wkb == original.curbRegion.lineString.wkb
+    assert network.drivableRegion.uniformPoints(10).shape == (10, 2)
+    # pickling a lazily-loaded region loads all of its geometry
+    network = Network.fromFile(path)
+    lane = network.lanes[0]
+    state = pickle.loads(pickle.dumps(lane.centerline)).__dict__
+    assert '_lazyGeometry' not in state
+    assert state['lineString'].wkb == original.lanes[0].centerline.lineString.wkb
+
+def test_parallel_geometry():
+    path = 'tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr'
+    def geometry(network):
+        return ([network.drivableRegion.polygons.wkb, network.laneRegion.polygons.wkb]
+                + [(uid, elem.polygons.wkb) for uid, elem in network.elements.items()
+                   if hasattr(elem, 'polygons')])
+    serial = Network.fromOpenDrive(path)
+    parallel = Network.fromOpenDrive(path, workers=2)
+    assert geometry(parallel) == geometry(serial)
+
+def test_road_cache(tmpdir, monkeypatch):
+    import scenic.formats.opendrive.xodr_parser as xodr_parser
+    path = str(tmpdir.join('CulDeSac.xodr'))
+    shutil.copyfile('tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr', path)
+    cachePath = str(tmpdir.join('CulDeSac' + Network.roadCacheExt))
+    def geometry(network):
+        return ([network.drivableRegion.polygons.wkb, network.laneRegion.polygons.wkb]
+                + [(uid, elem.polygons.wkb) for uid, elem in network.elements.items()
+                   if hasattr(elem, 'polygons')]
+                + [(lane.uid, lane._successor and lane._successor.uid)
+                   for lane in network.lanes])
+    computed = []
+    original = xodr_parser.Road.calculate_geometry
+    def calculate_geometry(road, *args):
+        computed.append(road.id_)
+        return original(road, *args)
+    monkeypatch.setattr(xodr_parser.Road, 'calculate_geometry', calculate_geometry)
+
+    Network.fromFile(path)
+    assert os.path.exists(cachePath)
+    assert sorted(computed) == [1, 3]
+    # with an unchanged map, all roads are reused from the cache
+    computed.clear()
+    network = Network.fromOpenDrive(path, roadCache=cachePath)
+    assert computed == []
+    assert geometry(network) == geometry(Network.fromOpenDrive(path))
+    # after editing one road, only it is recomputed
+    with open(path) as f:
+        lines = f.readlines()
+    lines[114] = lines[114].replace('a="3.25', 'a="3.5')
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    computed.clear()
+    network = Network.fromFile(path)
+    assert computed == [3]
+    assert network.lanes[0].polygons.wkb    # loaded from the rewritten .snet file
+    assert geometry(network) == geometry(Network.fromOpenDrive(path))
+    original = Network.fromFile('tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr',
+                                useCache=False, writeCache=False)
+    assert geometry(network) != geometry(original)
@@ -1,9 +1,15 @@
 
 import os
 import glob
+import math
+
+import numpy
 import pytest
+from pynverse import inversefunc
+from scipy.integrate import solve_ivp
 
 from scenic.formats.opendrive import OpenDriveWorkspace
+from scenic.formats.opendrive.xodr_parser import Clothoid, Cubic, ParamCubic
 from scenic.core.geometry import TriangulationError
 
 oldDir = os.getcwd()
@@ -19,3 +25,45 @@ def test_map(path, runLocally):
             OpenDriveWorkspace(path, n=10)
         except TriangulationError:
             pytest.skip('need better triangulation library to run this test')
+
+def integrateClothoid(curve, s, **kwargs):
+    def clothoid_ode(t, state):
+        x, y, theta = state
+        return [math.cos(theta), math.sin(theta), curve.curv0 + curve.curve_rate * t]
+    initial = (curve.x0, curve.y0, curve.hdg)
+    return solve_ivp(clothoid_ode, (0, s), initial, **kwargs).y[:2, -1]
+
+@pytest.mark.parametrize('curv0,curv1', ((0, 0.02), (0.02, -0.01), (-0.1, -0.001),
+                                         (1e-4, 2e-4), (0.05, 0.05), (-0.05, -0.05)))
+def test_clothoid(curv0, curv1):
+    curve = Clothoid(1, 2, -2, 80, curv0, curv1)
+    points = curve.to_points(20, extra_points=[13.5])
+    assert len(points) == 21
+    assert points[0] == pytest.approx((1, 2, 0))
+    for x, y, s in points:
+        # Agrees closely with a tightly-toleranced integration of the ODE...
+        exact = integrateClothoid(curve, s, rtol=1e-12, atol=1e-12)
+        assert math.hypot(x - exact[0], y - exact[1]) < 1e-8
+        # ...and to within its error with one using the default tolerances
+        approx = integrateClothoid(curve, s)
+        assert math.hypot(x - approx[0], y - approx[1]) < 1e-2
+    assert curve.point_at(13.5) == pytest.approx(points[4])
+
+def test_cubic():
+    curve = Cubic(1, 2, 0.3, 40, 0.5, 0.1, 0.01, -0.0003)
+    for x, y, s in curve.to_points(15):
+        u = float(inversefunc(curve.arclength, s))
+        ref = curve.rel_to_abs((u, curve.poly.eval_at(u), s))
+        assert (x, y) == pytest.approx(ref[:2], abs=1e-6)
+
+def test_param_cubic():
+    coeffs = (0, 1, 0.1, -0.02, 0, 0, 0.3, -0.1)
+    length = ParamCubic(0, 0, 0, 1, *coeffs).arclength(1)
+    curve = ParamCubic(1, 2, 0.3, length, *coeffs)
+    points = curve.to_points(8)
+    for x, y, s in points:
+        p = float(inversefunc(curve.arclength, s))
+        ref = curve.rel_to_abs((curve.u_poly.eval_at(p), curve.v_poly.eval_at(p), s))
+        assert (x, y) == pytest.approx(ref[:2], abs=1e-6)
+    end = curve.rel_to_abs((curve.u_poly.eval_at(1), curve.v_poly.eval_at(1), length))
+    assert points[-1] == pytest.approx(end)
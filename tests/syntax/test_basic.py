@@ -1,7 +1,10 @@
 
+import random
+
 import pytest
 
 import scenic
+from scenic.core.distributions import RejectionException, Samplable
 from scenic.core.errors import InvalidScenarioError, RuntimeParseError
 from scenic.core.object_types import Object
 from tests.utils import compileScenic, sampleScene, sampleEgo, sampleParamPFrom
@@ -93,3 +96,64 @@ def test_dump_python():
     scenic.syntax.translator.dumpFinalAST = True
     compileScenic('ego = Object')
     scenic.syntax.translator.dumpFinalAST = False
+
+def test_generate_batch():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        other = Object at Range(-10, 10) @ 3
+        param p = Range(3, 5)
+        require ego.position.x > 0
+    """)
+    results = list(scenario.generateBatch(6, workers=2, seed=7))
+    assert len(results) == 6
+    for scene, iterations in results:
+        assert iterations >= 1
+        assert len(scene.objects) == 2
+        assert scene.egoObject is scene.objects[0]
+        assert scene.egoObject.position.x > 0
+        assert 3 <= scene.params['p'] <= 5
+
+def test_generate_batch_reproducible():
+    scenario = compileScenic('ego = Object at Range(-10, 10) @ Range(-10, 10)')
+    def positions(seed, workers):
+        scenes = scenario.generateBatch(4, workers=workers, seed=seed)
+        return [scene.egoObject.position for scene, _ in scenes]
+    first = positions(3, 2)
+    assert positions(3, 2) == first
+    assert positions(4, 2) != first
+
+def test_generate_batch_rejection():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        require ego.position.x > 100
+    """)
+    with pytest.raises(RejectionException):
+        list(scenario.generateBatch(2, workers=2, maxIterations=5))
+
+def test_sampling_plan():
+    scenario = compileScenic("""
+        x = Range(0, 10)
+        ego = Object at x @ Normal(0, 1), facing Range(0, 360) deg
+        other = Object at (x + 5) @ Options([1, 2]), with width Range(1, 2)
+        param p = (x, Range(0, 1))
+        require ego.position.y < 100
+    """)
+    plan = scenario.samplingPlan
+    assert len(plan) > len(scenario.objects)
+    random.seed(42)
+    expected = [Samplable.sampleAll(scenario.dependencies) for i in range(5)]
+    random.seed(42)
+    actual = [plan.sample() for i in range(5)]
+    for exp, act in zip(expected, actual):
+        for dep in scenario.dependencies:
+            if isinstance(dep, Object):
+                assert act[dep].position == exp[dep].position
+                assert act[dep].heading == exp[dep].heading
+                assert act[dep].width == exp[dep].width
+            else:
+                assert act[dep] == exp[dep]
+    random.seed(42)
+    scene1, _ = scenario.generate()
+    random.seed(42)
+    scene2, _ = scenario.generate()
+    assert scene1.params['p'] == scene2.params['p']
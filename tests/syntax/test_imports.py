@@ -5,10 +5,13 @@ statement. This file simply tests imports of old-style Scenic modules; the new
 system of modular scenarios is tested in 'test_modular.py'.
 """
 
+import inspect
 import os.path
+import sys
 import pytest
 
 from scenic import scenarioFromFile
+import scenic.syntax.translator as translator
 from scenic.syntax.translator import InvalidScenarioError
 from tests.utils import compileScenic, sampleScene, sampleSceneFrom
 
@@ -145,3 +148,222 @@ def test_model_not_override_param():
         ego = Object
     """)
     assert scene.params['helper_file'] == 'foo'
+
+## Caching of translated code
+
+@pytest.fixture
+def translationCounter(monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    monkeypatch.setattr(translator, 'cacheTranslations', True)
+    counter = []
+    original = translator.translateBlock
+    def translateBlock(block, blockNum, constructors, filename):
+        counter.append((os.path.basename(filename), blockNum))
+        return original(block, blockNum, constructors, filename)
+    monkeypatch.setattr(translator, 'translateBlock', translateBlock)
+    return counter
+
+def writeFile(directory, name, code):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(inspect.cleandoc(code))
+    return path
+
+def test_translation_cache(tmpdir, translationCounter):
+    path = writeFile(tmpdir, 'cached.scenic', """
+        param p = Range(1, 2)
+        ego = Object at 1 @ 2
+        require ego.position.x > 0
+    """)
+    scenario = scenarioFromFile(path)
+    assert translationCounter == [('cached.scenic', 0)]
+    assert os.path.exists(os.path.join(tmpdir, '__pycache__'))
+    translationCounter.clear()
+    scenario = scenarioFromFile(path)
+    assert translationCounter == []
+    scene = sampleScene(scenario, maxIterations=1)
+    assert tuple(scene.egoObject.position) == (1, 2)
+    assert 1 <= scene.params['p'] <= 2
+    assert len(scenario.requirements) == 1
+    # Changing the source invalidates the cache
+    writeFile(tmpdir, 'cached.scenic', 'ego = Object at 3 @ 4')
+    scenario = scenarioFromFile(path)
+    assert translationCounter == [('cached.scenic', 0)]
+    scene = sampleScene(scenario, maxIterations=1)
+    assert tuple(scene.egoObject.position) == (3, 4)
+
+def test_translation_cache_imports(tmpdir, translationCounter):
+    writeFile(tmpdir, 'cachedhelper.scenic', """
+        class Thing:
+            foo: 1
+    """)
+    path = writeFile(tmpdir, 'cachedmain.scenic', """
+        from cachedhelper import *
+        ego = Thing
+    """)
+    scenarioFromFile(path)
+    assert sorted(translationCounter) == [
+        ('cachedhelper.scenic', 0), ('cachedmain.scenic', 0), ('cachedmain.scenic', 1)
+    ]
+    translationCounter.clear()
+    scene = sampleScene(scenarioFromFile(path))
+    assert translationCounter == []
+    assert scene.egoObject.foo == 1
+    # Defining new classes in the imported module invalidates later blocks
+    writeFile(tmpdir, 'cachedhelper.scenic', """
+        class Thing:
+            foo: 2
+        class OtherThing(Thing):
+            bar: 3
+    """)
+    scene = sampleScene(scenarioFromFile(path))
+    assert sorted(translationCounter) == [('cachedhelper.scenic', 0), ('cachedmain.scenic', 1)]
+    assert scene.egoObject.foo == 2
+
+def test_translation_cache_disabled(tmpdir, translationCounter, monkeypatch):
+    monkeypatch.setattr(translator, 'cacheTranslations', False)
+    path = writeFile(tmpdir, 'uncached.scenic', 'ego = Object')
+    scenarioFromFile(path)
+    scenarioFromFile(path)
+    assert translationCounter == [('uncached.scenic', 0)] * 2
+    assert not os.path.exists(os.path.join(tmpdir, '__pycache__'))
+
+## Reuse of world models across compilations
+
+@pytest.fixture
+def modelCache(tmpdir, monkeypatch):
+    monkeypatch.setattr(translator, 'cacheWorldModels', True)
+    translator.clearWorldModelCache()
+    writeFile(tmpdir, 'modelcounter.py', 'count = 0')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    import modelcounter
+    modelcounter.count = 0
+    yield modelcounter
+    translator.clearWorldModelCache()
+    sys.modules.pop('modelcounter', None)
+
+def test_reuse_model(tmpdir, modelCache):
+    writeFile(tmpdir, 'reusedmodel.scenic', """
+        import modelcounter
+        modelcounter.count += 1
+        param speed = 5
+        if 'color' not in globalParameters:
+            param color = 'red'
+        class Thing:
+            foo: globalParameters.speed
+    """)
+    path = writeFile(tmpdir, 'usesmodel.scenic', """
+        model reusedmodel
+        ego = Thing
+    """)
+    for i in range(3):
+        scene = sampleScene(scenarioFromFile(path))
+        assert scene.egoObject.foo == 5
+        assert scene.params['speed'] == 5
+        assert scene.params['color'] == 'red'
+    assert modelCache.count == 1
+    # Reading a different value of a global parameter forces recompilation
+    path2 = writeFile(tmpdir, 'usesmodel2.scenic', """
+        param color = 'blue'
+        model reusedmodel
+        ego = Thing
+    """)
+    scene = sampleScene(scenarioFromFile(path2))
+    assert scene.params['color'] == 'blue'
+    assert modelCache.count == 2
+    scene = sampleScene(scenarioFromFile(path2))
+    assert scene.params['color'] == 'blue'
+    assert modelCache.count == 2
+    # Overriding a global parameter the model doesn't read at import time is fine
+    scene = sampleScene(scenarioFromFile(path2, params={'speed': 7}))
+    assert scene.params['speed'] == 7
+    assert scene.egoObject.foo == 7     # default value evaluated when creating ego
+    assert modelCache.count == 2
+    # Changing the model forces recompilation
+    writeFile(tmpdir, 'reusedmodel.scenic', """
+        import modelcounter
+        modelcounter.count += 1
+        class Thing:
+            foo: 42
+    """)
+    scene = sampleScene(scenarioFromFile(path))
+    assert scene.egoObject.foo == 42
+    assert 'speed' not in scene.params
+    assert modelCache.count == 3
+
+def test_reuse_model_nested(tmpdir, modelCache):
+    writeFile(tmpdir, 'basemodel.scenic', """
+        import modelcounter
+        modelcounter.count += 1
+        param base = 1
+        class Thing:
+            foo: 1
+    """)
+    writeFile(tmpdir, 'derivedmodel.scenic', """
+        from basemodel import *
+        param derived = 2
+        class OtherThing(Thing):
+            bar: 2
+    """)
+    path = writeFile(tmpdir, 'usesderived.scenic', """
+        model derivedmodel
+        ego = OtherThing
+    """)
+    for i in range(2):
+        scene = sampleScene(scenarioFromFile(path))
+        assert scene.params['base'] == 1
+        assert scene.params['derived'] == 2
+        assert scene.egoObject.foo == 1
+        assert scene.egoObject.bar == 2
+    assert modelCache.count == 1
+
+def test_reuse_model_import_hook(tmpdir, modelCache):
+    # recording the imports of a model must not change the global import function
+    import builtins
+    writeFile(tmpdir, 'hookmodel.scenic', """
+        import builtins
+        import modelcounter
+        modelcounter.count += 1
+        modelcounter.imports = builtins.__import__
+        class Thing:
+            foo: 1
+    """)
+    path = writeFile(tmpdir, 'useshook.scenic', """
+        model hookmodel
+        ego = Thing
+    """)
+    originalImport = builtins.__import__
+    sampleScene(scenarioFromFile(path))
+    assert modelCache.count == 1
+    assert modelCache.imports is originalImport
+    assert builtins.__import__ is originalImport
+
+def test_reuse_model_simulator(tmpdir, modelCache):
+    writeFile(tmpdir, 'simmodel.scenic', """
+        from scenic.core.simulators import DummySimulator
+        simulator DummySimulator()
+    """)
+    path = writeFile(tmpdir, 'usessim.scenic', """
+        model simmodel
+        ego = Object
+    """)
+    for i in range(2):
+        scenario = scenarioFromFile(path)
+        assert scenario.simulator is not None
+    assert 'simmodel' in translator.worldModelCache
+
+def test_no_reuse_with_objects(tmpdir, modelCache):
+    writeFile(tmpdir, 'objmodel.scenic', """
+        import modelcounter
+        modelcounter.count += 1
+        Object at 10 @ 10
+    """)
+    path = writeFile(tmpdir, 'usesobjmodel.scenic', """
+        import objmodel
+        ego = Object
+    """)
+    for i in range(2):
+        scene = sampleScene(scenarioFromFile(path))
+        assert len(scene.objects) == 2
+    assert modelCache.count == 2
+    assert 'objmodel' not in translator.worldModelCache
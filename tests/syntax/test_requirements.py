@@ -1,9 +1,15 @@
 
+import math
+import time
+
 import pytest
+import shapely.ops
 
 import scenic
 from scenic.core.errors import ScenicSyntaxError, InvalidScenarioError
-from tests.utils import compileScenic, sampleScene, sampleEgo
+from scenic.core.distributions import RejectionException
+from scenic.core.scenarios import SamplingStatistics, _IntersectionIndex
+from tests.utils import compileScenic, sampleScene, sampleSceneFrom, sampleEgo
 
 ## Basic
 
@@ -95,3 +101,225 @@ def test_static_intersection_violation():
             ego = Object at 0@0
             Object at 1@0
         """)
+
+def test_batch_sampling():
+    scenario = compileScenic("""
+        x = Range(0, 10)
+        ego = Object at x @ Normal(0, 1)
+        other = Object at (x + 5) @ 0, with requireVisible False
+        require x > 9
+        require ego.position.y > 0
+    """)
+    for i in range(30):
+        scene, iterations = scenario.generate(maxIterations=10000, batchSize=50)
+        ego = scene.egoObject
+        assert ego.position.x > 9
+        assert ego.position.y > 0
+        assert scene.objects[1].position.x == pytest.approx(ego.position.x + 5)
+
+def test_batch_sampling_unvectorizable():
+    scenario = compileScenic("""
+        x = Range(0, 10)
+        y = Options(['a', 'b'])
+        param p = y
+        ego = Object at x @ 0
+        require x > 9 or y == 'b'
+        require x < 1 or x > 8
+    """)
+    for i in range(30):
+        scene, iterations = scenario.generate(maxIterations=10000, batchSize=50)
+        x = scene.egoObject.position.x
+        assert x > 9 or scene.params['p'] == 'b'
+        assert x < 1 or x > 8
+
+def test_batch_sampling_ego_only():
+    # requirements on the ego must not be decided before it is sampled
+    scenario = compileScenic("""
+        ego = Object at Range(0, 10) @ 0
+        require isinstance(ego, Object)
+        require ego is not None
+    """)
+    scene, iterations = scenario.generate(maxIterations=10, batchSize=10)
+    assert iterations == 1
+
+## Early rejection
+
+def test_early_rejection():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        other = Object at Range(-10, 10) @ 5, with requireVisible False
+        require ego.position.x > 5
+        require other.position.x < ego.position.x - 3
+    """)
+    for i in range(30):
+        scene, iterations = scenario.generate(maxIterations=10000, earlyRejection=True)
+        ego, other = scene.objects
+        assert ego.position.x > 5
+        assert other.position.x < ego.position.x - 3
+
+def test_early_rejection_builtin():
+    scenario = compileScenic("""
+        ego = Object
+        Object at Range(-2, 2) @ 0, with requireVisible False
+    """)
+    for i in range(30):
+        scene, iterations = scenario.generate(maxIterations=10000, earlyRejection=True)
+        ego, other = scene.objects
+        assert not ego.intersects(other)
+
+def test_early_rejection_report(capsys):
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        other = Object at Range(-10, 10) @ 5, with requireVisible False
+        require ego.position.x > 5
+    """)
+    scenario.generate(maxIterations=10000, verbosity=1, earlyRejection=True)
+    out = capsys.readouterr().out
+    assert 'Early rejection skipped' in out
+
+## Adaptive ordering
+
+def test_adaptive_ordering():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        other = Object at Range(-10, 10) @ 5, with requireVisible False
+        require other.position.x < ego.position.x - 3
+        require ego.position.x > 5
+    """)
+    for early in (False, True):
+        for i in range(30):
+            scene, iterations = scenario.generate(maxIterations=10000,
+                                                  earlyRejection=early,
+                                                  adaptiveOrdering=True)
+            ego, other = scene.objects
+            assert ego.position.x > 5
+            assert other.position.x < ego.position.x - 3
+
+def test_adaptive_ordering_statistics():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        require ego.position.x > 0
+        require ego.position.x > 8
+    """)
+    for i in range(30):
+        scenario.generate(maxIterations=10000, adaptiveOrdering=True)
+    reqs = sorted(scenario.initialRequirements, key=lambda req: req.line)
+    loose, strict = (
+        scenario._checkStatistics[(f'user-specified requirement (line {req.line})', id(req))]
+        for req in reqs
+    )
+    assert strict.calls > 0
+    assert strict.failures / strict.calls > 0.5
+    assert strict.costPerRejection < loose.costPerRejection
+
+## Object intersection
+
+def test_intersection_broad_phase():
+    scenario = compileScenic("""
+        ego = Object at Range(-5, 5) @ Range(-5, 5), facing Range(0, 360) deg
+        for i in range(20):
+            Object at Range(-15, 15) @ Range(-15, 15), facing Range(0, 360) deg,
+                with width Range(0.2, 3), with length Range(0.2, 5),
+                with requireVisible False
+    """)
+    for i in range(5):
+        scene = sampleScene(scenario, maxIterations=10000)
+        objs = scene.objects
+        for i, oi in enumerate(objs):
+            for oj in objs[:i]:
+                assert not oi.intersects(oj)
+
+@pytest.mark.slow
+@pytest.mark.parametrize('count', (10, 100, 1000))
+def test_many_objects_disjoint(count):
+    side = 60 * math.sqrt(count)
+    scenario = compileScenic(f"""
+        ego = Object
+        for i in range({count-1}):
+            Object at Range(-{side}, {side}) @ Range(-{side}, {side}),
+                facing Range(0, 360) deg, with requireVisible False
+    """)
+    scene = sampleScene(scenario, maxIterations=1000)
+    assert len(scene.objects) == count
+    polygons = [obj.polygon for obj in scene.objects]
+    union = shapely.ops.unary_union(polygons)
+    assert union.area == pytest.approx(sum(polygon.area for polygon in polygons))
+
+@pytest.mark.slow
+def test_intersection_scaling(record_property):
+    """Time the check that the objects in a sample do not intersect.
+
+    The objects lie on a grid, spaced so that neighbouring objects need the exact test
+    (their circumcircles overlap) but do not intersect. Checking n objects should be
+    far from the quadratic growth of testing all pairs exactly.
+    """
+    timings = {}
+    for count in (10, 100, 1000):
+        side = math.ceil(math.sqrt(count))
+        lines = ['ego = Object at -1.2 @ 0']
+        for i in range(1, count):
+            x, y = 1.2 * (i % side), 1.2 * (i // side)
+            lines.append(f'Object at {x} @ {y}, with requireVisible False')
+        scene = sampleSceneFrom('\n'.join(lines))
+        objects = scene.objects
+        best = math.inf
+        for trial in range(5):
+            index = _IntersectionIndex(objects)
+            sample = {obj: obj for obj in objects}
+            start = time.perf_counter()
+            assert all(index.isSeparated(i, sample) for i in range(1, count))
+            best = min(best, time.perf_counter() - start)
+        timings[count] = best
+        record_property(f'intersection_check_{count}_objects', best)
+    assert timings[1000] / timings[100] < 40
+
+## Statistics
+
+def test_sampling_statistics():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        Object at Range(-10, 10) @ 0, with requireVisible False
+        require ego.position.x > 0
+    """)
+    stats = SamplingStatistics()
+    total = 0
+    for i in range(20):
+        scene, iterations = scenario.generate(maxIterations=10000, stats=stats)
+        total += iterations
+    assert stats.scenes == 20
+    assert stats.failures == 0
+    assert sum(stats.iterations) == total
+    assert sum(stats.rejections.values()) == total - 20
+    assert set(stats.rejections) <= {'object intersection', 'user-specified requirement (line 3)'}
+    assert stats.rejections['user-specified requirement (line 3)'] > 0
+    assert stats.samplingTime > 0
+    assert stats.checkingTime > 0
+    histogram = stats.iterationHistogram()
+    assert sum(count for low, high, count in histogram) == 20
+    for low, high, count in histogram:
+        assert count == sum(1 for its in stats.iterations if low <= its <= high)
+    summary = stats.toDict()
+    assert summary['scenes'] == 20
+    assert summary['totalIterations'] == total
+
+def test_sampling_statistics_failure():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        require ego.position.x > 20
+    """)
+    stats = SamplingStatistics()
+    with pytest.raises(RejectionException):
+        scenario.generate(maxIterations=10, stats=stats)
+    assert stats.scenes == 0
+    assert stats.failures == 1
+    assert stats.rejections == {'user-specified requirement (line 2)': 10}
+
+def test_sampling_statistics_batch():
+    scenario = compileScenic("""
+        ego = Object at Range(-10, 10) @ 0
+        require ego.position.x > 0
+    """)
+    stats = SamplingStatistics()
+    results = list(scenario.generateBatch(6, workers=2, seed=3, stats=stats))
+    assert stats.iterations == [iterations for scene, iterations in results]
+    assert sum(stats.rejections.values()) == sum(stats.iterations) - 6
@@ -1,6 +1,7 @@
 """Tests for the 'scenic' command-line tool."""
 
 import inspect
+import json
 import os
 import re
 import subprocess
@@ -49,3 +50,21 @@ def test_param_float(tmpdir):
     p = runAndGetP(tmpdir, 'param p = 42',
                    options=['--param', 'p', '123e1'])
     assert p == '1230.0'
+
+def test_stats_json(tmpdir):
+    program = inspect.cleandoc("""
+        ego = Object at Range(-10, 10) @ 0
+        require ego.position.x > 0
+    """)
+    path = os.path.join(tmpdir, 'test.sc')
+    with open(path, 'w') as f:
+        f.write(program)
+    reportPath = os.path.join(tmpdir, 'stats.json')
+    args = ['scenic', '--gather-stats', '5', '--stats-json', reportPath, path]
+    result = subprocess.run(args, capture_output=True, text=True)
+    assert result.returncode == 0
+    with open(reportPath) as f:
+        report = json.load(f)
+    assert report['scenes'] == 5
+    assert report['totalIterations'] == 5 + sum(report['rejections'].values())
+    assert set(report['rejections']) <= {'user-specified requirement (line 2)'}
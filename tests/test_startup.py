@@ -0,0 +1,93 @@
+"""Tests guarding the startup time of the scenic package."""
+
+import inspect
+import json
+import os
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+
+import scenic
+import scenic.core
+
+# Mark all tests in this file as slow, since they require spawning a subprocess
+pytestmark = pytest.mark.slow
+
+## Utilities
+
+#: Modules which should not be loaded merely by importing scenic
+heavyModules = ('numpy', 'shapely', 'scipy', 'matplotlib', 'cv2', 'pygame', 'antlr4',
+                'wrapt', 'importlib.metadata', 'scenic.syntax.translator')
+
+#: The only Scenic modules which should be loaded by importing scenic
+lightModules = ('scenic', 'scenic.core', 'scenic.core.errors', 'scenic.syntax',
+                'scenic.syntax.importer')
+
+#: Modules of scenic.core, each of which should be importable on its own
+coreModules = [info.name for info in pkgutil.iter_modules(scenic.core.__path__,
+                                                           'scenic.core.')]
+
+def runPython(code, cwd=None):
+    code = inspect.cleandoc(code)
+    # make the search path absolute, so that it still works if we change directory;
+    # include the directory containing the scenic package being tested
+    paths = [os.path.dirname(os.path.dirname(scenic.__file__))]
+    paths.extend(os.environ.get('PYTHONPATH', '').split(os.pathsep))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(os.path.abspath(path)
+                                                      for path in paths if path))
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, cwd=cwd, env=env)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+## Tests
+
+def test_import_is_lazy():
+    loaded = runPython(f"""
+        import json, sys
+        import scenic
+        print(json.dumps([name for name in {heavyModules!r} if name in sys.modules]))
+    """)
+    assert loaded == []
+
+def test_import_loads_little():
+    # only the import hook and its dependencies should be loaded; checking this rather
+    # than timing the import avoids flaky failures on loaded machines
+    loaded = runPython("""
+        import json, sys
+        import scenic
+        print(json.dumps(sorted(name for name in sys.modules
+                                if name.split('.')[0] == 'scenic')))
+    """)
+    assert set(loaded) <= set(lightModules)
+
+def test_top_level_api():
+    loaded = runPython("""
+        import json, sys
+        from scenic import scenarioFromString
+        scenario = scenarioFromString('ego = Object')
+        print(json.dumps('scenic.syntax.translator' in sys.modules))
+    """)
+    assert loaded
+
+def test_import_scenic_module(tmpdir):
+    with open(tmpdir.join('helper.scenic'), 'w') as f:
+        f.write('x = 42\n')
+    value = runPython("""
+        import scenic
+        import helper
+        print(helper.x)
+    """, cwd=tmpdir)
+    assert value == 42
+
+@pytest.mark.parametrize('module', coreModules)
+def test_import_core_module(module):
+    # check for import cycles which are hidden when modules are imported in the usual order
+    loaded = runPython(f"""
+        import json, sys
+        import {module}
+        print(json.dumps({module!r} in sys.modules))
+    """)
+    assert loaded